@@ -1,20 +1,118 @@
+import asyncio
+import base64
+import json
+import os
+import threading
+import time
+
 import requests
+from requests.adapters import HTTPAdapter
+
+METADATA_IDENTITY_URL = os.getenv(
+    'METADATA_IDENTITY_URL', 'http://metadata/computeMetadata/v1/instance/service-accounts/default/identity'
+)
+METADATA_TIMEOUT = (1, 5)  # seconds, (connect, read)
+REFRESH_MARGIN = 300  # seconds before a token's `exp` claim when it is fetched again
+POOL_SIZE = 10
 
 
 def create_authenticated_cloud_function_header(cloud_function_endpoint: str) -> dict:
     """ For function to function calls - when receiving function is NOT public. See:
     https://cloud.google.com/functions/docs/securing/authenticating#function-to-function
-    """
-    # Set up metadata server request
-    metadata_server_url = 'http://metadata/computeMetadata/v1/instance/service-accounts/default/identity?audience='
-    token_full_url = metadata_server_url + cloud_function_endpoint
-    token_headers = {'Metadata-Flavor': 'Google'}
 
-    # Fetch the token
-    token_response = requests.get(token_full_url, headers=token_headers)
-    jwt = token_response.content.decode("utf-8")
+    The identity token is cached per endpoint, see `IdentityTokenProvider`.
+    """
+    jwt = get_token_provider().get_token(cloud_function_endpoint)
 
     # Provide the token in the request to the receiving function
     receiving_function_headers = {'Authorization': f'bearer {jwt}'}
 
     return receiving_function_headers
+
+
+async def create_authenticated_cloud_function_header_async(cloud_function_endpoint: str) -> dict:
+    """ as `create_authenticated_cloud_function_header`, without blocking the event loop on a metadata request. """
+    jwt = await get_token_provider().get_token_async(cloud_function_endpoint)
+    return {'Authorization': f'bearer {jwt}'}
+
+
+class IdentityTokenProvider:
+    """ fetches identity tokens (JWT) from the metadata server and caches them per audience, until REFRESH_MARGIN
+        seconds before their `exp` claim. Safe to share between threads: one request per audience is made at a
+        time, concurrent callers wait for it rather than making their own. Requests share a pooled session.
+    """
+    def __init__(self, metadata_url: str = METADATA_IDENTITY_URL, timeout: (float, float) = METADATA_TIMEOUT,
+                 refresh_margin: float = REFRESH_MARGIN, clock=time.time):
+        self.metadata_url = metadata_url
+        self.timeout = timeout
+        self.refresh_margin = refresh_margin
+        self.clock = clock
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE))
+        self.session.headers['Metadata-Flavor'] = 'Google'
+        self._tokens = {}  # {audience: (jwt, expiry)}
+        self._locks = {}  # {audience: threading.Lock}
+        self._locks_lock = threading.Lock()
+
+    def get_token(self, audience: str) -> str:
+        """ returns a cached token for audience, fetching a new one if there is none or it is about to expire. """
+        token = self._cached_token(audience)
+        if token is not None:
+            return token
+
+        with self._audience_lock(audience):
+            token = self._cached_token(audience)  # another thread may have fetched it while we waited
+            if token is None:
+                token = self._fetch_token(audience)
+                self._tokens[audience] = (token, _jwt_expiry(token))
+        return token
+
+    async def get_token_async(self, audience: str) -> str:
+        """ as `get_token`, a token which is not cached is fetched in the default executor. """
+        token = self._cached_token(audience)
+        if token is not None:
+            return token
+        return await asyncio.get_running_loop().run_in_executor(None, self.get_token, audience)
+
+    def clear(self) -> None:
+        self._tokens.clear()
+
+    def _cached_token(self, audience: str) -> str:
+        token, expiry = self._tokens.get(audience, (None, None))
+        if token is None or expiry is None or self.clock() >= expiry - self.refresh_margin:
+            return None
+        return token
+
+    def _audience_lock(self, audience: str) -> threading.Lock:
+        with self._locks_lock:
+            return self._locks.setdefault(audience, threading.Lock())
+
+    def _fetch_token(self, audience: str) -> str:
+        response = self.session.get(self.metadata_url, params={'audience': audience}, timeout=self.timeout)
+        response.raise_for_status()
+        return response.content.decode('utf-8')
+
+
+def _jwt_expiry(jwt: str) -> float:
+    """ `exp` claim of jwt (not verified, it is only used to know when to refresh). None if it can't be read,
+        then the token is not cached.
+    """
+    try:
+        payload = jwt.split('.')[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        return float(claims['exp'])
+    except (IndexError, ValueError, KeyError, TypeError):
+        return None
+
+
+_token_provider = None
+_token_provider_lock = threading.Lock()
+
+
+def get_token_provider() -> IdentityTokenProvider:
+    """ IdentityTokenProvider shared by the whole process, created on first use. """
+    global _token_provider
+    with _token_provider_lock:
+        if _token_provider is None:
+            _token_provider = IdentityTokenProvider()
+    return _token_provider
@@ -1,3 +1,4 @@
+import json
 import os
 
 import google.cloud.pubsub_v1 as pubsub
@@ -10,14 +11,33 @@ from cloud_utils.handle_requests import extract_field_from_request
   "message": "service asked to publish on: 2021-01-07",
   "attributes": {
     "run_date": "2021-01-07",
-    "cumulate_results": "True" 
+    "cumulate_results": "True"
   }
 }
+
+Or, to publish many messages in one request:
+{
+  "topic_name": "scheduled-weekly-9am",
+  "messages": [
+    {"message": "service asked to publish on: 2021-01-07", "attributes": {"run_date": "2021-01-07", ...}},
+    ...
+  ]
+}
 """
 
-# Instantiates a Pub/Sub client
-publisher = pubsub.PublisherClient()
+# Messages published together are sent to Pub/Sub in batches, rather than one request each.
+BATCH_SETTINGS = pubsub.types.BatchSettings(max_messages=100, max_bytes=1024 * 1024, max_latency=0.05)
+PUBLISH_TIMEOUT = 30  # seconds, per message
 gcp_project_id = os.getenv('PROJECT_ID')
+_publisher = None
+
+
+def get_publisher() -> pubsub.PublisherClient:
+    """ Instantiates a Pub/Sub client on first use, then reuses it. """
+    global _publisher
+    if _publisher is None:
+        _publisher = pubsub.PublisherClient(batch_settings=BATCH_SETTINGS)
+    return _publisher
 
 
 # Publishes a message to a Cloud Pub/Sub topic.
@@ -34,14 +54,27 @@ def publish_message(request):
             - "message"    (used as str): message to be published (primarily for logs)
             - "attribute" (used as dict): dict containing additional attributes to be passed
                                           topic subscribers as keyword arguments.
+        Or, instead of "message" and "attributes":
+            - "messages" (used as list): of {"message": str, "attributes": dict}, all published to the topic.
+              Returns json: {"published": count, "failed": count, "results": [{"message_id"} | {"error"}, ...]},
+              one result per message, in order.
     """
     topic_name = extract_field_from_request(request, 'topic_name')
-    message = extract_field_from_request(request, 'message')
-    attributes = extract_field_from_request(request, 'attributes')
 
     # References an existing topic
+    publisher = get_publisher()
     topic_path = publisher.topic_path(gcp_project_id, topic_name)
 
+    request_json = request.get_json(silent=True)
+    if request_json and 'messages' in request_json:
+        results = publish_messages(publisher, topic_path, request_json['messages'])
+        failed = sum('error' in result for result in results)
+        print(f'{len(results) - failed} of {len(results)} messages published to {topic_name}.')
+        return json.dumps({'published': len(results) - failed, 'failed': failed, 'results': results})
+
+    message = extract_field_from_request(request, 'message')
+    attributes = extract_field_from_request(request, 'attributes')
+
     # message must be byte string
     message_bytes = message.encode('utf-8')
 
@@ -54,3 +87,27 @@ def publish_message(request):
     except Exception as e:
         print(e)
         return e, 500
+
+
+def publish_messages(publisher: pubsub.PublisherClient, topic_path: str, messages: [dict]) -> [dict]:
+    """ publishes every message without waiting, so the client can batch them, then gathers the futures.
+        Returns one result per message, in order: {"message_id": str} or {"error": str}.
+    """
+    futures = []
+    for message in messages:
+        try:
+            futures.append(publisher.publish(topic_path, message['message'].encode('utf-8'),
+                                             **message.get('attributes', {})))
+        except Exception as e:  # e.g. a malformed message, the others are still published
+            futures.append(e)
+
+    results = []
+    for future in futures:
+        try:
+            if isinstance(future, Exception):
+                raise future
+            results.append({'message_id': future.result(timeout=PUBLISH_TIMEOUT)})
+        except Exception as e:
+            print(e)
+            results.append({'error': f'{type(e).__name__}: {e}'})
+    return results
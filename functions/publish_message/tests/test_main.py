@@ -0,0 +1,84 @@
+import json
+
+from pytest import fixture
+
+import main
+
+
+class FakeRequest:
+    """ stands in for flask.Request """
+    def __init__(self, request_json: dict):
+        self.request_json = request_json
+        self.args = {}
+
+    def get_json(self, silent: bool = False) -> dict:
+        return self.request_json
+
+
+class FakeFuture:
+    def __init__(self, log: list, message_id: str = None, error: Exception = None):
+        self.log, self.message_id, self.error = log, message_id, error
+
+    def result(self, timeout=None):
+        self.log.append(('result', self.message_id))
+        if self.error is not None:
+            raise self.error
+        return self.message_id
+
+
+class FakePublisher:
+    """ stands in for pubsub.PublisherClient. Messages whose run_date is in fail_run_dates fail to publish. """
+    def __init__(self):
+        self.log = []
+        self.fail_run_dates = set()
+
+    @staticmethod
+    def topic_path(project: str, topic: str) -> str:
+        return f'projects/{project}/topics/{topic}'
+
+    def publish(self, topic_path: str, data: bytes, **attributes) -> FakeFuture:
+        message_id = str(len([entry for entry in self.log if entry[0] == 'publish']))
+        self.log.append(('publish', message_id))
+        if attributes['run_date'] in self.fail_run_dates:
+            return FakeFuture(self.log, message_id, error=RuntimeError('publish failed'))
+        return FakeFuture(self.log, message_id)
+
+
+@fixture
+def publisher(monkeypatch):
+    fake = FakePublisher()
+    monkeypatch.setattr(main, '_publisher', fake)
+    return fake
+
+
+def make_message(run_date: str) -> dict:
+    return {'message': f'publish for {run_date}', 'attributes': {'run_date': run_date, 'cumulate_results': 'False'}}
+
+
+def test_publish_message_single(publisher):
+    request = FakeRequest({'topic_name': 'scheduled-weekly-9am', **make_message('2021-01-07')})
+
+    assert main.publish_message(request) == 'Successfully Published'
+    assert publisher.log == [('publish', '0'), ('result', '0')]
+
+
+def test_publish_message_batch(publisher):
+    publisher.fail_run_dates = {'2021-01-14'}
+    run_dates = ['2021-01-07', '2021-01-14', '2021-01-21']
+    request = FakeRequest({'topic_name': 'scheduled-weekly-9am', 'messages': [make_message(d) for d in run_dates]})
+
+    response = json.loads(main.publish_message(request))
+
+    assert response == {
+        'published': 2, 'failed': 1,
+        'results': [{'message_id': '0'}, {'error': 'RuntimeError: publish failed'}, {'message_id': '2'}]
+    }
+    # every message is handed to the client before waiting on any of them, so the client can batch them.
+    assert [action for action, _ in publisher.log] == ['publish'] * 3 + ['result'] * 3
+
+
+def test_publish_messages_malformed_message(publisher):
+    results = main.publish_messages(publisher, 'topic', [{'attributes': {'run_date': 'x'}}, make_message('y')])
+
+    assert results[0] == {'error': "KeyError: 'message'"}
+    assert results[1] == {'message_id': '0'}
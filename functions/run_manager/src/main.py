@@ -1,11 +1,20 @@
 import base64
+import os
 from datetime import datetime, date
 
 from manager.bigquery import read_selected_numbers, establish_results_in_bigquery, cumulating_results
-from manager.check_matches import collect_winning_numbers, check_matches_on_selected
+from manager.cache import PrizeBreakdownStore
+from manager.check_matches import collect_winning_numbers
 from manager.scrape_results import scrape_historical_results, scrape_prize_breakdown, extract_draw_result
+from manager.ticket_table import TicketTable
 from manager.tools import get_last_friday_date
 
+# /tmp persists between invocations on a warm instance, so repeat runs revalidate rather than re-download.
+CACHE_DIR = os.getenv('CACHE_DIR', '/tmp/lotto-manager-cache')
+prize_breakdown_store = PrizeBreakdownStore(os.path.join(CACHE_DIR, 'prize_breakdowns'))
+# 'per_dataset' (one dataset per draw) or 'consolidated' (one partitioned table), see manager.bigquery
+RESULTS_LAYOUT = os.getenv('RESULTS_LAYOUT', 'per_dataset')
+
 
 def run_manager(event, _context):
     """
@@ -15,7 +24,8 @@ def run_manager(event, _context):
         - scrape latest lotto draw results and prize breakdown
         - obtain match counts and winnings
         - write out all results to BigQuery
-        - calculate cumulative reports and write them to BigQuery
+        - calculate cumulative reports and write them to BigQuery, incrementally unless the
+          "full_rebuild" attribute is "True"
 
     Cloud Function to be triggered by Pub/Sub.
 
@@ -37,12 +47,14 @@ def run_manager(event, _context):
             run_date_str = attributes['run_date']
             run_date = datetime.strptime(run_date_str, '%Y-%m-%d')
             cumulate_results = eval(attributes['cumulate_results'])
+            full_rebuild = attributes.get('full_rebuild', 'False') == 'True'
         else:
             raise RuntimeError('Expected "run_date" AND "cumulate_results" in attributes. '
                                f'Received: {event["attributes"]}')
     else:
         run_date = datetime.now().date()
         cumulate_results = True
+        full_rebuild = False
 
     selected = read_selected_numbers()
 
@@ -51,22 +63,24 @@ def run_manager(event, _context):
     draw_result, prize_breakdown = get_draw_information(draw_date)
     winning_numbers = collect_winning_numbers(draw_result)
 
-    results = check_matches_on_selected(selected, winning_numbers, prize_breakdown)
+    # results stay as compact arrays until they are written, see TicketTable
+    results = TicketTable.from_dataframe(selected).check_matches(winning_numbers, prize_breakdown).to_dataframe()
 
     establish_results_in_bigquery(
         dataset_name=draw_date_str,
-        results=results, draw_result=draw_result, prize_breakdown=prize_breakdown
+        results=results, draw_result=draw_result, prize_breakdown=prize_breakdown, layout=RESULTS_LAYOUT,
+        concurrent=True, confirm=False
     )
 
     if cumulate_results:
-        cumulating_results()
+        cumulating_results(full_rebuild=full_rebuild, layout=RESULTS_LAYOUT)
 
     return 'Completed'
 
 
 def get_draw_information(draw_date: date) -> (dict, dict):
     """ helper to group tasks relating to extracting and gathering draw information. """
-    historical_data = scrape_historical_results()
+    historical_data = scrape_historical_results(cache_dir=CACHE_DIR)
     draw_result = extract_draw_result(draw_date, historical_data)
-    prize_breakdown = scrape_prize_breakdown(draw_result['DrawNumber'])
+    prize_breakdown = scrape_prize_breakdown(draw_result['DrawNumber'], store=prize_breakdown_store)
     return draw_result, prize_breakdown
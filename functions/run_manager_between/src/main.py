@@ -1,14 +1,15 @@
 import asyncio
 import json
 import os
-from datetime import date, datetime
+from datetime import date, datetime, timezone
+from email.utils import parsedate_to_datetime
 from random import uniform
 
 import aiohttp  # async requests are overkill for this job. Used for learning exercise.
 import pandas as pd
 
 from cloud_utils.handle_requests import extract_field_from_request
-from cloud_utils.authentication import create_authenticated_cloud_function_header
+from cloud_utils.authentication import create_authenticated_cloud_function_header_async
 
 """ Example JSON trigger:
 {
@@ -22,13 +23,20 @@ gcp_project = os.getenv('PROJECT_ID')
 publish_message_endpoint = f'https://{gcp_region}-{gcp_project}.cloudfunctions.net/publish_message'
 
 MAXIMUM_NUMBER_OF_ATTEMPTS = 5
+MAXIMUM_CONCURRENT_REQUESTS = 10  # publish_message requests in flight at once
+BACKOFF_BASE = 1  # seconds, doubled after every failed attempt
+BACKOFF_CAP = 32  # seconds, also caps Retry-After
+REQUEST_TIMEOUT = 30  # seconds
+RETRY_AFTER_STATUSES = {429, 503}
+MESSAGES_PER_REQUEST = 100  # messages sent to `publish_message` in one request, see `publish_batches_async`
+TOPIC_NAME = 'scheduled-weekly-9am'
 
 
 def run_manager_between(request):
     """ Executes cloud function `run_manager` on specific dates between two dates provided.
-        Accomplishes this by asynchronously publishing several messages, with attributes,
-        to topic: "scheduled-weekly-9am". This will then trigger cloud function `run_manager`
-        with the `run_date` sent as attribute.
+        Accomplishes this by publishing several messages, with attributes, to topic: "scheduled-weekly-9am",
+        up to MESSAGES_PER_REQUEST in each request to `publish_message`. This will then trigger cloud function
+        `run_manager` with the `run_date` sent as attribute.
 
         Triggered by http request.
 
@@ -39,6 +47,8 @@ def run_manager_between(request):
             - "start_date" (used as date).
             - "end_date"   (used as date):
             Used to generate date range (7 day freq) which will be looped over to send requests.
+
+    Returns json: {"published": count, "failed": count, "dates": {run_date: outcome}}, see `publish_batch_async`.
     """
     start_date_str = extract_field_from_request(request, 'start_date')
     end_date_str = extract_field_from_request(request, 'end_date')
@@ -55,68 +65,194 @@ def run_manager_between(request):
     flag_collection = date_collection == date_collection.max()
     date_cumulate_flag_collection = list(zip(date_collection, flag_collection))
 
-    async_results = asyncio.run(
-        publish_messages_async(endpoint=publish_message_endpoint,
-                               collection=date_cumulate_flag_collection)
+    outcomes = asyncio.run(
+        publish_batches_async(endpoint=publish_message_endpoint,
+                              collection=date_cumulate_flag_collection)
     )
-    results = {}
-    for result in async_results:
-        results[str(result)] = results.get(result, 0) + 1
 
-    return json.dumps(results)
+    return json.dumps(summarise_outcomes(outcomes))
+
 
+def summarise_outcomes(outcomes: [dict]) -> dict:
+    """ counts published and failed dates, keeping every date's outcome. """
+    return {
+        'published': sum(outcome['status'] == 'published' for outcome in outcomes),
+        'failed': sum(outcome['status'] == 'failed' for outcome in outcomes),
+        'dates': {outcome['run_date']: outcome for outcome in outcomes},
+    }
 
-async def publish_messages_async(endpoint: str, collection: [(str, str)]) -> [str]:
+
+async def publish_messages_async(
+        endpoint: str, collection: [(pd.Timestamp, bool)], max_concurrency: int = MAXIMUM_CONCURRENT_REQUESTS,
+        header: dict = None, request_timeout: float = REQUEST_TIMEOUT, **retry_options) -> [dict]:
     """ creates authenticated session with `publish_message` cloud function, which is then used
-        for all asynchronous requests. Note: when return_exceptions is True, exceptions are
-        treated the same as successful results, and aggregated in the result list.
+        for all asynchronous requests. At most max_concurrency requests are in flight at once.
+        header defaults to an identity token header for endpoint. retry_options are passed to
+        `publish_message_async`. Returns one outcome per (run_date, cumulate_flag) in collection, in order.
     """
-    header = create_authenticated_cloud_function_header(endpoint)
+    if header is None:
+        header = await create_authenticated_cloud_function_header_async(endpoint)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    timeout = aiohttp.ClientTimeout(total=request_timeout)
 
-    async with aiohttp.ClientSession(headers=header) as session:
+    async with aiohttp.ClientSession(headers=header, timeout=timeout) as session:
         return await asyncio.gather(
-            *(publish_message_async(session, endpoint, run_date, cumulate_flag) for run_date, cumulate_flag in
-              collection),
-            return_exceptions=True
+            *(publish_message_async(session, endpoint, run_date, cumulate_flag, semaphore, **retry_options)
+              for run_date, cumulate_flag in collection)
         )
 
 
 async def publish_message_async(
-        session: aiohttp.ClientSession, endpoint: str, run_date: pd.Timestamp, cumulate_flag: bool) -> str:
+        session: aiohttp.ClientSession, endpoint: str, run_date: pd.Timestamp, cumulate_flag: bool,
+        semaphore: asyncio.Semaphore, max_attempts: int = MAXIMUM_NUMBER_OF_ATTEMPTS,
+        backoff_base: float = BACKOFF_BASE, backoff_cap: float = BACKOFF_CAP) -> dict:
+    """
+    Logic for making asynchronous requests to endpoint, with the relevant json_args. A non 200 response or a
+    transport error (connection, timeout) is retried after an exponential backoff with full jitter:
+    uniform(0, min(backoff_cap, backoff_base * 2 ** attempt)). A 429 or 503 with a Retry-After header waits
+    that long instead (capped at backoff_cap). The semaphore is only held while a request is in flight.
+
+    Returns the outcome: {"run_date", "status": "published" | "failed", "attempts", "response", "errors"}.
+    """
+    date_str, message = _message_args(run_date, cumulate_flag)
+    json_args = {"topic_name": TOPIC_NAME, **message}
+    failed_attempts = []
+    for attempt_number in range(max_attempts):
+        retry_after = None
+        try:
+            async with semaphore:
+                async with session.post(endpoint, json=json_args) as response:
+                    text_response = await response.text()
+
+            if response.status == 200:
+                print(f'Completed on attempt: #{attempt_number} for args={json_args}')
+                return {'run_date': date_str, 'status': 'published', 'attempts': attempt_number + 1,
+                        'response': text_response, 'errors': failed_attempts}
+
+            failed_attempts.append(f'{response.status}: {text_response}')
+            if response.status in RETRY_AFTER_STATUSES:
+                retry_after = _parse_retry_after(response.headers.get('Retry-After'))
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error:
+            failed_attempts.append(f'{type(error).__name__}: {error}')
+
+        # No need to wait after the last attempt, we've given up now - so don't waste compute cycles
+        if attempt_number < max_attempts - 1:
+            if retry_after is None:
+                sleep_time = uniform(0, min(backoff_cap, backoff_base * 2 ** attempt_number))
+            else:
+                sleep_time = min(backoff_cap, retry_after)
+            await asyncio.sleep(sleep_time)
+            print(f'run_manager_between slept for: {sleep_time:.2f}s')
+
+    print(f'Failed after {max_attempts} attempts for args={json_args}. Reasons: {failed_attempts}')
+    return {'run_date': date_str, 'status': 'failed', 'attempts': max_attempts, 'response': None,
+            'errors': failed_attempts}
+
+
+async def publish_batches_async(
+        endpoint: str, collection: [(pd.Timestamp, bool)], messages_per_request: int = MESSAGES_PER_REQUEST,
+        max_concurrency: int = MAXIMUM_CONCURRENT_REQUESTS, header: dict = None,
+        request_timeout: float = REQUEST_TIMEOUT, **retry_options) -> [dict]:
+    """ as `publish_messages_async`, but sends the collection to `publish_message` in batches of
+        messages_per_request, so a whole date range takes one or a few requests. retry_options are passed
+        to `publish_batch_async`. Returns one outcome per (run_date, cumulate_flag) in collection, in order.
+    """
+    if header is None:
+        header = await create_authenticated_cloud_function_header_async(endpoint)
+    semaphore = asyncio.Semaphore(max_concurrency)
+    timeout = aiohttp.ClientTimeout(total=request_timeout)
+    batches = [collection[i:i + messages_per_request] for i in range(0, len(collection), messages_per_request)]
+
+    async with aiohttp.ClientSession(headers=header, timeout=timeout) as session:
+        outcomes = await asyncio.gather(
+            *(publish_batch_async(session, endpoint, batch, semaphore, **retry_options) for batch in batches)
+        )
+    return [outcome for batch_outcomes in outcomes for outcome in batch_outcomes]
+
+
+async def publish_batch_async(
+        session: aiohttp.ClientSession, endpoint: str, batch: [(pd.Timestamp, bool)],
+        semaphore: asyncio.Semaphore, max_attempts: int = MAXIMUM_NUMBER_OF_ATTEMPTS,
+        backoff_base: float = BACKOFF_BASE, backoff_cap: float = BACKOFF_CAP) -> [dict]:
     """
-    Logic for making asynchronous requests to endpoint, with the relevant json_args. If it fails, sleep for
-    random time to avoid traffic issues.
+    Publishes every message in batch with one request to endpoint, which answers with a result per message
+    (a message id or an error). Messages which failed are sent again, the others are not. A non 200 response or
+    a transport error fails every message still pending. Retries wait as in `publish_message_async`.
+
+    Returns an outcome per message, as `publish_message_async`, with "response" set to the message id.
     """
+    pending = dict(_message_args(run_date, cumulate_flag) for run_date, cumulate_flag in batch)
+    errors = {date_str: [] for date_str in pending}
+    outcomes = {}
+    for attempt_number in range(max_attempts):
+        retry_after = None
+        json_args = {'topic_name': TOPIC_NAME, 'messages': list(pending.values())}
+        try:
+            async with semaphore:
+                async with session.post(endpoint, json=json_args) as response:
+                    text_response = await response.text()
+
+            if response.status == 200:
+                for date_str, result in zip(list(pending), json.loads(text_response)['results']):
+                    if 'message_id' in result:
+                        outcomes[date_str] = {'run_date': date_str, 'status': 'published',
+                                              'attempts': attempt_number + 1, 'response': result['message_id'],
+                                              'errors': errors[date_str]}
+                        del pending[date_str]
+                    else:
+                        errors[date_str].append(result['error'])
+            else:
+                for date_str in pending:
+                    errors[date_str].append(f'{response.status}: {text_response}')
+                if response.status in RETRY_AFTER_STATUSES:
+                    retry_after = _parse_retry_after(response.headers.get('Retry-After'))
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError, KeyError) as error:  # incl. malformed json
+            for date_str in pending:
+                errors[date_str].append(f'{type(error).__name__}: {error}')
+
+        print(f'Attempt #{attempt_number}: {len(batch) - len(pending)} of {len(batch)} messages published')
+        if not pending:
+            break
+        if attempt_number < max_attempts - 1:
+            if retry_after is None:
+                sleep_time = uniform(0, min(backoff_cap, backoff_base * 2 ** attempt_number))
+            else:
+                sleep_time = min(backoff_cap, retry_after)
+            await asyncio.sleep(sleep_time)
+            print(f'run_manager_between slept for: {sleep_time:.2f}s')
+
+    for date_str in pending:
+        print(f'Failed after {max_attempts} attempts for run_date={date_str}. Reasons: {errors[date_str]}')
+        outcomes[date_str] = {'run_date': date_str, 'status': 'failed', 'attempts': max_attempts, 'response': None,
+                              'errors': errors[date_str]}
+    return [outcomes[date_str] for date_str in errors]
+
+
+def _message_args(run_date: pd.Timestamp, cumulate_flag: bool) -> (str, dict):
+    """ the message published for run_date, as expected by `publish_message`. Returns (run_date string, message). """
     date_str = f'{run_date:%Y-%m-%d}'
-    json_args = {
-        "topic_name": "scheduled-weekly-9am",
-        "message": f"`run_manager_between` asked to publish on `scheduled-weekly-9am` for `run_date={date_str}`",
+    return date_str, {
+        "message": f"`run_manager_between` asked to publish on `{TOPIC_NAME}` for `run_date={date_str}`",
         "attributes": {
             "run_date": date_str,
             "cumulate_results": str(cumulate_flag)
         }
     }
-    failed_attempts = []
-    for attempt_number in range(MAXIMUM_NUMBER_OF_ATTEMPTS):
 
-        response = await session.post(endpoint, json=json_args)
 
-        async with response:
-            text_response = await response.text()
-
-            if response.status == 200:
-                print(f'Completed on attempt: #{attempt_number} for args={json_args}')
-                return text_response
-            else:
-                failed_attempts.append((response.status, endpoint, text_response))
-                # No need to wait after the last attempt, we've given up now - so don't waste compute cycles
-                if attempt_number < MAXIMUM_NUMBER_OF_ATTEMPTS - 1:
-                    sleep_time = uniform(1, 16)
-                    await asyncio.sleep(sleep_time)
-                    print(f'run_manager_between slept for: {sleep_time:.2f}s')
-
-    print(f'Failed after {MAXIMUM_NUMBER_OF_ATTEMPTS} attempts for args={json_args}. Reasons: {failed_attempts}')
-    return f'Failed {MAXIMUM_NUMBER_OF_ATTEMPTS} Times'
+def _parse_retry_after(retry_after: str) -> float:
+    """ Retry-After is either a number of seconds or an http date. Returns seconds to wait, None if missing. """
+    if retry_after is None:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
 
 
 def _str_to_date(a_date: str, date_format: str = '%Y-%m-%d') -> date:
@@ -0,0 +1,131 @@
+import asyncio
+import base64
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import requests
+from pytest import fixture, raises
+
+from cloud_utils.authentication import IdentityTokenProvider, _jwt_expiry
+
+AUDIENCE = 'https://europe-west2-project.cloudfunctions.net/publish_message'
+
+
+def make_jwt(claims: dict) -> str:
+    def encode(part: dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(part).encode('utf-8')).decode('utf-8').rstrip('=')
+    return f"{encode({'alg': 'RS256'})}.{encode(claims)}.signature"
+
+
+@fixture
+def metadata_server():
+    """ local stand-in for the metadata server identity endpoint. Tokens expire server.lifetime seconds after now,
+        server.delay slows every response down.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            with server.lock:
+                server.requests.append(self.path)
+            time.sleep(server.delay)
+            if self.headers.get('Metadata-Flavor') != 'Google':
+                self.send_response(403)
+                body = b'Missing Metadata-Flavor header'
+            else:
+                audience = parse_qs(urlparse(self.path).query)['audience'][0]
+                self.send_response(200)
+                body = make_jwt({'aud': audience, 'exp': int(time.time() + server.lifetime),
+                                 'n': len(server.requests)}).encode('utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.delay = 0
+    server.lifetime = 3600
+    server.url = (f'http://127.0.0.1:{server.server_address[1]}'
+                  '/computeMetadata/v1/instance/service-accounts/default/identity')
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_get_token_cached_per_audience(metadata_server):
+    provider = IdentityTokenProvider(metadata_url=metadata_server.url)
+
+    first = provider.get_token(AUDIENCE)
+    assert provider.get_token(AUDIENCE) == first
+    other = provider.get_token('https://other')
+
+    assert other != first
+    assert len(metadata_server.requests) == 2
+    assert json.loads(base64.urlsafe_b64decode(first.split('.')[1] + '==='))['aud'] == AUDIENCE
+
+
+def test_get_token_refreshed_before_expiry(metadata_server):
+    now = [time.time()]
+    provider = IdentityTokenProvider(metadata_url=metadata_server.url, refresh_margin=300, clock=lambda: now[0])
+
+    first = provider.get_token(AUDIENCE)
+    now[0] += 3600 - 301
+    assert provider.get_token(AUDIENCE) == first
+    now[0] += 2
+    assert provider.get_token(AUDIENCE) != first
+    assert len(metadata_server.requests) == 2
+
+
+def test_get_token_concurrent_threads_fetch_once(metadata_server):
+    metadata_server.delay = 0.2
+    provider = IdentityTokenProvider(metadata_url=metadata_server.url)
+
+    with ThreadPoolExecutor(max_workers=20) as executor:
+        tokens = list(executor.map(lambda _: provider.get_token(AUDIENCE), range(20)))
+
+    assert len(set(tokens)) == 1
+    assert len(metadata_server.requests) == 1
+
+
+def test_get_token_async_fetch_once(metadata_server):
+    metadata_server.delay = 0.2
+    provider = IdentityTokenProvider(metadata_url=metadata_server.url)
+
+    async def get_tokens():
+        return await asyncio.gather(*(provider.get_token_async(AUDIENCE) for _ in range(20)))
+
+    assert len(set(asyncio.run(get_tokens()))) == 1
+    assert len(metadata_server.requests) == 1
+
+
+def test_get_token_times_out(metadata_server):
+    metadata_server.delay = 1
+    provider = IdentityTokenProvider(metadata_url=metadata_server.url, timeout=(1, 0.2))
+
+    with raises(requests.exceptions.Timeout):
+        provider.get_token(AUDIENCE)
+
+
+def test_get_token_expired_not_reused(metadata_server):
+    metadata_server.lifetime = 0  # already expired
+    provider = IdentityTokenProvider(metadata_url=metadata_server.url)
+
+    provider.get_token(AUDIENCE)
+    provider.get_token(AUDIENCE)
+
+    assert len(metadata_server.requests) == 2
+    assert _jwt_expiry('not-a-jwt') is None
+    assert _jwt_expiry(make_jwt({'aud': AUDIENCE})) is None
+    assert _jwt_expiry(make_jwt({'exp': 1600000000})) == 1600000000
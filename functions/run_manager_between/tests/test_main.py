@@ -0,0 +1,177 @@
+import asyncio
+from time import perf_counter
+
+import pandas as pd
+from aiohttp import web
+
+from main import publish_messages_async, publish_batches_async, summarise_outcomes, _parse_retry_after
+
+
+async def run_with_stand_in(failures: dict, collection: list, **options) -> (list, dict):
+    """ runs publish_messages_async against a local stand-in for `publish_message`.
+        failures: {run_date: [response, ...]} injected, one per request, before succeeding. A response is a
+        status code, (status code, Retry-After header), 'disconnect' or 'hang' (longer than the request timeout).
+    """
+    state = {'requests': {}, 'in_flight': 0, 'max_in_flight': 0}
+
+    async def handle(request: web.Request) -> web.Response:
+        run_date = (await request.json())['attributes']['run_date']
+        attempt = state['requests'].get(run_date, 0)
+        state['requests'][run_date] = attempt + 1
+        state['in_flight'] += 1
+        state['max_in_flight'] = max(state['max_in_flight'], state['in_flight'])
+        try:
+            await asyncio.sleep(0.02)
+            planned = failures.get(run_date, [])
+            failure = planned[attempt] if attempt < len(planned) else None
+            if failure is None:
+                return web.Response(text='Successfully Published')
+            if failure == 'disconnect':
+                request.transport.close()
+                return web.Response(text='gone')
+            if failure == 'hang':
+                await asyncio.sleep(1)
+                return web.Response(text='too late')
+            status, retry_after = failure if isinstance(failure, tuple) else (failure, None)
+            headers = {'Retry-After': retry_after} if retry_after is not None else {}
+            return web.Response(status=status, text='try again', headers=headers)
+        finally:
+            state['in_flight'] -= 1
+
+    app = web.Application()
+    app.router.add_post('/publish_message', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        outcomes = await publish_messages_async(f'http://127.0.0.1:{port}/publish_message', collection,
+                                                header={}, **options)
+    finally:
+        await runner.cleanup()
+    return outcomes, state
+
+
+def weekly_collection(n: int) -> list:
+    dates = pd.date_range('2020-01-03', periods=n, freq='7D')
+    return list(zip(dates, dates == dates.max()))
+
+
+def test_publish_messages_async_bounded_concurrency():
+    outcomes, state = asyncio.run(run_with_stand_in({}, weekly_collection(20), max_concurrency=3))
+
+    assert state['max_in_flight'] == 3
+    assert [outcome['status'] for outcome in outcomes] == ['published'] * 20
+    assert [outcome['run_date'] for outcome in outcomes] == [f'{d:%Y-%m-%d}' for d, _ in weekly_collection(20)]
+
+
+def test_publish_messages_async_retries_failures():
+    failures = {
+        '2020-01-03': [500, 502],
+        '2020-01-10': ['disconnect'],
+        '2020-01-17': ['hang'],
+        '2020-01-24': [500, 500, 500],
+    }
+
+    outcomes, state = asyncio.run(run_with_stand_in(
+        failures, weekly_collection(5), max_attempts=3, backoff_base=0.01, request_timeout=0.5
+    ))
+    report = summarise_outcomes(outcomes)
+
+    assert report['published'] == 4 and report['failed'] == 1
+    dates = report['dates']
+    assert dates['2020-01-03']['attempts'] == 3 and dates['2020-01-03']['errors'] == ['500: try again', '502: try again']
+    assert dates['2020-01-10']['attempts'] == 2 and 'ServerDisconnectedError' in dates['2020-01-10']['errors'][0]
+    assert dates['2020-01-17']['attempts'] == 2 and 'TimeoutError' in dates['2020-01-17']['errors'][0]
+    assert dates['2020-01-24'] == {'run_date': '2020-01-24', 'status': 'failed', 'attempts': 3, 'response': None,
+                                   'errors': ['500: try again'] * 3}
+    assert dates['2020-01-31']['attempts'] == 1 and dates['2020-01-31']['response'] == 'Successfully Published'
+    assert state['requests']['2020-01-24'] == 3
+
+
+def test_publish_messages_async_honours_retry_after():
+    failures = {'2020-01-03': [(429, '1')], '2020-01-10': [(503, '1')]}
+
+    start = perf_counter()
+    outcomes, _ = asyncio.run(run_with_stand_in(failures, weekly_collection(2), backoff_base=0.01))
+
+    assert perf_counter() - start >= 1
+    assert [outcome['attempts'] for outcome in outcomes] == [2, 2]
+
+
+def test_parse_retry_after():
+    assert _parse_retry_after(None) is None
+    assert _parse_retry_after('3') == 3
+    assert _parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+    assert _parse_retry_after('soon') is None
+
+
+async def run_with_batch_stand_in(message_failures: dict, statuses: list, collection: list, **options) -> (list, dict):
+    """ runs publish_batches_async against a local stand-in for `publish_message` with "messages".
+        message_failures: {run_date: count} of times publishing that message fails before succeeding.
+        statuses: status codes of the first requests, before answering with 200.
+    """
+    state = {'requests': [], 'published': {}}
+
+    async def handle(request: web.Request) -> web.Response:
+        messages = (await request.json())['messages']
+        state['requests'].append([message['attributes']['run_date'] for message in messages])
+        if len(state['requests']) <= len(statuses):
+            return web.Response(status=statuses[len(state['requests']) - 1], text='try again')
+        results = []
+        for message in messages:
+            run_date = message['attributes']['run_date']
+            if message_failures.get(run_date, 0) > 0:
+                message_failures[run_date] -= 1
+                results.append({'error': 'DeadlineExceeded: publish timed out'})
+            else:
+                state['published'][run_date] = message['attributes']['cumulate_results']
+                results.append({'message_id': f'id-{run_date}'})
+        return web.json_response({'results': results})
+
+    app = web.Application()
+    app.router.add_post('/publish_message', handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    try:
+        outcomes = await publish_batches_async(f'http://127.0.0.1:{port}/publish_message', collection,
+                                               header={}, **options)
+    finally:
+        await runner.cleanup()
+    return outcomes, state
+
+
+def test_publish_batches_async_few_requests():
+    outcomes, state = asyncio.run(run_with_batch_stand_in({}, [], weekly_collection(25), messages_per_request=10))
+
+    assert [len(run_dates) for run_dates in state['requests']] == [10, 10, 5]
+    assert [outcome['run_date'] for outcome in outcomes] == [f'{d:%Y-%m-%d}' for d, _ in weekly_collection(25)]
+    assert all(outcome['status'] == 'published' and outcome['attempts'] == 1 for outcome in outcomes)
+    assert outcomes[0]['response'] == 'id-2020-01-03'
+    # only the last date cumulates results.
+    assert [flag for flag in state['published'].values()].count('True') == 1
+    assert state['published']['2020-06-19'] == 'True'
+
+
+def test_publish_batches_async_retries_failed_messages_only():
+    outcomes, state = asyncio.run(run_with_batch_stand_in(
+        {'2020-01-10': 1, '2020-01-17': 5}, [503], weekly_collection(4), max_attempts=3, backoff_base=0.01
+    ))
+    report = summarise_outcomes(outcomes)
+
+    assert state['requests'] == [
+        ['2020-01-03', '2020-01-10', '2020-01-17', '2020-01-24'],  # 503, everything is sent again
+        ['2020-01-03', '2020-01-10', '2020-01-17', '2020-01-24'],
+        ['2020-01-10', '2020-01-17'],
+    ]
+    assert report['published'] == 3 and report['failed'] == 1
+    dates = report['dates']
+    assert dates['2020-01-03'] == {'run_date': '2020-01-03', 'status': 'published', 'attempts': 2,
+                                   'response': 'id-2020-01-03', 'errors': ['503: try again']}
+    assert dates['2020-01-10']['attempts'] == 3
+    assert dates['2020-01-17'] == {'run_date': '2020-01-17', 'status': 'failed', 'attempts': 3, 'response': None,
+                                   'errors': ['503: try again'] + ['DeadlineExceeded: publish timed out'] * 2}
@@ -0,0 +1,209 @@
+""" In-process backfill: results of every weekly draw between two dates, computed in one process.
+
+    `run_manager_between` publishes one message per week, so every week cold starts its own `run_manager`, which
+    reads the selected numbers and downloads the full draw history again. Here the selected numbers are read once,
+    the draw history is downloaded once, every week is checked in one batch, the weeks are written concurrently
+    and summaries are cumulated once at the end.
+
+    Usage (from repo root):
+        python -m manager.backfill --start 2020-08-01 --end 2021-01-05
+        python -m manager.backfill --start 2020-08-01 --end 2021-01-05 --selected ./selected_numbers.csv \
+            --base-url http://localhost:8000 --output-dir ./backfill
+
+    --selected and --output-dir replace BigQuery with local files, --base-url points at a stand-in lottery website.
+"""
+import argparse
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from pathlib import Path
+
+import pandas as pd
+
+from manager.bigquery.read import DATASET_ID_PATTERN
+from manager.cache import PrizeBreakdownStore
+from manager.check_matches import check_matches_many_draws
+from manager.scrape_results import (
+    scrape_historical_results, scrape_prize_breakdowns, extract_draw_results, DrawHistory, BASE_URL
+)
+from manager.tools import get_last_friday_date, prize_to_pence
+
+
+def draw_dates_between(start_date: date, end_date: date) -> {str: date}:
+    """ the weekly draws `run_manager_between` would run for: every 7 days from start_date to end_date, inclusive,
+        as pd.date_range gives them, mapped to the last friday (see `get_last_friday_date`).
+        Returns {dataset_name: draw_date}, in date order.
+    """
+    if start_date >= end_date:
+        raise ValueError(f'Start Date: {start_date} is NOT before End Date: {end_date}.')
+
+    draw_dates = {}
+    for run_date in pd.date_range(start_date, end_date, freq='7D'):
+        draw_date, dataset_name = get_last_friday_date(run_date.date())
+        draw_dates[dataset_name] = draw_date
+    return draw_dates
+
+
+def compute_weekly_results(
+        selected: pd.DataFrame, hist_results: pd.DataFrame, draw_results: {str: dict}, breakdowns: dict
+) -> {str: (pd.DataFrame, dict, dict)}:
+    """ checks selected against every draw in draw_results ({dataset_name: draw_result}) at once, see
+        `check_matches_many_draws`. Returns {dataset_name: (results, draw_result, prize_breakdown)}, as
+        `run_manager` would produce them week by week, with empty results if selected is empty.
+        breakdowns: {DrawNumber: prize_breakdown}.
+    """
+    draw_numbers = [draw_result['DrawNumber'] for draw_result in draw_results.values()]
+
+    draws = hist_results[hist_results['DrawNumber'].isin(draw_numbers)]
+    all_results = check_matches_many_draws(selected, draws, breakdowns)
+    results_by_draw = dict(iter(all_results.drop(columns='DrawDate').groupby('DrawNumber', sort=False)))
+    no_results = all_results.drop(columns='DrawDate').iloc[:0]
+
+    weekly_results = {}
+    for dataset_name, draw_result in draw_results.items():
+        draw_number = draw_result['DrawNumber']
+        results = results_by_draw.get(draw_number, no_results).drop(columns='DrawNumber').reset_index(drop=True)
+        weekly_results[dataset_name] = (results, draw_result, breakdowns.get(draw_number, {}))
+    return weekly_results
+
+
+def backfill(
+        start_date: date, end_date: date, selected: pd.DataFrame, writer, base_url: str = BASE_URL,
+        cache_dir: str = None, max_workers: int = 4) -> [str]:
+    """ computes and writes results of every draw between start_date and end_date, then cumulates summaries once.
+        writer is a `BigQueryResultsWriter` or a `LocalResultsWriter`. Returns the dataset names written.
+    """
+    draw_dates = draw_dates_between(start_date, end_date)
+
+    hist_results = scrape_historical_results(cache_dir=cache_dir, base_url=base_url)
+    draw_results = dict(zip(draw_dates, extract_draw_results(draw_dates.values(), DrawHistory(hist_results))))
+    store = PrizeBreakdownStore(os.path.join(cache_dir, 'prize_breakdowns')) if cache_dir else None
+    breakdowns = scrape_prize_breakdowns([draw_result['DrawNumber'] for draw_result in draw_results.values()],
+                                         store=store, base_url=base_url)
+
+    weekly_results = compute_weekly_results(selected, hist_results, draw_results, breakdowns)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(lambda item: writer.write(item[0], *item[1]), weekly_results.items()))
+    writer.cumulate()
+
+    print(f'Backfilled {len(weekly_results)} draws between {start_date} and {end_date}')
+    return list(weekly_results)
+
+
+class BigQueryResultsWriter:
+    """ writes each draw with `establish_results_in_bigquery`, then rebuilds the summaries: a backfill may
+        overwrite draws which were already summarised, so an incremental update is not enough.
+    """
+    def __init__(self, layout: str = 'per_dataset'):
+        self.layout = layout
+
+    def write(self, dataset_name: str, results: pd.DataFrame, draw_result: dict, prize_breakdown: dict) -> None:
+        from manager.bigquery import establish_results_in_bigquery
+
+        establish_results_in_bigquery(dataset_name, results, draw_result, prize_breakdown, layout=self.layout,
+                                      concurrent=True, confirm=False)
+
+    def cumulate(self) -> None:
+        from manager.bigquery import cumulating_results
+
+        cumulating_results(full_rebuild=True, layout=self.layout)
+
+
+class LocalResultsWriter:
+    """ local stand-in for BigQuery. Each draw is written as csv files to directory/<dataset_name>/ and
+        summaries of every draw in directory to directory/manager/.
+    """
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+
+    def write(self, dataset_name: str, results: pd.DataFrame, draw_result: dict, prize_breakdown: dict) -> None:
+        dataset_dir = self.directory / dataset_name
+        dataset_dir.mkdir(parents=True, exist_ok=True)
+        results.to_csv(dataset_dir / 'results.csv', index=False)
+        pd.DataFrame({'Draw': list(draw_result), 'Outcome': list(draw_result.values())}).to_csv(
+            dataset_dir / 'draw_outcome.csv', index=False)
+        pd.DataFrame({'Match_Type': list(prize_breakdown), 'Prize_Per_UK_Winner': list(prize_breakdown.values())}
+                     ).to_csv(dataset_dir / 'prize_breakdown.csv', index=False)
+
+    def cumulate(self) -> None:
+        results_by_dataset = {
+            path.parent.name: pd.read_csv(path) for path in sorted(self.directory.glob('*/results.csv'))
+            if re.fullmatch(DATASET_ID_PATTERN, path.parent.name)
+        }
+        general_summary, player_summary = summarise_results(results_by_dataset)
+
+        manager_dir = self.directory / 'manager'
+        manager_dir.mkdir(parents=True, exist_ok=True)
+        general_summary.to_csv(manager_dir / 'general_summary.csv', index=False)
+        player_summary.to_csv(manager_dir / 'player_summary.csv', index=False)
+
+
+def summarise_results(results_by_dataset: {str: pd.DataFrame}) -> (pd.DataFrame, pd.DataFrame):
+    """ pandas version of the general and player summary queries (see manager.bigquery.queries), same columns. """
+    general_rows, player_shares = [], []
+    for dataset_id, results in results_by_dataset.items():
+        if results.empty:
+            continue
+        winnings = prize_to_pence(results['Prize'])
+        winning_match_types = results.loc[winnings > 0, 'Match_Type'].tolist()
+        general_rows.append({
+            'Play_Date': dataset_id,
+            'Num_of_Players': len(results),
+            'Total_Winnings': winnings.sum() / 100,
+            'Winnings_per_Player': winnings.sum() / (100 * len(results)),
+            'Winning_Match_Type': '; '.join(winning_match_types) if winning_match_types else None,
+        })
+        player_shares.append(pd.DataFrame({
+            'Name': results['Name'], 'Winnings_per_Player': winnings.sum() / (100 * len(results))
+        }))
+
+    general_summary = pd.DataFrame(general_rows, columns=[
+        'Play_Date', 'Num_of_Players', 'Total_Winnings', 'Winnings_per_Player', 'Winning_Match_Type'
+    ])
+    if not player_shares:
+        return general_summary, pd.DataFrame(columns=['Name', 'Total_Cumulated_Winnings', 'Days_Played'])
+
+    player_summary = pd.concat(player_shares, ignore_index=True).groupby('Name', sort=False).agg(
+        Total_Cumulated_Winnings=('Winnings_per_Player', 'sum'), Days_Played=('Winnings_per_Player', 'size')
+    ).reset_index()
+    return general_summary, player_summary
+
+
+def main(argv: [str] = None) -> None:
+    parser = argparse.ArgumentParser(description='Backfill results of every weekly draw between two dates.')
+    parser.add_argument('--start', required=True, type=_str_to_date, help='start date, YYYY-MM-DD')
+    parser.add_argument('--end', required=True, type=_str_to_date, help='end date, YYYY-MM-DD')
+    parser.add_argument('--selected', help='selected numbers csv, instead of manager.selected_numbers in BigQuery')
+    parser.add_argument('--output-dir', help='write results and summaries as csv files here, instead of BigQuery')
+    parser.add_argument('--base-url', default=BASE_URL, help='lottery website, or a local stand-in')
+    parser.add_argument('--cache-dir', help='keep the draw history and prize breakdowns here between runs')
+    parser.add_argument('--layout', default='per_dataset', choices=['per_dataset', 'consolidated'],
+                        help='BigQuery results layout, see manager.bigquery')
+    parser.add_argument('--max-workers', type=int, default=4, help='draws written concurrently')
+    args = parser.parse_args(argv)
+
+    if args.selected:
+        selected = pd.read_csv(args.selected)
+    else:
+        from manager.bigquery import read_selected_numbers
+        selected = read_selected_numbers()
+
+    writer = LocalResultsWriter(args.output_dir) if args.output_dir else BigQueryResultsWriter(args.layout)
+
+    backfill(args.start, args.end, selected, writer, base_url=args.base_url, cache_dir=args.cache_dir,
+             max_workers=args.max_workers)
+
+
+def _str_to_date(a_date: str, date_format: str = '%Y-%m-%d') -> date:
+    """ converts date string to date object, for argparse. """
+    try:
+        return datetime.strptime(a_date, date_format).date()
+    except ValueError as ve:
+        raise argparse.ArgumentTypeError(f'Date given: {a_date}, does not match expected date format: {date_format}') \
+            from ve
+
+
+if __name__ == '__main__':
+    main()
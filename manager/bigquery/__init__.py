@@ -1,54 +1,198 @@
+import os
+from datetime import datetime
+
 import pandas as pd
 import google.cloud.bigquery as bq
 
-from manager.bigquery.read import get_dataset_ids_with_results
+from manager.bigquery.client import get_client
+from manager.bigquery.read import get_dataset_ids_with_results, get_summarised_dataset_ids, clear_dataset_ids_cache
 from manager.bigquery.read import read_selected_numbers
-from manager.bigquery.write import create_bigquery_dataset, write_dataframe_to_bigquery, write_dictionary_to_bigquery
-from manager.bigquery.queries import run_query, create_general_summary_query, create_player_summary_query
+from manager.bigquery.write import create_bigquery_dataset, write_dataframe_to_bigquery, write_dataframes_to_bigquery
+from manager.bigquery.write import dictionary_to_dataframe, write_dataframe_chunks_to_bigquery
+from manager.bigquery.queries import (
+    run_query, run_script, batch_dataset_ids, create_batched_summary_queries, create_incremental_summary_script,
+    create_consolidated_general_summary_query, create_consolidated_player_summary_query, create_consolidation_query,
+    WATERMARK_TABLE_NAME, CONSOLIDATED_TABLE_NAMES, CONSOLIDATED_PENCE_COLUMNS, PLAYER_SUMMARY_STAGING_TABLE_NAME
+)
+from manager.tools import prize_to_pence
+
+
+PER_DATASET_LAYOUT = 'per_dataset'
+CONSOLIDATED_LAYOUT = 'consolidated'
 
 
 def establish_results_in_bigquery(
-        dataset_name: str, results: pd.DataFrame, draw_result: dict, prize_breakdown: dict) -> None:
+        dataset_name: str, results: pd.DataFrame, draw_result: dict, prize_breakdown: dict,
+        layout: str = PER_DATASET_LAYOUT, concurrent: bool = False, confirm: bool = True) -> dict:
     """ High level function which "establishes" given results in BigQuery. This includes:
              - creating a dataset if one doesn't already exist
              - writing additional results to the dataset which was just created.
-    """
-    bq_client = bq.Client()
+        With the consolidated layout, results are instead written to the draw's partition of the consolidated
+        tables in the "manager" dataset, see `_establish_results_in_consolidated_tables`.
 
-    create_bigquery_dataset(bq_client, dataset_name=dataset_name)
+        With concurrent, the three load jobs run at the same time. Without confirm, tables are not read back
+        after loading. Returns the report of `write_dataframes_to_bigquery`, with per job timings.
+    """
+    bq_client = get_client()
 
-    write_dataframe_to_bigquery(bq_client, data=results, table_name='results', dataset_name=dataset_name)
+    if layout == CONSOLIDATED_LAYOUT:
+        return _establish_results_in_consolidated_tables(bq_client, dataset_name, results, draw_result,
+                                                         prize_breakdown, concurrent=concurrent, confirm=confirm)
 
-    write_dictionary_to_bigquery(bq_client, data=draw_result, col_names=['Draw', 'Outcome'],
-                                 table_name='draw_outcome', dataset_name=dataset_name)
+    create_bigquery_dataset(bq_client, dataset_name=dataset_name)
 
-    write_dictionary_to_bigquery(bq_client, data=prize_breakdown, col_names=['Match_Type', 'Prize_Per_UK_Winner'],
-                                 table_name='prize_breakdown', dataset_name=dataset_name)
+    tables = {
+        'results': results,
+        'draw_outcome': dictionary_to_dataframe(draw_result, col_names=['Draw', 'Outcome']),
+        'prize_breakdown': dictionary_to_dataframe(prize_breakdown, col_names=['Match_Type', 'Prize_Per_UK_Winner']),
+    }
+    report = write_dataframes_to_bigquery(bq_client, tables, dataset_name=dataset_name,
+                                          concurrent=concurrent, confirm=confirm)
+    clear_dataset_ids_cache()  # dataset_name has results now
 
     print(f'Successfully written all results to BigQuery {bq_client.project}.{dataset_name}')
-    return
+    return report
 
 
-def cumulating_results() -> None:
+def cumulating_results(full_rebuild: bool = False, layout: str = PER_DATASET_LAYOUT) -> None:
     """ High level function which runs queries on all results results tables in the selected dataset_ids.
         Queries will produce bespoke summary tables from all results.
+
+        By default only datasets not yet in the summaries (see the watermark table) are aggregated and merged
+        into the existing summary tables. With full_rebuild, or when there is no watermark table, the summary
+        tables are rebuilt from every dataset. Rebuild after overwriting results of an already summarised draw.
+
+        With the consolidated layout, summaries are always rebuilt, each with one GROUP BY query.
     """
-    bq_client = bq.Client()
+    bq_client = get_client()
 
-    datasets_ids_with_results = get_dataset_ids_with_results(bq_client)
+    if layout == CONSOLIDATED_LAYOUT:
+        results_table = f'{bq_client.project}.manager.{CONSOLIDATED_TABLE_NAMES["results"]}'
+        run_query(client=bq_client, query=create_consolidated_general_summary_query(results_table),
+                  destination_table_name='general_summary')
+        run_query(client=bq_client, query=create_consolidated_player_summary_query(results_table),
+                  destination_table_name='player_summary')
+        return
 
-    if datasets_ids_with_results:
-        run_query(
+    datasets_ids_with_results = get_dataset_ids_with_results(bq_client, region=os.getenv('REGION'))
+
+    if not datasets_ids_with_results:
+        print('func "cumulating_results" Found No Datasets with results')
+        return
+
+    summarised_dataset_ids = None if full_rebuild else get_summarised_dataset_ids(bq_client, WATERMARK_TABLE_NAME)
+
+    if summarised_dataset_ids is None:
+        _rebuild_summaries(bq_client, datasets_ids_with_results)
+        return
+
+    new_dataset_ids = [dataset_id for dataset_id in datasets_ids_with_results
+                       if dataset_id not in summarised_dataset_ids]
+    # each batch is its own transaction and watermarks its datasets, so a failed batch is simply retried next run.
+    for batch in batch_dataset_ids(new_dataset_ids):
+        run_script(
             client=bq_client,
-            query=create_general_summary_query(dataset_ids=datasets_ids_with_results),
-            destination_table_name='general_summary'
+            script=create_incremental_summary_script(dataset_ids=batch),
+            script_name='incremental_summary'
         )
+    if not new_dataset_ids:
+        print('func "cumulating_results" Found No new Datasets since summaries were last updated')
+
+    return
+
+
+def _rebuild_summaries(bq_client: bq.Client, dataset_ids: [str]) -> None:
+    """ rebuilds summary tables from every dataset, in batches (see `create_batched_summary_queries`).
+        The watermark is dropped first and only written once both summaries are rebuilt, so a failure part way
+        through leads to another full rebuild next time.
+    """
+    bq_client.delete_table(f'{bq_client.project}.manager.{WATERMARK_TABLE_NAME}', not_found_ok=True)
+
+    for query, destination_table_name, write_disposition in create_batched_summary_queries(dataset_ids):
         run_query(
             client=bq_client,
-            query=create_player_summary_query(dataset_ids=datasets_ids_with_results),
-            destination_table_name='player_summary'
+            query=query,
+            destination_table_name=destination_table_name,
+            write_disposition=write_disposition
         )
-    else:
-        print('func "cumulating_results" Found No Datasets with results')
+    bq_client.delete_table(f'{bq_client.project}.manager.{PLAYER_SUMMARY_STAGING_TABLE_NAME}', not_found_ok=True)
+
+    write_dataframe_to_bigquery(bq_client, data=pd.DataFrame({'Dataset_Id': dataset_ids}),
+                                table_name=WATERMARK_TABLE_NAME, dataset_name='manager')
+    return
+
+
+def migrate_to_consolidated_layout(
+        dataset_ids: [str] = None, destination_dataset_name: str = 'manager', batch_size: int = 100) -> None:
+    """ Copies results, draw_outcome and prize_breakdown of every per draw dataset (or the given dataset_ids)
+        into the consolidated tables, replacing their contents. Per draw datasets are left untouched.
+        Datasets are copied batch_size at a time to keep each query small.
+    """
+    bq_client = get_client()
+    if dataset_ids is None:
+        dataset_ids = get_dataset_ids_with_results(bq_client, region=os.getenv('REGION'))
+
+    for table_name, consolidated_table_name in CONSOLIDATED_TABLE_NAMES.items():
+        for start in range(0, len(dataset_ids), batch_size):
+            run_query(
+                client=bq_client,
+                query=create_consolidation_query(dataset_ids[start:start + batch_size], table_name),
+                destination_table_name=consolidated_table_name,
+                destination_dataset_name=destination_dataset_name,
+                write_disposition='WRITE_TRUNCATE' if start == 0 else 'WRITE_APPEND',
+                **_consolidated_table_options(table_name)
+            )
 
+    print(f'Migrated {len(dataset_ids)} datasets to the consolidated layout in {destination_dataset_name}')
     return
+
+
+def _establish_results_in_consolidated_tables(
+        bq_client: bq.Client, dataset_name: str, results: pd.DataFrame, draw_result: dict, prize_breakdown: dict,
+        destination_dataset_name: str = 'manager', concurrent: bool = False, confirm: bool = True) -> dict:
+    """ writes the draw's tables into its Draw_Date partition of the consolidated tables, replacing only that
+        partition, so re-running a draw is idempotent. dataset_name (YYYY_MM_DD_...) is kept as Play_Date.
+        Unlike the per draw tables, columns are typed: prizes are integer pence (see CONSOLIDATED_PENCE_COLUMNS).
+    """
+    draw_date = datetime.strptime(dataset_name[:10], '%Y_%m_%d').date()
+    tables = {
+        'results': results.assign(Prize=prize_to_pence(results['Prize'])),
+        'draw_outcome': dictionary_to_dataframe(draw_result, col_names=['Draw', 'Outcome']),
+        'prize_breakdown': pd.DataFrame({'Match_Type': list(prize_breakdown),
+                                         'Prize_Per_UK_Winner': prize_to_pence(pd.Series(prize_breakdown.values(),
+                                                                                         dtype=object))}),
+    }
+    consolidated_tables, table_options = {}, {}
+    for table_name, data in tables.items():
+        data = data.rename(columns=CONSOLIDATED_PENCE_COLUMNS.get(table_name, {}))
+        data = data.assign(Play_Date=dataset_name, Draw_Date=draw_date)
+        data = data[['Play_Date', 'Draw_Date'] + [col for col in data.columns if col not in ('Play_Date', 'Draw_Date')]]
+        consolidated_tables[CONSOLIDATED_TABLE_NAMES[table_name]] = data
+        table_options[CONSOLIDATED_TABLE_NAMES[table_name]] = {
+            'schema': _consolidated_schema(data),
+            'partition': f'{draw_date:%Y%m%d}',
+            **_consolidated_table_options(table_name)
+        }
+
+    report = write_dataframes_to_bigquery(bq_client, consolidated_tables, dataset_name=destination_dataset_name,
+                                          table_options=table_options, concurrent=concurrent, confirm=confirm)
+
+    print(f'Successfully written all results to BigQuery {bq_client.project}.{destination_dataset_name}, '
+          f'partition {draw_date}')
+    return report
+
+
+def _consolidated_schema(data: pd.DataFrame) -> [bq.SchemaField]:
+    """ declared types of the consolidated tables: Draw_Date is a DATE, prizes (pence) and numbers are INT64. """
+    return [bq.SchemaField('Draw_Date', bq.enums.SqlTypeNames.DATE)] + [
+        bq.SchemaField(col, bq.enums.SqlTypeNames.INT64) for col in data.columns
+        if col.endswith('_Pence') or col.endswith('_Matched') or col.startswith(('Number_', 'Lucky_Star_'))
+    ]
+
+
+def _consolidated_table_options(table_name: str) -> dict:
+    """ consolidated tables are partitioned by Draw_Date, results are also clustered by Name. """
+    return {
+        'time_partitioning': bq.TimePartitioning(type_=bq.TimePartitioningType.DAY, field='Draw_Date'),
+        'clustering_fields': ['Name'] if table_name == 'results' else None,
+    }
@@ -0,0 +1,17 @@
+import threading
+
+import google.cloud.bigquery as bq
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> bq.Client:
+    """ BigQuery client shared by every call in this process, created on first use. Creating a client looks up
+        credentials and the project, so it is done once per cold start rather than once per call.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = bq.Client()
+    return _client
@@ -1,14 +1,39 @@
 import google.cloud.bigquery as bq
 
+WATERMARK_TABLE_NAME = 'summary_watermark'
+
+# per draw datasets are summarised SUMMARY_BATCH_SIZE at a time, so every query stays the same size however long
+# the history. BigQuery limits a query to 1,000 referenced tables and 1MB of (unresolved) SQL.
+SUMMARY_BATCH_SIZE = 100
+PLAYER_SUMMARY_STAGING_TABLE_NAME = 'player_summary_batches'
+
+# consolidated layout: every draw in one table per kind, partitioned by Draw_Date.
+CONSOLIDATED_TABLE_NAMES = {
+    'results': 'all_results',
+    'draw_outcome': 'all_draw_outcomes',
+    'prize_breakdown': 'all_prize_breakdowns',
+}
+# prize strings of the per draw tables (e.g. '£1,234.50') are integer pence in the consolidated tables.
+CONSOLIDATED_PENCE_COLUMNS = {
+    'results': {'Prize': 'Prize_Pence'},
+    'prize_breakdown': {'Prize_Per_UK_Winner': 'Prize_Per_UK_Winner_Pence'},
+}
+
 
 def run_query(
-        client: bq.Client, query: str, destination_table_name: str, destination_dataset_name: str = 'manager'
+        client: bq.Client, query: str, destination_table_name: str, destination_dataset_name: str = 'manager',
+        write_disposition: str = 'WRITE_TRUNCATE', time_partitioning: bq.TimePartitioning = None,
+        clustering_fields: [str] = None
 ) -> None:
 
-    """ High level func which runs a query and writes result to BigQuery. """
+    """ High level func which runs a query and writes result to BigQuery. By default, overwrites any existing
+        table. time_partitioning and clustering_fields are used if the query creates the destination table.
+    """
     job_config = bq.QueryJobConfig(
         destination='.'.join([client.project, destination_dataset_name, destination_table_name]),
-        write_disposition='WRITE_TRUNCATE'  # overwrite table any existing table.
+        write_disposition=write_disposition,
+        time_partitioning=time_partitioning,
+        clustering_fields=clustering_fields,
     )
     query_job = client.query(query, job_config=job_config)
     job_result = query_job.result()
@@ -16,23 +41,109 @@ def run_query(
     return
 
 
+def run_script(client: bq.Client, script: str, script_name: str) -> None:
+    """ High level func which runs DML statements or a multi-statement script, which writes its own results. """
+    query_job = client.query(script)
+    query_job.result()
+    print(f'{script_name} script completed, {query_job.num_dml_affected_rows} rows affected.')
+    return
+
+
+def batch_dataset_ids(dataset_ids: [str], batch_size: int = SUMMARY_BATCH_SIZE) -> [[str]]:
+    """ splits dataset_ids, in order, into lists of at most batch_size. """
+    return [dataset_ids[start:start + batch_size] for start in range(0, len(dataset_ids), batch_size)]
+
+
+def create_batched_summary_queries(
+        dataset_ids: [str], batch_size: int = SUMMARY_BATCH_SIZE, destination_dataset_name: str = 'manager'
+) -> [(str, str, str)]:
+    """ queries which rebuild the general and player summary tables from dataset_ids, one batch of datasets at a
+        time. Returns (query, destination_table_name, write_disposition) tuples to be run in order:
+            - general summary rows of each batch are final, so they are appended straight to general_summary.
+            - player summaries of each batch are appended to a staging table, then rolled up by Name into
+              player_summary. With a single batch the staging table is skipped.
+    """
+    batches = batch_dataset_ids(dataset_ids, batch_size)
+    player_table_name = 'player_summary' if len(batches) == 1 else PLAYER_SUMMARY_STAGING_TABLE_NAME
+
+    queries = []
+    for i, batch in enumerate(batches):
+        write_disposition = 'WRITE_TRUNCATE' if i == 0 else 'WRITE_APPEND'
+        queries.append((create_general_summary_query(batch), 'general_summary', write_disposition))
+        queries.append((create_player_summary_query(batch), player_table_name, write_disposition))
+
+    if len(batches) > 1:
+        staging_table = f'{destination_dataset_name}.{PLAYER_SUMMARY_STAGING_TABLE_NAME}'
+        queries.append((create_player_summary_rollup_query(staging_table), 'player_summary', 'WRITE_TRUNCATE'))
+
+    return queries
+
+
+def create_player_summary_rollup_query(staging_table: str) -> str:
+    """ rolls up the per batch player summaries in staging_table into one row per player. """
+    return \
+        f"""SELECT Name, SUM(Total_Cumulated_Winnings) AS Total_Cumulated_Winnings, SUM(Days_Played) AS Days_Played
+            FROM `{staging_table}`
+            GROUP BY Name"""
+
+
+def create_incremental_summary_script(dataset_ids: [str], destination_dataset_name: str = 'manager') -> str:
+    """ one transaction which merges the results of dataset_ids, not yet summarised, into the existing summary
+        tables and records them in the watermark table. Being one transaction, either all three tables are
+        updated or none are, so a dataset can never be counted twice in player_summary.
+        The script grows with dataset_ids, pass at most one batch (see `batch_dataset_ids`).
+    """
+    watermark_values = ', '.join(f"('{dataset_id}')" for dataset_id in dataset_ids)
+    return f"""BEGIN TRANSACTION;
+        {create_general_summary_merge_query(dataset_ids, destination_dataset_name)};
+        {create_player_summary_merge_query(dataset_ids, destination_dataset_name)};
+        INSERT INTO `{destination_dataset_name}.{WATERMARK_TABLE_NAME}` (Dataset_Id) VALUES {watermark_values};
+        COMMIT TRANSACTION;"""
+
+
+def create_general_summary_merge_query(dataset_ids: [str], destination_dataset_name: str = 'manager') -> str:
+    """ merges the general summary of dataset_ids into the general_summary table: rows of a Play_Date already
+        in the table are replaced, new Play_Dates are inserted.
+    """
+    return \
+        f"""MERGE `{destination_dataset_name}.general_summary` AS summary
+            USING ({create_general_summary_query(dataset_ids)}) AS new_summary
+            ON summary.Play_Date = new_summary.Play_Date
+            WHEN MATCHED THEN UPDATE SET
+                Num_of_Players = new_summary.Num_of_Players,
+                Total_Winnings = new_summary.Total_Winnings,
+                Winnings_per_Player = new_summary.Winnings_per_Player,
+                Winning_Match_Type = new_summary.Winning_Match_Type
+            WHEN NOT MATCHED THEN INSERT ROW"""
+
+
+def create_player_summary_merge_query(dataset_ids: [str], destination_dataset_name: str = 'manager') -> str:
+    """ adds the player summary of dataset_ids onto the player_summary table: winnings and days played are
+        added to existing players, new players are inserted. Only merge datasets which were not merged before.
+    """
+    return \
+        f"""MERGE `{destination_dataset_name}.player_summary` AS summary
+            USING ({create_player_summary_query(dataset_ids)}) AS new_summary
+            ON summary.Name = new_summary.Name
+            WHEN MATCHED THEN UPDATE SET
+                Total_Cumulated_Winnings = summary.Total_Cumulated_Winnings + new_summary.Total_Cumulated_Winnings,
+                Days_Played = summary.Days_Played + new_summary.Days_Played
+            WHEN NOT MATCHED THEN INSERT ROW"""
+
+
 def create_general_summary_query(dataset_ids: [str]) -> str:
-    """ join queries created using `_query_for_general_summary` to construct the final query which will
-        create the desired general summary table, where columns are:
+    """ appends the one row summaries created using `_query_for_general_summary` to construct the final query
+        which will create the desired general summary table, where columns are:
             - "Play_Date" (index): Date of draw (also the dateset_id)
             - "Num_of_Players":	Number of players who played in a given draw
             - "Total_Winnings":	Total of winnings from all players in a given draw
             - "Winnings_per_Player": Total_Winnings/Num_of_Players
             - "Winning_Match_Type": Match types which accomplished winnings. `null` if no winnings.
     """
-    query_for_all_general_summaries = ',\n'.join([
+    query_for_appending_summaries = '\nUNION ALL\n'.join([
         _query_for_general_summary(dataset_id) for dataset_id in dataset_ids
     ])
-    query_for_appending_summaries = ' UNION ALL\n'.join([
-        f'SELECT * FROM summary_{dataset_id}' for dataset_id in dataset_ids
-    ])
-    general_summary_query = 'WITH ' + query_for_all_general_summaries + '\n' + query_for_appending_summaries \
-                            + '\n ORDER BY Play_Date'
+    general_summary_query = query_for_appending_summaries + '\n ORDER BY Play_Date'
 
     return general_summary_query
 
@@ -61,67 +172,78 @@ def create_player_summary_query(dataset_ids: [str]) -> str:
 
 
 def _query_for_general_summary(dataset_id: str) -> str:
-    """ **query to create tables needed from one dataset**
-    * results_with_new_columns:
-        select columns of interest and create Play_Date col
-        convert Prize (type string, [£,.0-9]) to int to avoid rounding errors
-        add Num_of_Players which is the length of the data by design
-
-    * filtered_match_types - helper query
-
-    * winning_match_types -> 1x1 table:
-        EXISTS checks if query result is empty or not
-        It only returns True or False
-
-    * collapsed_to_one_row -> 4x1 table:
-        aggregates results
-
-    * summary:
-        converts ints (pence) into float (pounds) after aggregation
+    """ **query to summarise one dataset in a single pass over its results table**
+    * winnings: convert Prize (type string, [£,.0-9]) to int (pence) to avoid rounding errors
+    * one aggregation then gives the number of players (rows), total winnings and the match types which won.
+      STRING_AGG skips NULLs, so Winning_Match_Type is `null` if nobody won.
+    * converts ints (pence) into float (pounds) after aggregation
+    * HAVING drops the row of an empty results table, which has no players to share winnings between.
     """
     return \
-        f"""results_with_new_columns_{dataset_id} AS (
-                SELECT Match_Type, '{dataset_id}' AS Play_Date,
-                    CAST(REGEXP_REPLACE(Prize, r"[\D]+", "") AS INT64) AS Winnings,
-                    (select COUNT(*) from `{dataset_id}.results`) AS Num_of_Players
+        f"""SELECT '{dataset_id}' AS Play_Date, COUNT(*) AS Num_of_Players, (SUM(Winnings) / 100) AS Total_Winnings,
+                (SUM(Winnings) / (100 * COUNT(*))) AS Winnings_per_Player,
+                STRING_AGG(IF(Winnings > 0, Match_Type, NULL), '; ') AS Winning_Match_Type
+            FROM (
+                SELECT Match_Type, CAST(REGEXP_REPLACE(Prize, r"[\D]+", "") AS INT64) AS Winnings
                 FROM `{dataset_id}.results`
-            ),
-            filtered_match_types_{dataset_id} AS (
-                SELECT Match_Type 
-                FROM results_with_new_columns_{dataset_id}
-                WHERE Winnings > 0
-            ),
-            winning_match_types_{dataset_id} AS (
-                SELECT
-                    CASE 
-                    WHEN EXISTS(SELECT Match_Type FROM filtered_match_types_{dataset_id})
-                      THEN STRING_AGG(Match_Type, '; ')
-                      ELSE NULL
-                    END AS Winning_Match_Type
-                FROM filtered_match_types_{dataset_id}
-            ),
-            collapsed_to_one_row_{dataset_id} AS(
-                SELECT DISTINCT Play_Date, Num_of_Players, 
-                                (SELECT Winning_Match_Type FROM winning_match_types_{dataset_id}) AS Winning_Match_Type,
-                                (SELECT SUM(Winnings) AS Total_Winnings FROM results_with_new_columns_{dataset_id}) AS Total_Winnings
-                FROM results_with_new_columns_{dataset_id}
-            ),
-            summary_{dataset_id} AS (
-                SELECT Play_Date, Num_of_Players, (Total_Winnings / 100) AS Total_Winnings, 
-                (Total_Winnings / (100 * Num_of_Players)) AS Winnings_per_Player, Winning_Match_Type
-                FROM collapsed_to_one_row_{dataset_id}
-            )"""
+            )
+            HAVING COUNT(*) > 0"""
 
 
 def _query_for_player_summary(dataset_id: str) -> str:
-    """ **query to create tables needed from one dataset**
+    """ **query to share out the winnings of one dataset in a single pass over its results table**
     Insert dataset_id as Play_Date,
     Select Name,
-    Compute Winnings per player
+    Compute Winnings per player: window aggregates over the whole table, rather than a subquery per row
     """
     return \
-        f"""SELECT '{dataset_id}' AS Play_Date, Name, 
-                    ((SELECT SUM(CAST(REGEXP_REPLACE(Prize, r"[\D]+", "") AS INT64)) FROM `{dataset_id}.results`)/
-                     (100 * (SELECT COUNT(*) FROM `{dataset_id}.results`))
+        f"""SELECT '{dataset_id}' AS Play_Date, Name,
+                    (SUM(CAST(REGEXP_REPLACE(Prize, r"[\D]+", "") AS INT64)) OVER () / (100 * COUNT(*) OVER ())
                     ) AS Winnings_per_Player
             FROM `{dataset_id}.results`"""
+
+
+def create_consolidated_general_summary_query(results_table: str) -> str:
+    """ general summary (same columns as `create_general_summary_query`) from the consolidated results table,
+        where every draw is a partition, so one GROUP BY covers every draw. Prizes are already in pence.
+    """
+    return \
+        f"""SELECT Play_Date, COUNT(*) AS Num_of_Players, (SUM(Prize_Pence) / 100) AS Total_Winnings,
+                (SUM(Prize_Pence) / (100 * COUNT(*))) AS Winnings_per_Player,
+                STRING_AGG(IF(Prize_Pence > 0, Match_Type, NULL), '; ') AS Winning_Match_Type
+            FROM `{results_table}`
+            GROUP BY Play_Date
+            ORDER BY Play_Date"""
+
+
+def create_consolidated_player_summary_query(results_table: str) -> str:
+    """ player summary (same columns as `create_player_summary_query`) from the consolidated results table. """
+    return \
+        f"""WITH all_player_summaries AS (
+                SELECT Play_Date, Name,
+                    (SUM(Prize_Pence) OVER (PARTITION BY Play_Date) /
+                     (100 * COUNT(*) OVER (PARTITION BY Play_Date))
+                    ) AS Winnings_per_Player
+                FROM `{results_table}`
+            )
+            SELECT Name, SUM(Winnings_per_Player) AS Total_Cumulated_Winnings, COUNT(Play_Date) AS Days_Played
+            FROM all_player_summaries
+            GROUP BY Name"""
+
+
+def create_consolidation_query(dataset_ids: [str], table_name: str) -> str:
+    """ selects table_name from each per draw dataset, adding the Play_Date (dataset_id) and Draw_Date columns
+        of the consolidated layout and converting prizes to pence (see CONSOLIDATED_PENCE_COLUMNS), as the last
+        columns. Used to migrate per draw datasets into consolidated tables.
+    """
+    pence_columns = CONSOLIDATED_PENCE_COLUMNS.get(table_name, {})
+    except_columns = f' EXCEPT ({", ".join(pence_columns)})' if pence_columns else ''
+    pence_selects = ''.join(
+        f', CAST(REGEXP_REPLACE({col}, r"[\\D]+", "") AS INT64) AS {pence_col}'
+        for col, pence_col in pence_columns.items()
+    )
+    return '\nUNION ALL\n'.join([
+        f"""SELECT '{dataset_id}' AS Play_Date, PARSE_DATE('%Y_%m_%d', '{dataset_id[:10]}') AS Draw_Date,
+                *{except_columns}{pence_selects}
+            FROM `{dataset_id}.{table_name}`""" for dataset_id in dataset_ids
+    ])
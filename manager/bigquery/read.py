@@ -1,32 +1,100 @@
-import os
 import re
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+from typing import Optional
 
 import pandas as pd
 from google.cloud import bigquery as bq
+from google.cloud.exceptions import NotFound
 
+from manager.bigquery.client import get_client
 
-def read_selected_numbers() -> pd.DataFrame:
+DATASET_ID_PATTERN = r'\d{4}_\d{2}_\d{2}_\w*'
+DISCOVERY_CACHE_TTL = 300  # seconds
+_dataset_ids_cache = {}
+
+
+def read_selected_numbers(client: bq.Client = None) -> pd.DataFrame:
     """ Read manager.selected_numbers ('./selected_numbers.csv') from BigQuery and validates them.
         Ensures numbers selected are valid and there are no duplicates in Name col.
+        Uses the shared client (see `get_client`) unless one is given.
     """
+    client = client or get_client()
     select_all_query = f"""
     SELECT *
-    FROM `{os.getenv('PROJECT_ID')}.manager.selected_numbers`"""
+    FROM `{client.project}.manager.selected_numbers`"""
 
-    return pd.read_gbq(select_all_query)
+    return client.query(select_all_query).to_dataframe()
 
 
-def get_dataset_ids_with_results(client: bq.Client, pattern: str = r'\d{4}_\d{2}_\d{2}_\w*') -> [str]:
+def get_dataset_ids_with_results(
+        client: bq.Client, pattern: str = DATASET_ID_PATTERN, region: str = None, max_workers: int = 8,
+        cache_ttl: float = DISCOVERY_CACHE_TTL
+) -> [str]:
     """ gathers all dataset_ids, where the the following criteria is met:
             - dataset_id is of the format of given pattern, which defaults to: YYYY_MM_DD_<additional_text>
             - dataset_id has a table called "results"
+        See `discover_dataset_ids_with_results` for region and max_workers. The result is cached for cache_ttl
+        seconds, `clear_dataset_ids_cache` after creating a dataset.
+    """
+    key = (client.project, pattern, region)
+    cached = _dataset_ids_cache.get(key)
+    if cached is not None and monotonic() < cached[0]:
+        print(f'Dataset discovery cache hit: {len(cached[1])} datasets with results, 0 API calls')
+        return list(cached[1])
+
+    dataset_ids, report = discover_dataset_ids_with_results(client, pattern, region, max_workers)
+    print(f'Dataset discovery ({report["method"]}): {len(dataset_ids)} datasets with results, '
+          f'{report["api_calls"]} API calls, {report["seconds"]:.3f}s')
+    _dataset_ids_cache[key] = (monotonic() + cache_ttl, dataset_ids)
+    return list(dataset_ids)
+
+
+def clear_dataset_ids_cache() -> None:
+    """ forgets cached `get_dataset_ids_with_results` results, e.g. because a dataset was created. """
+    _dataset_ids_cache.clear()
+
+
+def discover_dataset_ids_with_results(
+        client: bq.Client, pattern: str = DATASET_ID_PATTERN, region: str = None, max_workers: int = 8
+) -> ([str], dict):
+    """ finds dataset_ids matching pattern which have a "results" table, in list_datasets order (by name):
+            - region given, e.g. 'europe-west2': one query of the region's INFORMATION_SCHEMA.TABLES view.
+            - otherwise: list_datasets, then list_tables of every matching dataset, max_workers at a time.
+        Returns the dataset_ids and a report: {'method', 'api_calls', 'seconds'}.
     """
-    datasets_ids_with_results = []
-    for dataset_list_item in client.list_datasets():
-        dataset_id = dataset_list_item.dataset_id
-        if re.fullmatch(pattern, dataset_id):
-            tables_list = [table.table_id for table in client.list_tables(dataset=dataset_id)]
-            if 'results' in tables_list:
-                datasets_ids_with_results.append(dataset_id)
-
-    return datasets_ids_with_results
+    start = monotonic()
+    if region:
+        query = f"""SELECT DISTINCT table_schema AS Dataset_Id
+            FROM `{client.project}`.`region-{region}`.INFORMATION_SCHEMA.TABLES
+            WHERE table_name = 'results'
+            ORDER BY Dataset_Id"""
+        rows = client.query(query).result()
+        dataset_ids = [row['Dataset_Id'] for row in rows if re.fullmatch(pattern, row['Dataset_Id'])]
+        method, api_calls = 'information_schema', 1
+    else:
+        candidates = [dataset_list_item.dataset_id for dataset_list_item in client.list_datasets()
+                      if re.fullmatch(pattern, dataset_list_item.dataset_id)]
+
+        def has_results(dataset_id: str) -> bool:
+            return 'results' in [table.table_id for table in client.list_tables(dataset=dataset_id)]
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            with_results = list(executor.map(has_results, candidates))
+        dataset_ids = [dataset_id for dataset_id, found in zip(candidates, with_results) if found]
+        method, api_calls = 'list_tables', 1 + len(candidates)
+
+    return dataset_ids, {'method': method, 'api_calls': api_calls, 'seconds': monotonic() - start}
+
+
+def get_summarised_dataset_ids(client: bq.Client, table_name: str, dataset_name: str = 'manager') -> Optional[set]:
+    """ reads the watermark table: the dataset_ids whose results are already in the summary tables.
+        Returns None if there is no watermark table, i.e. summaries must be rebuilt from scratch.
+    """
+    query = f'SELECT Dataset_Id FROM `{client.project}.{dataset_name}.{table_name}`'
+    try:
+        rows = client.query(query).result()
+    except NotFound:
+        return None
+
+    return {row['Dataset_Id'] for row in rows}
@@ -1,24 +1,126 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from typing import Iterable
 
 import google.cloud.bigquery as bq
 import pandas as pd
 from google.cloud.exceptions import NotFound
 
+from manager.bigquery.read import clear_dataset_ids_cache
+
 
 def write_dictionary_to_bigquery(
         client: bq.Client, data: dict, col_names: [str, str], table_name: str, dataset_name: str) -> None:
     """ First converts dict to DataFrame, structure: {col_name: data.keys(), col_name: data.values()}
         Then passes the result to write_dataframe_to_bigquery. """
+    write_dataframe_to_bigquery(client, data=dictionary_to_dataframe(data, col_names),
+                                table_name=table_name, dataset_name=dataset_name)
+    return
+
+
+def dictionary_to_dataframe(data: dict, col_names: [str, str]) -> pd.DataFrame:
+    """ converts dict to DataFrame of strings, structure: {col_name: data.keys(), col_name: data.values()} """
     data = dict(zip(col_names, [data.keys(), data.values()]))
     data = pd.DataFrame.from_dict(data, orient='columns')
+    return data.astype(str)
 
-    write_dataframe_to_bigquery(client, data=data.astype(str), table_name=table_name, dataset_name=dataset_name)
-    return
+
+def write_dataframe_to_bigquery(
+        client: bq.Client, data: pd.DataFrame, table_name: str, dataset_name: str,
+        schema: [bq.SchemaField] = None, partition: str = None,
+        time_partitioning: bq.TimePartitioning = None, clustering_fields: [str] = None, confirm: bool = True
+) -> str:
+    """ Writes Pandas Dataframe to given BigQuery dataset_name. Always overwrites existing data if any.
+        Optional:
+            - schema: fields which override the inferred (partial) schema.
+            - partition: e.g. '20201211', only overwrite this partition of a time partitioned table.
+            - time_partitioning, clustering_fields: used if the write creates the table.
+            - confirm: read the table back (one more API request) to report its size, rather than the rows loaded.
+    """
+    load = _load_dataframe_to_bigquery(client, data, table_name, dataset_name, schema=schema, partition=partition,
+                                       time_partitioning=time_partitioning, clustering_fields=clustering_fields,
+                                       confirm=confirm)
+    if confirm:
+        result = f"Loaded {load['rows']} rows and {load['columns']} columns to {load['table_id']}"
+    else:
+        result = f"Loaded {load['rows']} rows to {load['table_id']}"
+    print(result)
+    return result
 
 
-def write_dataframe_to_bigquery(client: bq.Client, data: pd.DataFrame, table_name: str, dataset_name: str) -> str:
-    """ Writes Pandas Dataframe to given BigQuery dataset_name. Always overwrites existing data if any. """
+def write_dataframe_chunks_to_bigquery(
+        client: bq.Client, chunks: Iterable[pd.DataFrame], table_name: str, dataset_name: str) -> int:
+    """ Writes chunks of one table (e.g. from `check_matches_in_chunks`) as they arrive. Only one chunk is held at a
+        time. Chunks are loaded to a staging table (<table_name>_staging) which then replaces table_name in one copy
+        job, so a failure part way leaves table_name as it was. Raises ValueError if there are no chunks, rather than
+        leave the previous run's table in place. Returns the number of rows written.
+    """
     table_id = '.'.join([client.project, dataset_name, table_name])
+    staging_name = f'{table_name}_staging'
+    staging_id = '.'.join([client.project, dataset_name, staging_name])
+
+    rows, chunk_number = 0, -1
+    try:
+        for chunk_number, chunk in enumerate(chunks):
+            load = _load_dataframe_to_bigquery(
+                client, chunk, staging_name, dataset_name, confirm=False,
+                write_disposition='WRITE_TRUNCATE' if chunk_number == 0 else 'WRITE_APPEND'
+            )
+            rows += load['rows']
+        if chunk_number < 0:
+            raise ValueError(f'No chunks to write to {table_id}, it was left unchanged.')
+
+        client.copy_table(
+            staging_id, table_id, job_config=bq.CopyJobConfig(write_disposition='WRITE_TRUNCATE')
+        ).result()  # Make an API request and wait for it, the table is replaced at once.
+    finally:
+        client.delete_table(staging_id, not_found_ok=True)
+
+    print(f'Loaded {rows} rows to {table_id}')
+    return rows
+
+
+def write_dataframes_to_bigquery(
+        client: bq.Client, tables: {str: pd.DataFrame}, dataset_name: str, table_options: {str: dict} = None,
+        concurrent: bool = True, confirm: bool = True
+) -> dict:
+    """ Writes every {table_name: data} in tables to dataset_name, like `write_dataframe_to_bigquery`, which
+        table_options[table_name] (schema, partition, ...) are passed to. With concurrent, all load jobs are
+        submitted at once and waited on together, so it takes about as long as the slowest one.
+        Returns a report: {'seconds': total, 'jobs': {table_name: {'table_id', 'rows', 'columns', 'seconds'}}}.
+        columns is None unless confirm.
+    """
+    table_options = table_options or {}
+
+    def load(table_name: str) -> dict:
+        return _load_dataframe_to_bigquery(client, tables[table_name], table_name, dataset_name, confirm=confirm,
+                                           **table_options.get(table_name, {}))
+
+    start = perf_counter()
+    if concurrent and len(tables) > 1:
+        with ThreadPoolExecutor(max_workers=len(tables)) as executor:
+            jobs = dict(zip(tables, executor.map(load, tables)))
+    else:
+        jobs = {table_name: load(table_name) for table_name in tables}
+    report = {'seconds': perf_counter() - start, 'jobs': jobs}
+
+    for job in jobs.values():
+        print(f"Loaded {job['rows']} rows to {job['table_id']} in {job['seconds']:.2f}s")
+    print(f"Wrote {len(jobs)} tables to {dataset_name} in {report['seconds']:.2f}s")
+    return report
+
+
+def _load_dataframe_to_bigquery(
+        client: bq.Client, data: pd.DataFrame, table_name: str, dataset_name: str,
+        schema: [bq.SchemaField] = None, partition: str = None,
+        time_partitioning: bq.TimePartitioning = None, clustering_fields: [str] = None, confirm: bool = True,
+        write_disposition: str = 'WRITE_TRUNCATE'
+) -> dict:
+    """ runs one load job, see `write_dataframe_to_bigquery`. Returns {'table_id', 'rows', 'columns', 'seconds'}. """
+    start = perf_counter()
+    table_id = '.'.join([client.project, dataset_name, table_name])
+    declared = {field.name: field for field in schema or []}
 
     job_config = bq.LoadJobConfig(
         # Specify a (partial) schema. All columns are always written to the
@@ -26,22 +128,30 @@ def write_dataframe_to_bigquery(client: bq.Client, data: pd.DataFrame, table_nam
         schema=[
             # pandas dtype "object" is ambiguous and cannot be auto-detected.
             bq.SchemaField(col, bq.enums.SqlTypeNames.STRING) for col in data.dtypes[data.dtypes == 'object'].index
-        ],
-        # WRITE_TRUNCATE replaces the table with the loaded data.
-        write_disposition="WRITE_TRUNCATE",
+            if col not in declared
+        ] + list(declared.values()),
+        # WRITE_TRUNCATE replaces the table (or partition) with the loaded data, WRITE_APPEND adds to it.
+        write_disposition=write_disposition,
+        # columnar and typed: the DataFrame is serialised with pyarrow.
+        source_format=bq.SourceFormat.PARQUET,
+        time_partitioning=time_partitioning,
+        clustering_fields=clustering_fields,
     )
 
     job = client.load_table_from_dataframe(
         data,
-        table_id,
+        table_id if partition is None else f'{table_id}${partition}',
         job_config=job_config
     )  # Make an API request.
     job.result()  # Wait for the job to complete.
 
-    table = client.get_table(table_id)  # Make an API request.
-    result = f"Loaded {table.num_rows} rows and {len(table.schema)} columns to {table_id}"
-    print(result)
-    return result
+    if confirm:
+        table = client.get_table(table_id)  # Make an API request.
+        rows, columns = table.num_rows, len(table.schema)
+    else:
+        rows, columns = job.output_rows, None
+
+    return {'table_id': table_id, 'rows': rows, 'columns': columns, 'seconds': perf_counter() - start}
 
 
 def create_bigquery_dataset(client: bq.Client, dataset_name: str) -> str:
@@ -58,6 +168,7 @@ def create_bigquery_dataset(client: bq.Client, dataset_name: str) -> str:
         dataset.location = os.getenv('REGION')
         dataset = client.create_dataset(dataset, timeout=30)  # Make an API request.
         result = f"Created dataset {client.project}.{dataset.dataset_id}"
+        clear_dataset_ids_cache()
 
     print(result)
     return result
@@ -0,0 +1,118 @@
+import io
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from time import perf_counter
+from typing import Callable
+
+import pandas as pd
+import requests
+
+REQUEST_TIMEOUT = 30
+
+
+def fetch_csv_with_cache(find_url: Callable[[], str], cache_dir: str, name: str) -> (pd.DataFrame, dict):
+    """ Reads a csv over http, keeping a parquet copy and its http validators (ETag, Last-Modified) in
+        cache_dir. The upstream file is revalidated with a conditional GET and only downloaded when it changed.
+
+        find_url is only called when there is no cached url, or the cached url stopped working.
+        Returns the DataFrame and a report: {'cache': 'hit' | 'miss', 'seconds', 'bytes_transferred', 'url'}.
+    """
+    start = perf_counter()
+    cache_dir = Path(cache_dir)
+    data_path = cache_dir / f'{name}.parquet'
+    meta_path = cache_dir / f'{name}.json'
+
+    meta = json.loads(meta_path.read_text()) if meta_path.exists() and data_path.exists() else {}
+    url = meta.get('url') or find_url()
+    response = requests.get(url, headers=_conditional_headers(meta), timeout=REQUEST_TIMEOUT)
+
+    if response.status_code not in (200, 304) and 'url' in meta:
+        print(f'Cached url {url} returned {response.status_code}. Looking up url again.')
+        meta = {}
+        url = find_url()
+        response = requests.get(url, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+
+    if response.status_code == 304:
+        data = pd.read_parquet(data_path)
+        cache = 'hit'
+    else:
+        data = pd.read_csv(io.BytesIO(response.content))
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        data.to_parquet(data_path, index=False)
+        meta_path.write_text(json.dumps({
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+        }))
+        cache = 'miss'
+
+    report = {
+        'cache': cache,
+        'seconds': perf_counter() - start,
+        'bytes_transferred': len(response.content),
+        'url': url,
+    }
+    print(f'{name} cache {cache}: {report["seconds"]:.3f}s, {report["bytes_transferred"]} bytes transferred')
+    return data, report
+
+
+def _conditional_headers(meta: dict) -> dict:
+    """ http validators for a conditional GET, so the server can answer 304 Not Modified. """
+    headers = {}
+    if meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta.get('last_modified'):
+        headers['If-Modified-Since'] = meta['last_modified']
+    return headers
+
+
+class PrizeBreakdownStore:
+    """ Prize breakdowns of past draws never change, so once scraped they are kept, keyed by DrawNumber:
+            - in memory, evicting the least recently used after maxsize draws,
+            - on disk, one json file per draw in directory.
+        Safe to share between threads.
+    """
+    def __init__(self, directory: str, maxsize: int = 128):
+        self.directory = Path(directory)
+        self.maxsize = maxsize
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, draw_number: int) -> dict:
+        """ returns the stored prize breakdown, or None if draw_number is unknown. """
+        draw_number = int(draw_number)
+        with self._lock:
+            if draw_number in self._memory:
+                self._memory.move_to_end(draw_number)
+                return self._memory[draw_number]
+
+        path = self._path(draw_number)
+        if not path.exists():
+            return None
+        prize_breakdown = json.loads(path.read_text(encoding='utf-8'))
+        self._remember(draw_number, prize_breakdown)
+        return prize_breakdown
+
+    def put(self, draw_number: int, prize_breakdown: dict) -> None:
+        """ stores prize_breakdown in memory and on disk. The file is written atomically. """
+        draw_number = int(draw_number)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(draw_number)
+        temp_path = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+        temp_path.write_text(json.dumps(prize_breakdown, ensure_ascii=False), encoding='utf-8')
+        os.replace(temp_path, path)
+        self._remember(draw_number, prize_breakdown)
+
+    def _remember(self, draw_number: int, prize_breakdown: dict) -> None:
+        with self._lock:
+            self._memory[draw_number] = prize_breakdown
+            self._memory.move_to_end(draw_number)
+            while len(self._memory) > self.maxsize:
+                self._memory.popitem(last=False)
+
+    def _path(self, draw_number: int) -> Path:
+        return self.directory / f'prize_breakdown_{draw_number}.json'
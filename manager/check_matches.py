@@ -1,5 +1,11 @@
+from itertools import islice
+from typing import Iterable, Iterator, Mapping
+
+import numpy as np
 import pandas as pd
 
+from manager.tools import prize_to_pence
+
 
 def collect_winning_numbers(results: dict) -> dict:
     """ results dict has 1 ball number per key. this helper func collects ball numbers and lucky star
@@ -28,18 +34,170 @@ def match_type_label(row: pd.Series) -> str:
         return 'Match ' + str(ball_match) + ' + ' + str(star_match) + ' Stars'
 
 
+def match_type_lookup(max_balls: int, max_stars: int) -> np.ndarray:
+    """ precomputes the match type label for every (balls matched, stars matched) combination, so labels can
+        be looked up for a whole column at once: lookup[balls_matched, stars_matched].
+    """
+    lookup = np.empty((max_balls + 1, max_stars + 1), dtype=object)
+    for ball_match in range(max_balls + 1):
+        for star_match in range(max_stars + 1):
+            lookup[ball_match, star_match] = match_type_label({'Balls_Matched': ball_match,
+                                                               'Stars_Matched': star_match})
+    return lookup
+
+
+def prize_table(match_types: np.ndarray, prize_breakdown: dict) -> np.ndarray:
+    """ the prize breakdown's own strings, laid out as a match type lookup table (see `match_type_lookup`):
+        table[balls_matched, stars_matched], an object array. Match types without a prize win '£0.00'.
+    """
+    prizes = pd.Series([prize_breakdown.get(match_type) for match_type in match_types.ravel()], dtype=object)
+    return prizes.fillna('£0.00').to_numpy().reshape(match_types.shape)
+
+
+def prize_pence_table(match_types: np.ndarray, prize_breakdown: dict) -> np.ndarray:
+    """ parses the prize breakdown once into integer pence, laid out as a match type lookup table (see
+        `match_type_lookup`): table[balls_matched, stars_matched]. Match types without a prize are worth 0.
+    """
+    prizes = [prize_breakdown.get(match_type, '£0.00') for match_type in match_types.ravel()]
+    return prize_to_pence(pd.Series(prizes, dtype=object)).to_numpy().reshape(match_types.shape)
+
+
+def evaluate_matches(
+        ball_numbers: np.ndarray, star_numbers: np.ndarray, winning: dict, prize_breakdown: dict) -> dict:
+    """ vectorised match engine. Given 2D arrays of selected ball numbers and star numbers (one row per
+        ticket), computes in one batched pass the columns: Balls_Matched, Stars_Matched, Match_Type and Prize.
+        Labels and prizes are read from a (balls x stars) lookup table rather than computed per row. Prizes are
+        the prize breakdown's strings as scraped, see `prize_table`.
+    """
+    balls_matched = np.isin(ball_numbers, winning['Balls']).sum(axis=1).astype('int64')
+    stars_matched = np.isin(star_numbers, winning['Lucky Stars']).sum(axis=1).astype('int64')
+
+    match_types = match_type_lookup(max_balls=ball_numbers.shape[1], max_stars=star_numbers.shape[1])
+    prizes = prize_table(match_types, prize_breakdown)
+
+    return {
+        'Balls_Matched': balls_matched,
+        'Stars_Matched': stars_matched,
+        'Match_Type': match_types[balls_matched, stars_matched],
+        'Prize': prizes[balls_matched, stars_matched],
+    }
+
+
+def evaluate_selected(selected: pd.DataFrame, winning: dict, prize_breakdown: dict) -> dict:
+    """ `evaluate_matches` of the Number_* and Lucky_Star_* columns of a selected numbers DataFrame. """
+    number_cols = [col for col in selected.columns if col.startswith('Number')]
+    star_cols = [col for col in selected.columns if col.startswith('Lucky_Star')]
+
+    return evaluate_matches(
+        selected.loc[:, number_cols].to_numpy(), selected.loc[:, star_cols].to_numpy(), winning, prize_breakdown
+    )
+
+
 def check_matches_on_selected(selected: pd.DataFrame, winning: dict, prize_breakdown: dict) -> pd.DataFrame:
     """ Performs operations on selected DataFrame to determine:
         * how many balls and stars matched
         * match type label achieved, e.g. Match 5 + 2 Stars
         * the respective winnings associated with the match type label.
     """
+    for col, values in evaluate_selected(selected, winning, prize_breakdown).items():
+        selected[col] = values
+
+    return selected
+
+
+def check_matches_in_chunks(
+        chunks: Iterable[pd.DataFrame], winning: dict, prize_breakdown: dict) -> Iterator[pd.DataFrame]:
+    """ streaming version of `check_matches_on_selected`: checks one chunk of tickets at a time, e.g. from
+        pd.read_csv(path, chunksize=...) or `rows_to_chunks`, yielding each chunk's results (the chunk's columns
+        plus the added ones) to be written before the next chunk is read. Memory depends on the chunk size only,
+        not the number of tickets. Chunks are not modified, every result is a new DataFrame.
+    """
+    for chunk in chunks:
+        yield chunk.assign(**evaluate_selected(chunk, winning, prize_breakdown))
+
+
+def rows_to_chunks(rows: Iterable[Mapping], chunksize: int = 100_000) -> Iterator[pd.DataFrame]:
+    """ groups an iterable of rows (dicts, or the Rows of a BigQuery RowIterator: client.query(...).result())
+        into DataFrames of at most chunksize rows, reading only one chunk of rows at a time.
+    """
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, chunksize))
+        if not batch:
+            return
+        yield pd.DataFrame.from_records([dict(row.items()) for row in batch])
+
+
+def count_matches_many_draws(selected_numbers: np.ndarray, drawn_numbers: np.ndarray) -> np.ndarray:
+    """ counts, for every (draw, ticket) pair, how many of the ticket's numbers were drawn. Gives the same
+        counts as `isin` per draw, but computes all draws at once from a (draws x numbers) hit table.
+        Selected numbers below 1 never match. Returns an int64 array of shape (draws, tickets).
+    """
+    selected_numbers = np.where(selected_numbers > 0, selected_numbers, 0).astype('int64')
+    max_number = max(selected_numbers.max(initial=0), drawn_numbers.max(initial=0))
+
+    return count_hits(selected_numbers, drawn_numbers, max_number, dtype='int64')
+
+
+def count_hits(numbers: np.ndarray, drawn_numbers: np.ndarray, end: int, dtype: type = np.uint8) -> np.ndarray:
+    """ shared hit table count: for every (draw, ticket) pair, how many of the ticket's numbers (each in [0, end])
+        are in the draw's row of drawn_numbers (each in [1, end]). Looks numbers up in a (draws x numbers) hit
+        table one column at a time, so no (tickets x picks) temporary is made. 0 never matches.
+        Returns an array of dtype and shape (draws, tickets).
+    """
+    drawn_numbers = np.atleast_2d(np.asarray(drawn_numbers))
+    hits = np.zeros((len(drawn_numbers), end + 1), dtype=bool)
+    hits[np.arange(len(drawn_numbers))[:, None], drawn_numbers] = True
+    hits[:, 0] = False
+
+    matched = np.zeros((len(drawn_numbers), len(numbers)), dtype=dtype)
+    for col in range(numbers.shape[1]):
+        matched += hits[:, numbers[:, col]]
+
+    return matched
+
+
+def check_matches_many_draws(
+        selected: pd.DataFrame, hist_results: pd.DataFrame, breakdowns: dict, max_cells: int = 10_000_000
+) -> pd.DataFrame:
+    """ checks every ticket in selected against every draw in hist_results (as returned by
+        `scrape_historical_results`), using breakdowns: {DrawNumber: prize_breakdown}. Draws without a
+        breakdown win '£0.00'. Draws are processed in chunks of at most max_cells (draw, ticket) pairs.
+
+        Returns a long format DataFrame, one row per (draw, ticket), ordered by draw then ticket, with
+        columns: DrawNumber, DrawDate, the selected columns, then the columns added by
+        `check_matches_on_selected`. selected is not modified.
+    """
     number_cols = [col for col in selected.columns if col.startswith('Number')]
     star_cols = [col for col in selected.columns if col.startswith('Lucky_Star')]
+    draw_ball_cols = [col for col in hist_results.columns if col.startswith('Ball')]
+    draw_star_cols = [col for col in hist_results.columns if col.startswith('Lucky Star')]
 
-    selected['Balls_Matched'] = selected.loc[:, number_cols].isin(winning['Balls']).sum(axis=1)
-    selected['Stars_Matched'] = selected.loc[:, star_cols].isin(winning['Lucky Stars']).sum(axis=1)
-    selected['Match_Type'] = selected[['Balls_Matched', 'Stars_Matched']].apply(match_type_label, axis=1)
-    selected['Prize'] = selected['Match_Type'].map(prize_breakdown).fillna('£0.00')
+    selected_balls = selected[number_cols].to_numpy()
+    selected_stars = selected[star_cols].to_numpy()
+    match_types = match_type_lookup(max_balls=len(number_cols), max_stars=len(star_cols))
 
-    return selected
+    n_tickets = len(selected)
+    draws_per_chunk = max(1, max_cells // max(n_tickets, 1))
+    results = []
+    for start in range(0, max(len(hist_results), 1), draws_per_chunk):
+        draws = hist_results.iloc[start:start + draws_per_chunk]
+        n_draws = len(draws)
+
+        balls_matched = count_matches_many_draws(selected_balls, draws[draw_ball_cols].to_numpy('int64')).ravel()
+        stars_matched = count_matches_many_draws(selected_stars, draws[draw_star_cols].to_numpy('int64')).ravel()
+        prizes = np.array([
+            prize_table(match_types, breakdowns.get(draw_number, {})) for draw_number in draws['DrawNumber']
+        ], dtype=object).reshape((n_draws,) + match_types.shape)
+        draw_idx = np.repeat(np.arange(n_draws), n_tickets)
+
+        chunk = selected.iloc[np.tile(np.arange(n_tickets), n_draws)].reset_index(drop=True)
+        chunk.insert(0, 'DrawNumber', draws['DrawNumber'].to_numpy()[draw_idx])
+        chunk.insert(1, 'DrawDate', draws['DrawDate'].to_numpy()[draw_idx])
+        chunk['Balls_Matched'] = balls_matched
+        chunk['Stars_Matched'] = stars_matched
+        chunk['Match_Type'] = match_types[balls_matched, stars_matched]
+        chunk['Prize'] = prizes[draw_idx, balls_matched, stars_matched]
+        results.append(chunk)
+
+    return pd.concat(results, ignore_index=True)
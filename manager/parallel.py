@@ -0,0 +1,75 @@
+""" Match checking across CPU cores.
+
+    Tickets are sharded across a ProcessPoolExecutor. The (N x 7) uint8 ticket numbers and the (draws x N) uint8
+    output of match codes live in shared memory (multiprocessing.shared_memory), so workers are only sent the
+    names of the two blocks and the bounds of their shard, never a DataFrame. Each shard writes its own columns of
+    the output, so results are the same, and in the same order, whatever the number of workers.
+"""
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from manager.check_matches import count_hits
+from manager.ticket_table import TicketTable, MatchResults, match_code, N_BALLS, N_STARS
+from manager.tools import NUMBER_RANGE, STAR_RANGE
+
+SHARDS_PER_WORKER = 4  # more shards than workers, so a slow worker doesn't hold up the rest
+
+
+def match_codes_parallel(
+        numbers: np.ndarray, draws: np.ndarray, max_workers: int = None, shard_size: int = None) -> np.ndarray:
+    """ match codes (see `match_code`) of every ticket against every draw. numbers: (N x 7) uint8 tickets, draws:
+        (D x 7) winning balls then lucky stars. Returns a (D x N) uint8 array. max_workers defaults to the number
+        of CPUs, shard_size (tickets per task) to spread tickets over SHARDS_PER_WORKER tasks per worker.
+    """
+    max_workers = max_workers or os.cpu_count() or 1
+    n_tickets = len(numbers)
+    shard_size = shard_size or max(1, math.ceil(n_tickets / (max_workers * SHARDS_PER_WORKER)))
+    draws = np.asarray(draws, dtype=np.uint8)
+
+    tickets_memory = shared_memory.SharedMemory(create=True, size=max(numbers.nbytes, 1))
+    codes_memory = shared_memory.SharedMemory(create=True, size=max(len(draws) * n_tickets, 1))
+    try:
+        np.ndarray(numbers.shape, dtype=np.uint8, buffer=tickets_memory.buf)[:] = numbers
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            shards = [
+                executor.submit(_match_codes_shard, tickets_memory.name, codes_memory.name, n_tickets, draws,
+                                start, min(start + shard_size, n_tickets))
+                for start in range(0, n_tickets, shard_size)
+            ]
+            for shard in shards:
+                shard.result()  # raises any error from a worker
+        return np.ndarray((len(draws), n_tickets), dtype=np.uint8, buffer=codes_memory.buf).copy()
+    finally:
+        for memory in (tickets_memory, codes_memory):
+            memory.close()
+            memory.unlink()
+
+
+def check_matches_parallel(
+        tickets: TicketTable, winning: dict, prize_breakdown: dict, max_workers: int = None) -> MatchResults:
+    """ `TicketTable.check_matches`, with tickets sharded across max_workers processes. Same results. """
+    draw = np.array([list(winning['Balls']) + list(winning['Lucky Stars'])])
+    match_codes = match_codes_parallel(tickets.numbers, draw, max_workers=max_workers)[0]
+    return MatchResults.from_breakdown(tickets, match_codes, prize_breakdown)
+
+
+def _match_codes_shard(
+        tickets_name: str, codes_name: str, n_tickets: int, draws: np.ndarray, start: int, stop: int) -> None:
+    """ runs in a worker: match codes of tickets [start, stop) against every draw, written to the shared output. """
+    tickets_memory = shared_memory.SharedMemory(name=tickets_name)
+    codes_memory = shared_memory.SharedMemory(name=codes_name)
+    try:
+        numbers = np.ndarray((n_tickets, N_BALLS + N_STARS), dtype=np.uint8, buffer=tickets_memory.buf)[start:stop]
+        codes = np.ndarray((len(draws), n_tickets), dtype=np.uint8, buffer=codes_memory.buf)
+        codes[:, start:stop] = match_code(
+            count_hits(numbers[:, :N_BALLS], draws[:, :N_BALLS], NUMBER_RANGE[1]),
+            count_hits(numbers[:, N_BALLS:], draws[:, N_BALLS:], STAR_RANGE[1]),
+        )
+        del numbers, codes  # views of the shared buffers must go before the buffers are closed
+    finally:
+        tickets_memory.close()
+        codes_memory.close()
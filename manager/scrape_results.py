@@ -1,24 +1,55 @@
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
+from html.parser import HTMLParser
 import re
+from time import monotonic, sleep
+from types import MappingProxyType
+from typing import Iterable, Union
+from urllib.parse import urlparse
 
 import requests
-from bs4 import BeautifulSoup as bSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
 
+from manager.cache import fetch_csv_with_cache, PrizeBreakdownStore
+
 BASE_URL = 'https://www.national-lottery.co.uk'
+PRIZE_BREAKDOWN_SUMMARY = 'Table displaying prize breakdown'
+STREAMING_PARSER = 'stream'
+REQUEST_TIMEOUT = 30
+
+
+def scrape_historical_results(
+        draw_history_path: str = '/results/euromillions/draw-history', cache_dir: str = None,
+        base_url: str = BASE_URL) -> pd.DataFrame:
+    """ on draw history page, find href link to csv and use pandas to read it.
+        If cache_dir is given, the csv is cached there and only downloaded again when it changed upstream.
+    """
+    if cache_dir is not None:
+        historical_results, _report = fetch_csv_with_cache(
+            lambda: find_historical_results_csv(draw_history_path, base_url), cache_dir=cache_dir, name='draw_history'
+        )
+        return historical_results
 
+    return pd.read_csv(find_historical_results_csv(draw_history_path, base_url))
 
-def scrape_historical_results(draw_history_path: str = '/results/euromillions/draw-history') -> pd.DataFrame:
-    """ on draw history page, find href link to csv and use pandas to read it. """
-    draw_history_url_path = BASE_URL + draw_history_path
+
+def find_historical_results_csv(
+        draw_history_path: str = '/results/euromillions/draw-history', base_url: str = BASE_URL) -> str:
+    """ on draw history page, find href link to csv. """
+    from bs4 import BeautifulSoup as bSoup  # deferred: only needed when the csv url is not already cached
+
+    draw_history_url_path = base_url + draw_history_path
 
     draw_history_page = requests.get(draw_history_url_path)
     draw_history_soup = bSoup(draw_history_page.content, 'html.parser')
     href_id = 'download_history_action'
 
     try:
-        link_to_csv = BASE_URL + draw_history_soup.find(id=href_id).get('href')
+        link_to_csv = base_url + draw_history_soup.find(id=href_id).get('href')
     except AttributeError as E:
         logging.error(f'Failed to find html tag with id="{href_id}" in soup.')
         raise E
@@ -26,34 +57,170 @@ def scrape_historical_results(draw_history_path: str = '/results/euromillions/dr
     if not link_to_csv.endswith('csv'):
         raise ValueError(f"Can't find csv at this link: {link_to_csv}")
 
-    return pd.read_csv(link_to_csv)
+    return link_to_csv
+
+
+class DrawHistory:
+    """ Read-only index over historical results (as returned by `scrape_historical_results`), built once,
+        giving O(1) lookups of a draw result by draw date or by DrawNumber. Results are returned as new
+        dicts with DrawDate formatted as '%Y-%m-%d-%a'. The given DataFrame is not modified.
+    """
+    def __init__(self, hist_results: pd.DataFrame):
+        draw_dates = pd.to_datetime(hist_results['DrawDate'], format='%d-%b-%Y')
+        records = hist_results.assign(DrawDate=draw_dates.dt.strftime('%Y-%m-%d-%a')).to_dict('records')
+
+        by_date = {}
+        by_draw_number = {}
+        for draw_date, record in zip(draw_dates, records):
+            by_date.setdefault(draw_date, []).append(record)
+            by_draw_number.setdefault(record['DrawNumber'], []).append(record)
+        self._by_date = MappingProxyType({key: tuple(value) for key, value in by_date.items()})
+        self._by_draw_number = MappingProxyType({key: tuple(value) for key, value in by_draw_number.items()})
+
+    def __len__(self) -> int:
+        return sum(len(records) for records in self._by_date.values())
+
+    def by_date(self, draw_date: date) -> dict:
+        matches = self._by_date.get(pd.to_datetime(draw_date), ())
+        if len(matches) == 0:
+            raise Exception(f'Selected draw_date: "{draw_date:%d-%m-%Y}" not in hist_results["DrawDate"]')
+        if len(matches) > 1:
+            raise Exception(f'Selected draw_date: "{draw_date:%d-%m-%Y}" maps to many in hist_results["DrawDate"]')
+        return dict(matches[0])
+
+    def by_draw_number(self, draw_number: int) -> dict:
+        matches = self._by_draw_number.get(draw_number, ())
+        if len(matches) == 0:
+            raise Exception(f'Selected draw_number: "{draw_number}" not in hist_results["DrawNumber"]')
+        if len(matches) > 1:
+            raise Exception(f'Selected draw_number: "{draw_number}" maps to many in hist_results["DrawNumber"]')
+        return dict(matches[0])
+
 
+def extract_draw_result(draw_date: date, hist_results: Union[pd.DataFrame, DrawHistory]) -> dict:
+    """ from historical results DataFrame extract the result information for the selected draw date.
+        When extracting many dates, pass a DrawHistory (or use `extract_draw_results`) so the index is built once.
+    """
+    if not isinstance(hist_results, DrawHistory):
+        hist_results = DrawHistory(hist_results)
 
-def extract_draw_result(draw_date: date, hist_results: pd.DataFrame) -> dict:
-    """ from historical results DataFrame extract the result information for the selected draw date. """
-    hist_results['DrawDate'] = pd.to_datetime(hist_results['DrawDate'], format='%d-%b-%Y')
-    draw_date_mask = hist_results['DrawDate'] == pd.to_datetime(draw_date)
+    return hist_results.by_date(draw_date)
 
-    if draw_date_mask.sum() == 0:
-        raise Exception(f'Selected draw_date: "{draw_date:%d-%m-%Y}" not in hist_results["DrawDate"]')
-    if draw_date_mask.sum() > 1:
-        raise Exception(f'Selected draw_date: "{draw_date:%d-%m-%Y}" maps to many in hist_results["DrawDate"]')
 
-    draw_result = hist_results[draw_date_mask].to_dict('records')[0]
-    draw_result['DrawDate'] = draw_result['DrawDate'].strftime('%Y-%m-%d-%a')
+def extract_draw_results(draw_dates: Iterable[date], hist_results: Union[pd.DataFrame, DrawHistory]) -> [dict]:
+    """ batch version of `extract_draw_result`, indexing hist_results once for all draw_dates. """
+    if not isinstance(hist_results, DrawHistory):
+        hist_results = DrawHistory(hist_results)
 
-    return draw_result
+    return [hist_results.by_date(draw_date) for draw_date in draw_dates]
 
 
-def scrape_prize_breakdown(draw_number: int) -> dict:
+def scrape_prize_breakdown(
+        draw_number: int, store: PrizeBreakdownStore = None, parser: str = 'html.parser') -> dict:
     """ from the selected prize breakdown page, find the prize breakdown table and extract the
-        No. of matches and the Prize per UK winner information into a dict as respective key: value pair."""
+        No. of matches and the Prize per UK winner information into a dict as respective key: value pair.
+        If a store is given, known draws are read from it without a request, and new ones are added to it.
+        See `parse_prize_breakdown` for parser options."""
+    if store is not None:
+        prize_breakdown = store.get(draw_number)
+        if prize_breakdown is not None:
+            return prize_breakdown
+
     breakdown_url_ext = f'/results/euromillions/draw-history/prize-breakdown/{draw_number}'
     breakdown_page = requests.get(BASE_URL + breakdown_url_ext)
-    breakdown_soup = bSoup(breakdown_page.content, 'html.parser')
+    prize_breakdown = parse_prize_breakdown(breakdown_page.content, parser=parser)
+
+    # an empty breakdown means the page isn't published yet, so it is not stored.
+    if store is not None and prize_breakdown:
+        store.put(draw_number, prize_breakdown)
+
+    return prize_breakdown
+
+
+def scrape_prize_breakdowns(
+        draw_numbers: Iterable[int], store: PrizeBreakdownStore = None, max_workers: int = 8,
+        requests_per_second: float = 5.0, retries: int = 3, backoff_factor: float = 0.5,
+        base_url: str = BASE_URL, parser: str = STREAMING_PARSER) -> dict:
+    """ scrapes many prize breakdown pages concurrently, returning {draw_number: prize_breakdown}.
+            - at most max_workers requests are in flight, sharing one keep-alive connection pool,
+            - requests to the same host start at most requests_per_second apart,
+            - connection errors and 429/5xx responses are retried with exponential backoff, honouring Retry-After.
+        Draws already in store are not requested, newly scraped ones are added to it.
+    """
+    draw_numbers = list(dict.fromkeys(draw_numbers))
+    prize_breakdowns = {}
+    if store is not None:
+        for draw_number in draw_numbers:
+            prize_breakdown = store.get(draw_number)
+            if prize_breakdown is not None:
+                prize_breakdowns[draw_number] = prize_breakdown
+    to_scrape = [draw_number for draw_number in draw_numbers if draw_number not in prize_breakdowns]
+
+    rate_limiter = _HostRateLimiter(requests_per_second)
+
+    def scrape(draw_number: int) -> dict:
+        url = base_url + f'/results/euromillions/draw-history/prize-breakdown/{draw_number}'
+        rate_limiter.wait(url)
+        response = session.get(url, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return parse_prize_breakdown(response.content, parser=parser)
+
+    with create_session(pool_size=max_workers, retries=retries, backoff_factor=backoff_factor) as session, \
+            ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for draw_number, prize_breakdown in zip(to_scrape, executor.map(scrape, to_scrape)):
+            prize_breakdowns[draw_number] = prize_breakdown
+            if store is not None and prize_breakdown:
+                store.put(draw_number, prize_breakdown)
+
+    print(f'Scraped {len(to_scrape)} prize breakdowns, {len(prize_breakdowns) - len(to_scrape)} read from store.')
+    return {draw_number: prize_breakdowns[draw_number] for draw_number in draw_numbers}
+
+
+def create_session(pool_size: int = 8, retries: int = 3, backoff_factor: float = 0.5) -> requests.Session:
+    """ requests session with a keep-alive connection pool of pool_size per host, which retries failed
+        GET requests with exponential backoff. See urllib3.util.retry.Retry.
+    """
+    retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(429, 500, 502, 503, 504),
+                  respect_retry_after_header=True)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class _HostRateLimiter:
+    """ spaces out requests to each host by at least 1 / requests_per_second. Thread safe. """
+    def __init__(self, requests_per_second: float):
+        self.interval = 1 / requests_per_second if requests_per_second else 0
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str) -> None:
+        host = urlparse(url).netloc
+        with self._lock:
+            now = monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.interval
+        if slot > now:
+            sleep(slot - now)
+
+
+def parse_prize_breakdown(page: Union[str, bytes], parser: str = 'html.parser') -> dict:
+    """ extracts {No. of matches: Prize per UK winner} from a prize breakdown page.
+        parser is either STREAMING_PARSER, which tokenizes the page only until the prize breakdown table closes,
+        or any BeautifulSoup parser (e.g. 'html.parser', 'lxml' if installed) to build a soup of the whole page.
+    """
+    if parser == STREAMING_PARSER:
+        return _stream_prize_breakdown(page)
+
+    from bs4 import BeautifulSoup as bSoup  # deferred, the streaming parser does not need it
+
+    breakdown_soup = bSoup(page, parser)
     prize_breakdown = {}
     for table in breakdown_soup.find_all('table'):
-        if table.get('summary').startswith('Table displaying prize breakdown'):
+        if table.get('summary').startswith(PRIZE_BREAKDOWN_SUMMARY):
             match_type = None
             prize = None
             for tag in table.find_all('td'):
@@ -67,3 +234,73 @@ def scrape_prize_breakdown(draw_number: int) -> dict:
                     prize = None
 
     return prize_breakdown
+
+
+class _PrizeBreakdownTableParser(HTMLParser):
+    """ SAX style tokenizer which collects the cells of the first prize breakdown table, raising
+        _TableClosed as soon as that table closes, so the rest of the page is never tokenized.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.prize_breakdown = {}
+        self._table_depth = 0  # > 0 while inside the prize breakdown table
+        self._cell = None  # data-th of the cell being read
+        self._text = []
+        self._match_type = None
+        self._prize = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            if self._table_depth:
+                self._table_depth += 1
+            elif (dict(attrs).get('summary') or '').startswith(PRIZE_BREAKDOWN_SUMMARY):
+                self._table_depth = 1
+        elif self._table_depth and tag in ('td', 'th', 'tr'):
+            self._end_cell()
+            if tag == 'td':
+                self._cell = dict(attrs).get('data-th')
+
+    def handle_endtag(self, tag):
+        if not self._table_depth:
+            return
+        if tag in ('td', 'th', 'tr'):
+            self._end_cell()
+        elif tag == 'table':
+            self._table_depth -= 1
+            if not self._table_depth:
+                raise _TableClosed
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._text.append(data)
+
+    def _end_cell(self):
+        if self._cell == 'No. of matches':
+            self._match_type = ''.join(self._text).strip()
+        elif self._cell == 'Prize per UK winner':
+            self._prize = re.sub(r'[Â]', '', ''.join(self._text).strip())
+        if self._match_type is not None and self._prize is not None:
+            self.prize_breakdown[self._match_type] = self._prize
+            self._match_type = None
+            self._prize = None
+        self._cell = None
+        self._text = []
+
+
+class _TableClosed(Exception):
+    pass
+
+
+def _stream_prize_breakdown(page: Union[str, bytes], chunk_size: int = 8192) -> dict:
+    """ feeds page to _PrizeBreakdownTableParser chunk by chunk, stopping once the table has been read. """
+    if isinstance(page, bytes):
+        page = page.decode('utf-8', errors='replace')
+
+    parser = _PrizeBreakdownTableParser()
+    try:
+        for start in range(0, len(page), chunk_size):
+            parser.feed(page[start:start + chunk_size])
+    except _TableClosed:
+        pass
+
+    return parser.prize_breakdown
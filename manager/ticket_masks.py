@@ -0,0 +1,71 @@
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from manager.tools import NUMBER_RANGE, STAR_RANGE
+
+
+class TicketMasks(NamedTuple):
+    """ compact ticket store: one 64-bit ball mask and one 16-bit star mask per ticket.
+        Bit n of a mask is set when number n was selected.
+    """
+    names: np.ndarray
+    balls: np.ndarray
+    stars: np.ndarray
+
+
+def pack_numbers(numbers: np.ndarray, start: int, end: int, dtype: type = np.uint64) -> np.ndarray:
+    """ packs each row of a 2D array of numbers into a bitmask, where bit n is set if n is in the row. """
+    numbers = np.atleast_2d(np.asarray(numbers, dtype=np.int64))
+    out_of_range = (numbers < start) | (numbers > end)
+    if out_of_range.any():
+        raise ValueError(f'Numbers must be between [{start}, {end}] inclusive. Found: {numbers[out_of_range]}')
+
+    bits = np.left_shift(np.uint64(1), numbers.astype(np.uint64))
+    return np.bitwise_or.reduce(bits, axis=1).astype(dtype)
+
+
+def popcount(masks: np.ndarray) -> np.ndarray:
+    """ number of set bits in each mask, using the SWAR bit counting algorithm. """
+    x = np.asarray(masks, dtype=np.uint64)
+    x = x - ((x >> np.uint64(1)) & np.uint64(0x5555555555555555))
+    x = (x & np.uint64(0x3333333333333333)) + ((x >> np.uint64(2)) & np.uint64(0x3333333333333333))
+    x = (x + (x >> np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    x *= np.uint64(0x0101010101010101)
+    x >>= np.uint64(56)
+    return x.astype(np.uint8)
+
+
+def tickets_to_masks(selected: pd.DataFrame) -> TicketMasks:
+    """ converts a selected numbers DataFrame (schema of ./selected_numbers.csv) into TicketMasks. """
+    number_cols = [col for col in selected.columns if col.startswith('Number_')]
+    star_cols = [col for col in selected.columns if col.startswith('Lucky_Star_')]
+
+    return TicketMasks(
+        names=selected['Name'].to_numpy(),
+        balls=pack_numbers(selected[number_cols].to_numpy(), *NUMBER_RANGE, dtype=np.uint64),
+        stars=pack_numbers(selected[star_cols].to_numpy(), *STAR_RANGE, dtype=np.uint16),
+    )
+
+
+def read_ticket_masks(path: str = './selected_numbers.csv', chunksize: int = 1_000_000) -> TicketMasks:
+    """ reads selected numbers csv in chunks, so only the packed masks of all tickets are held in memory. """
+    chunks = [tickets_to_masks(chunk) for chunk in pd.read_csv(path, chunksize=chunksize)]
+
+    return TicketMasks(*(np.concatenate(field) for field in zip(*chunks)))
+
+
+def draw_masks(winning: dict) -> (np.uint64, np.uint16):
+    """ packs winning numbers, as returned by `collect_winning_numbers`, into a ball mask and a star mask. """
+    ball_mask = pack_numbers([winning['Balls']], *NUMBER_RANGE, dtype=np.uint64)[0]
+    star_mask = pack_numbers([winning['Lucky Stars']], *STAR_RANGE, dtype=np.uint16)[0]
+    return ball_mask, star_mask
+
+
+def count_matches(tickets: TicketMasks, winning: dict) -> (np.ndarray, np.ndarray):
+    """ counts balls and stars matched by every ticket against one draw: popcount(ticket_mask & draw_mask).
+        Note: a number selected twice on one ticket only sets one bit, so it can only be matched once.
+    """
+    ball_mask, star_mask = draw_masks(winning)
+    return popcount(tickets.balls & ball_mask), popcount(tickets.stars & star_mask)
@@ -0,0 +1,128 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+from manager.check_matches import match_type_lookup, prize_table, prize_pence_table, count_hits
+from manager.tools import NUMBER_COLS, STAR_COLS, NUMBER_RANGE, STAR_RANGE, find_invalid_rows
+
+N_BALLS = len(NUMBER_COLS)
+N_STARS = len(STAR_COLS)
+
+
+class TicketTable:
+    """ compact, typed store of selected numbers: an (N x 7) uint8 array of 5 balls then 2 lucky stars per ticket,
+        and player names interned as int32 codes into names (each name is stored once).
+        Convert to a DataFrame only at the BigQuery boundary, see `to_dataframe`.
+    """
+    __slots__ = ('numbers', 'name_codes', 'names')
+
+    def __init__(self, numbers: np.ndarray, name_codes: np.ndarray, names: np.ndarray):
+        if numbers.dtype != np.uint8 or numbers.ndim != 2 or numbers.shape[1] != N_BALLS + N_STARS:
+            raise ValueError(f'numbers must be a uint8 array of shape (N, {N_BALLS + N_STARS}), '
+                             f'got {numbers.dtype} {numbers.shape}.')
+        if len(name_codes) != len(numbers):
+            raise ValueError(f'{len(name_codes)} name codes for {len(numbers)} tickets.')
+        self.numbers = numbers
+        self.name_codes = name_codes
+        self.names = names
+
+    @classmethod
+    def from_dataframe(cls, selected: pd.DataFrame) -> 'TicketTable':
+        """ from a selected numbers DataFrame (schema of ./selected_numbers.csv). Raises ValueError if a number is
+            out of range, before it is narrowed to uint8.
+        """
+        numbers = np.hstack([_narrow(selected[NUMBER_COLS].to_numpy(), *NUMBER_RANGE),
+                             _narrow(selected[STAR_COLS].to_numpy(), *STAR_RANGE)])
+        name_codes, names = pd.factorize(selected['Name'])
+        return cls(numbers, name_codes.astype(np.int32), np.asarray(names, dtype=object))
+
+    @property
+    def balls(self) -> np.ndarray:
+        return self.numbers[:, :N_BALLS]
+
+    @property
+    def stars(self) -> np.ndarray:
+        return self.numbers[:, N_BALLS:]
+
+    @property
+    def nbytes(self) -> int:
+        """ memory held by the table, including the interned name strings. """
+        return (self.numbers.nbytes + self.name_codes.nbytes + self.names.nbytes
+                + sum(sys.getsizeof(name) for name in self.names))
+
+    def __len__(self) -> int:
+        return len(self.numbers)
+
+    def check_matches(self, winning: dict, prize_breakdown: dict) -> 'MatchResults':
+        """ as `check_matches_on_selected`, but results are integer match codes (see `match_code`) and integer
+            pence, without building any per ticket strings. winning as returned by `collect_winning_numbers`.
+        """
+        balls_matched = count_hits(self.balls, [winning['Balls']], NUMBER_RANGE[1])[0]
+        stars_matched = count_hits(self.stars, [winning['Lucky Stars']], STAR_RANGE[1])[0]
+        match_codes = match_code(balls_matched, stars_matched)
+
+        return MatchResults.from_breakdown(self, match_codes, prize_breakdown)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """ back to the selected numbers schema, with int64 numbers. """
+        data = pd.DataFrame(self.numbers.astype('int64'), columns=NUMBER_COLS + STAR_COLS)
+        data.insert(0, 'Name', self.names[self.name_codes])
+        return data
+
+
+class MatchResults:
+    """ results of `TicketTable.check_matches`: a uint8 match code and int64 prize in pence per ticket.
+        prize_labels holds the prize breakdown's own strings by match code, for `to_dataframe`.
+    """
+    __slots__ = ('tickets', 'match_codes', 'prizes_pence', 'prize_labels')
+
+    def __init__(
+            self, tickets: TicketTable, match_codes: np.ndarray, prizes_pence: np.ndarray, prize_labels: np.ndarray):
+        self.tickets = tickets
+        self.match_codes = match_codes
+        self.prizes_pence = prizes_pence
+        self.prize_labels = prize_labels
+
+    @classmethod
+    def from_breakdown(cls, tickets: TicketTable, match_codes: np.ndarray, prize_breakdown: dict) -> 'MatchResults':
+        """ looks up the prize of every match code, in pence and as the breakdown's string. """
+        match_types = match_type_lookup(max_balls=N_BALLS, max_stars=N_STARS)
+        prizes_pence = prize_pence_table(match_types, prize_breakdown).ravel()
+        return cls(tickets, match_codes, prizes_pence[match_codes], prize_table(match_types, prize_breakdown).ravel())
+
+    @property
+    def balls_matched(self) -> np.ndarray:
+        return self.match_codes // (N_STARS + 1)
+
+    @property
+    def stars_matched(self) -> np.ndarray:
+        return self.match_codes % (N_STARS + 1)
+
+    @property
+    def nbytes(self) -> int:
+        return self.match_codes.nbytes + self.prizes_pence.nbytes
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """ same columns and values as `check_matches_on_selected`, per ticket labels and prizes are built here. """
+        balls_matched = self.balls_matched.astype('int64')
+        stars_matched = self.stars_matched.astype('int64')
+        data = self.tickets.to_dataframe()
+        data['Balls_Matched'] = balls_matched
+        data['Stars_Matched'] = stars_matched
+        data['Match_Type'] = match_type_lookup(max_balls=N_BALLS, max_stars=N_STARS)[balls_matched, stars_matched]
+        data['Prize'] = self.prize_labels[self.match_codes]
+        return data
+
+
+def match_code(balls_matched: np.ndarray, stars_matched: np.ndarray) -> np.ndarray:
+    """ (balls, stars) matched as one uint8: balls * 3 + stars, i.e. the flat index into a (6 x 3) match table. """
+    return (balls_matched * (N_STARS + 1) + stars_matched).astype(np.uint8)
+
+
+def _narrow(numbers: np.ndarray, start: int, end: int) -> np.ndarray:
+    out_of_range, _repeated = find_invalid_rows(numbers, start, end)
+    if out_of_range.any():
+        raise ValueError(f'Numbers must be between [{start}, {end}] inclusive. Found rows: '
+                         f'{np.flatnonzero(out_of_range)[:10].tolist()}')
+    return numbers.astype(np.uint8)
@@ -1,9 +1,19 @@
+import logging
 import re
 from datetime import timedelta, date
 from typing import Iterable
 
+import numpy as np
 import pandas as pd
 
+NUMBER_COLS = ['Number_1', 'Number_2', 'Number_3', 'Number_4', 'Number_5']
+STAR_COLS = ['Lucky_Star_1', 'Lucky_Star_2']
+NUMBER_RANGE = (1, 50)
+STAR_RANGE = (1, 12)
+VALIDATION_CHUNK_SIZE = 1_000_000  # rows of selected numbers held in memory at once
+MAX_REPORTED_ROWS = 10  # per kind of error, the rest are only counted
+PRIZE_AMOUNT_PATTERN = r'-?\d+(?:\.\d{1,2})?'  # pounds, once '£', ',' and spaces are dropped
+
 
 def get_last_friday_date(run_date: date) -> (date, str):
     """ User only runs on fridays. Therefore, given any date, function determines the
@@ -20,6 +30,19 @@ def get_last_friday_date(run_date: date) -> (date, str):
     return last_fri, last_fri.strftime('%Y_%m_%d_%b_%a')
 
 
+def prize_to_pence(prizes: pd.Series) -> pd.Series:
+    """ converts prize strings, e.g. '£1,234.50' or '£5', to integer pence, e.g. 123450 or 500. A prize which is
+        not an amount of pounds (e.g. '' or 'Rollover') is worth 0, and is logged as a warning.
+    """
+    amounts = prizes.astype(str).str.replace(r'[£,\s]', '', regex=True)
+    is_amount = amounts.str.fullmatch(PRIZE_AMOUNT_PATTERN).astype(bool)
+    if not is_amount.all():
+        not_amounts = sorted(set(prizes[~is_amount].astype(str)))
+        logging.warning(f'Prizes which are not an amount are worth £0.00: {not_amounts}')
+    pounds = pd.to_numeric(amounts.where(is_amount, '0'))
+    return (pounds * 100).round().astype('int64')
+
+
 def assert_values_in_range(data: pd.DataFrame, start: int, end: int, cols: list) -> None:
     """ checks if selected numbers in given data are within a range. """
     if not cols:
@@ -41,25 +64,97 @@ def has_needed_columns(cols: Iterable[str]) -> None:
     return
 
 
-def validate_selected_numbers(path: str = './selected_numbers.csv') -> None:
+def validate_selected_numbers(path: str = './selected_numbers.csv', chunksize: int = VALIDATION_CHUNK_SIZE) -> None:
     """ Read manager.selected_numbers ('./selected_numbers.csv') from BigQuery and validates them. Ensures:
         * dataframe to be written to BigQuery has all the correct columns.
         * there are no duplicates in Name col.
         * numbers selected are within valid ranges.
+        * no number or lucky star is repeated within a ticket.
 
+        The file is read chunksize rows at a time, so memory is bounded by the chunk size plus 8 bytes per row
+        (a hash of each Name). Every error is collected before raising a single ValueError, which lists the first
+        MAX_REPORTED_ROWS row indices of each kind of error.
     """
-    selected_numbers = pd.read_csv(path)
+    dtype = {'Name': str, **{col: 'int64' for col in NUMBER_COLS + STAR_COLS}}
+    errors = {}  # {description: (count, [row index, ...])}
+    name_hashes = []
+    for chunk in _read_csv_chunks(path, dtype=dtype, chunksize=chunksize):
+        has_needed_columns(chunk.columns)
+        name_hashes.append(pd.util.hash_pandas_object(chunk['Name'], index=False).to_numpy())
 
-    has_needed_columns(selected_numbers.columns)
+        number_cols = [col for col in chunk.columns if col.startswith('Number_')]
+        star_cols = [col for col in chunk.columns if col.startswith('Lucky_Star_')]
+        for kind, cols, (start, end) in [('Number_*', number_cols, NUMBER_RANGE),
+                                         ('Lucky_Star_*', star_cols, STAR_RANGE)]:
+            out_of_range, repeated = find_invalid_rows(chunk[cols].to_numpy(), start, end)
+            _collect_errors(errors, f'{kind} not between [{start}, {end}] inclusive', chunk.index[out_of_range])
+            _collect_errors(errors, f'{kind} repeated within a ticket', chunk.index[repeated])
 
-    if not selected_numbers['Name'].is_unique:
-        duplicates = selected_numbers['Name'].value_counts()
-        raise ValueError(f'"Name" in Selected numbers needs to be unique. Correct:\n{duplicates[duplicates > 1]}')
+    messages = []
+    duplicates = _find_duplicate_names(path, name_hashes, chunksize)
+    if not duplicates.empty:
+        messages.append(f'"Name" in Selected numbers needs to be unique. Correct:\n{duplicates}')
+    for description, (count, rows) in errors.items():
+        more = f' (and {count - len(rows)} more)' if count > len(rows) else ''
+        messages.append(f'{count} rows with {description}, rows: {rows}{more}')
+    if messages:
+        raise ValueError('\n'.join(messages))
 
-    number_cols = [col for col in selected_numbers.columns if col.startswith('Number_')]
-    assert_values_in_range(selected_numbers, start=1, end=50, cols=number_cols)
+    return
 
-    star_cols = [col for col in selected_numbers.columns if col.startswith('Lucky_Star_')]
-    assert_values_in_range(selected_numbers, start=1, end=12, cols=star_cols)
 
-    return
+def find_invalid_rows(numbers: np.ndarray, start: int, end: int) -> (np.ndarray, np.ndarray):
+    """ vectorised checks of a (rows, picks) array of numbers. Returns two boolean masks over rows: any number not
+        in [start, end], and any number repeated within the row (after sorting the row, neighbours are equal).
+    """
+    out_of_range = ((numbers < start) | (numbers > end)).any(axis=1)
+    # in range numbers fit in a byte, so the sort works on 1/8th of the memory
+    compact = np.where(out_of_range[:, None], 0, numbers).astype(np.uint8)
+    compact.sort(axis=1)
+    repeated = (np.diff(compact, axis=1) == 0).any(axis=1) & ~out_of_range
+    return out_of_range, repeated
+
+
+def _read_csv_chunks(path: str, **read_csv_kwargs) -> Iterable[pd.DataFrame]:
+    """ pd.read_csv in chunks, a value which can't be parsed as the given dtype raises a TypeError. Malformed csv
+        (pandas' ParserError and EmptyDataError, themselves ValueErrors) is raised as it is.
+    """
+    chunks = iter(pd.read_csv(path, **read_csv_kwargs))
+    while True:
+        try:
+            chunk = next(chunks)
+        except StopIteration:
+            return
+        except (pd.errors.ParserError, pd.errors.EmptyDataError):
+            raise
+        except ValueError as ve:  # e.g. 'x' or an empty cell in a number column
+            raise TypeError(f'Selected numbers in {path} are not all whole numbers: {ve}') from ve
+        yield chunk
+
+
+def _collect_errors(errors: dict, description: str, rows: pd.Index) -> None:
+    if len(rows) == 0:
+        return
+    count, reported = errors.get(description, (0, []))
+    reported = reported + rows[:MAX_REPORTED_ROWS - len(reported)].tolist()
+    errors[description] = (count + len(rows), reported)
+
+
+def _find_duplicate_names(path: str, name_hashes: [np.ndarray], chunksize: int) -> pd.Series:
+    """ Names are compared by hash, so names are never all held in memory. Only when hashes repeat is the file
+        read again, keeping just the names with a repeated hash, to count them (and rule out hash collisions).
+        Returns the count of each duplicate name.
+    """
+    hashes = np.concatenate(name_hashes) if name_hashes else np.array([], dtype=np.uint64)
+    name_hashes.clear()  # the chunks' hashes are copied to hashes, free them before sorting
+    hashes.sort()
+    repeated_hashes = np.unique(hashes[1:][hashes[1:] == hashes[:-1]])
+    if len(repeated_hashes) == 0:
+        return pd.Series(dtype='int64')
+
+    candidates = []
+    for chunk in _read_csv_chunks(path, usecols=['Name'], dtype={'Name': str}, chunksize=chunksize):
+        names = chunk['Name']
+        candidates.append(names[np.isin(pd.util.hash_pandas_object(names, index=False).to_numpy(), repeated_hashes)])
+    counts = pd.concat(candidates).value_counts(dropna=False)  # blank names hash alike, and are duplicates too
+    return counts[counts > 1]
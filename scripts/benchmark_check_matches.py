@@ -0,0 +1,74 @@
+""" Benchmarks `check_matches_on_selected` against the previous row-wise implementation.
+
+    Usage (from repo root): python scripts/benchmark_check_matches.py [n_rows ...]
+
+    The row-wise implementation is skipped above ROW_WISE_LIMIT rows, where it takes minutes.
+"""
+import sys
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from manager.check_matches import match_type_label, check_matches_on_selected  # noqa: E402
+
+DEFAULT_ROW_COUNTS = [1_000, 100_000, 10_000_000]
+ROW_WISE_LIMIT = 100_000
+
+WINNING = {'Balls': [9, 13, 21, 29, 35], 'Lucky Stars': [1, 2]}
+PRIZE_BREAKDOWN = {
+    'Match 5 + 2 Stars': '£0.00', 'Match 5 + 1 Star': '£51,956.30', 'Match 5': '£7,727.40',
+    'Match 4 + 2 Stars': '£1,283.60', 'Match 4 + 1 Star': '£95.20', 'Match 3 + 2 Stars': '£40.10',
+    'Match 4': '£30.50', 'Match 2 + 2 Stars': '£9.90', 'Match 3 + 1 Star': '£6.00', 'Match 3': '£4.80',
+    'Match 1 + 2 Stars': '£4.90', 'Match 2 + 1 Star': '£3.20', 'Match 2': '£2.20',
+}
+
+
+def make_selected(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    selected = pd.DataFrame({f'Number_{i}': rng.integers(1, 51, n_rows) for i in range(1, 6)})
+    for i in range(1, 3):
+        selected[f'Lucky_Star_{i}'] = rng.integers(1, 13, n_rows)
+    selected.insert(0, 'Name', 'Player')
+    return selected
+
+
+def check_matches_row_wise(selected: pd.DataFrame, winning: dict, prize_breakdown: dict) -> pd.DataFrame:
+    """ previous implementation, kept here as the baseline. """
+    number_cols = [col for col in selected.columns if col.startswith('Number')]
+    star_cols = [col for col in selected.columns if col.startswith('Lucky_Star')]
+
+    selected['Balls_Matched'] = selected.loc[:, number_cols].isin(winning['Balls']).sum(axis=1)
+    selected['Stars_Matched'] = selected.loc[:, star_cols].isin(winning['Lucky Stars']).sum(axis=1)
+    selected['Match_Type'] = selected[['Balls_Matched', 'Stars_Matched']].apply(match_type_label, axis=1)
+    selected['Prize'] = selected['Match_Type'].map(prize_breakdown).fillna('£0.00')
+
+    return selected
+
+
+def time_it(func, *args) -> (float, object):
+    start = perf_counter()
+    result = func(*args)
+    return perf_counter() - start, result
+
+
+def main(row_counts: [int]) -> None:
+    print(f'{"rows":>12} {"row-wise (s)":>14} {"vectorised (s)":>16} {"speed up":>10}')
+    for n_rows in row_counts:
+        selected = make_selected(n_rows)
+        vectorised_time, vectorised = time_it(check_matches_on_selected, selected.copy(), WINNING, PRIZE_BREAKDOWN)
+
+        if n_rows <= ROW_WISE_LIMIT:
+            row_wise_time, row_wise = time_it(check_matches_row_wise, selected.copy(), WINNING, PRIZE_BREAKDOWN)
+            pd.testing.assert_frame_equal(vectorised, row_wise)
+            print(f'{n_rows:>12,} {row_wise_time:>14.3f} {vectorised_time:>16.3f} '
+                  f'{row_wise_time / vectorised_time:>9.1f}x')
+        else:
+            print(f'{n_rows:>12,} {"skipped":>14} {vectorised_time:>16.3f} {"-":>10}')
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_ROW_COUNTS)
@@ -0,0 +1,74 @@
+""" Benchmarks the cold start of a cloud function: imports `main` in a fresh interpreter with -X importtime, offline.
+
+    Usage (from repo root): python scripts/benchmark_cold_start.py [function] [repeats]
+
+    function defaults to run_manager. Reports wall time of the import, the slowest imports made by `main` and the
+    import time of each heavy package (cumulative, median over repeats), and which heavy packages are deferred,
+    i.e. not imported by `main` until they are used.
+"""
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from time import perf_counter
+
+ROOT = Path(__file__).resolve().parents[1]
+HEAVY_PACKAGES = ['pandas', 'numpy', 'pyarrow', 'google.cloud.bigquery', 'google.cloud.pubsub_v1', 'bs4', 'requests',
+                  'aiohttp']
+TOP = 5
+
+
+def import_main(function: str) -> (float, {str: int}, {str: int}, [str]):
+    """ imports main of function in a new process.
+        Returns (wall seconds, {module imported by main: cumulative us}, {module: cumulative us}, loaded packages).
+    """
+    env = dict(os.environ, PYTHONPATH=str(ROOT))
+    check_loaded = f'import sys; print(",".join(p for p in {HEAVY_PACKAGES!r} if p in sys.modules))'
+    start = perf_counter()
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import main; {check_loaded}'],
+                             cwd=ROOT / 'functions' / function / 'src', env=env, capture_output=True, text=True)
+    seconds = perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.splitlines()[-1])
+
+    top_level, modules = {}, {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2  # 2 spaces per level of nesting
+        modules[name.strip()] = int(cumulative_us)
+        if name.strip() == 'main' and depth == 0:
+            top_level['main (total)'] = int(cumulative_us)
+        elif depth == 1:  # imported directly by main
+            top_level[name.strip()] = int(cumulative_us)
+    loaded = process.stdout.strip().split(',') if process.stdout.strip() else []
+    return seconds, top_level, modules, loaded
+
+
+def main():
+    function = sys.argv[1] if len(sys.argv) > 1 else 'run_manager'
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    runs = [import_main(function) for _ in range(repeats)]
+    print(f'{function}: "import main" in a fresh interpreter, median of {repeats}')
+    print(f'  wall time (interpreter start + imports): {statistics.median(run[0] for run in runs) * 1000:.0f} ms')
+
+    cumulative = {module: statistics.median(run[1].get(module, 0) for run in runs) for module in runs[0][1]}
+    print('  slowest imports made by main (cumulative ms):')
+    for module, us in sorted(cumulative.items(), key=lambda item: -item[1])[:TOP]:
+        print(f'    {module:<40} {us / 1000:>8.1f}')
+
+    loaded = set(runs[0][3])
+    print('  heavy packages (cumulative ms, counted where first imported):')
+    for package in HEAVY_PACKAGES:
+        if package in loaded:
+            print(f'    {package:<40} {statistics.median(run[2].get(package, 0) for run in runs) / 1000:>8.1f}')
+
+    print(f'  heavy packages imported by main: {", ".join(sorted(loaded)) or "none"}')
+    print(f'  deferred until used or not needed: {", ".join(p for p in HEAVY_PACKAGES if p not in loaded)}')
+
+
+if __name__ == '__main__':
+    main()
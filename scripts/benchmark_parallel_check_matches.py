@@ -0,0 +1,59 @@
+""" Times match checking across processes (manager/parallel.py) against the in-process TicketTable.check_matches.
+
+    Usage (from repo root): python scripts/benchmark_parallel_check_matches.py [n_rows] [n_draws]
+
+    Every ticket is checked against n_draws random draws (default 1M tickets, 10 draws), with 1, 2, 4 and 8 workers.
+    Speedup is bounded by the number of CPUs, printed first: on a single CPU more workers only add overhead.
+"""
+import os
+import sys
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from manager.parallel import match_codes_parallel  # noqa: E402
+from manager.ticket_table import TicketTable  # noqa: E402
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from benchmark_check_matches import make_selected, PRIZE_BREAKDOWN  # noqa: E402
+
+WORKERS = [1, 2, 4, 8]
+
+
+def random_draws(n_draws: int, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    balls = [rng.choice(np.arange(1, 51), 5, replace=False) for _ in range(n_draws)]
+    stars = [rng.choice(np.arange(1, 13), 2, replace=False) for _ in range(n_draws)]
+    return np.hstack([balls, stars]).astype(np.uint8)
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    n_draws = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    print(f'{n_rows:,} tickets x {n_draws} draws, {os.cpu_count()} CPU(s)')
+
+    tickets = TicketTable.from_dataframe(make_selected(n_rows))
+    draws = random_draws(n_draws)
+
+    start = perf_counter()
+    expected = np.stack([
+        tickets.check_matches({'Balls': draw[:5].tolist(), 'Lucky Stars': draw[5:].tolist()}, PRIZE_BREAKDOWN)
+        .match_codes for draw in draws
+    ])
+    baseline = perf_counter() - start
+    print(f'{"in process":<12} {baseline:>8.2f}s')
+
+    for max_workers in WORKERS:
+        start = perf_counter()
+        codes = match_codes_parallel(tickets.numbers, draws, max_workers=max_workers)
+        seconds = perf_counter() - start
+        assert np.array_equal(codes, expected), f'{max_workers} workers gave different results'
+        print(f'{f"{max_workers} workers":<12} {seconds:>8.2f}s  speedup {baseline / seconds:>5.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+""" Benchmarks prize breakdown parsers on the saved fixture pages, offline.
+
+    Usage (from repo root): python scripts/benchmark_prize_breakdown_parsing.py [repeats]
+
+    Reports mean parse time and peak memory (tracemalloc) per parser. All parsers must return the same dict.
+"""
+import sys
+import tracemalloc
+from pathlib import Path
+from time import perf_counter
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from manager.scrape_results import parse_prize_breakdown, STREAMING_PARSER  # noqa: E402
+
+FIXTURE = Path(__file__).resolve().parents[1] / 'tests' / 'resource' / 'prize_breakdown.html'
+PARSERS = ['html.parser', 'lxml', STREAMING_PARSER]
+
+
+def available_parsers() -> [str]:
+    parsers = []
+    for parser in PARSERS:
+        try:
+            parse_prize_breakdown('<html></html>', parser=parser)
+            parsers.append(parser)
+        except Exception:  # bs4.FeatureNotFound when lxml is not installed
+            print(f'{parser} not available, skipping.')
+    return parsers
+
+
+def peak_memory(page: bytes, parser: str) -> int:
+    tracemalloc.start()
+    parse_prize_breakdown(page, parser=parser)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def main(repeats: int) -> None:
+    page = FIXTURE.read_bytes()
+    parsers = available_parsers()
+    print(f'page: {FIXTURE.name} ({len(page):,} bytes), repeats: {repeats}')
+    print(f'{"parser":>12} {"mean (ms)":>10} {"peak memory (KiB)":>18}')
+
+    expected = None
+    for parser in parsers:
+        result = parse_prize_breakdown(page, parser=parser)
+        if expected is None:
+            expected = result
+        assert result == expected, f'{parser} returned {result}, expected {expected}'
+
+        start = perf_counter()
+        for _ in range(repeats):
+            parse_prize_breakdown(page, parser=parser)
+        mean_ms = 1000 * (perf_counter() - start) / repeats
+
+        print(f'{parser:>12} {mean_ms:>10.2f} {peak_memory(page, parser) / 1024:>18.1f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
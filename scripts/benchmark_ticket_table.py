@@ -0,0 +1,58 @@
+""" Measures memory per million tickets of selected numbers and their results: DataFrames against TicketTable.
+
+    Usage (from repo root): python scripts/benchmark_ticket_table.py [n_rows]
+
+    Selected numbers are measured with `memory_usage(deep=True)`, i.e. including the name strings. Every ticket has its
+    own name, as names are unique in selected numbers, so interning names saves nothing here. Results are measured
+    without deep: their Match_Type and Prize strings are shared from lookup tables, so only pointers are per row.
+"""
+import sys
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from manager.check_matches import check_matches_on_selected  # noqa: E402
+from manager.ticket_table import TicketTable  # noqa: E402
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from benchmark_check_matches import make_selected, WINNING, PRIZE_BREAKDOWN  # noqa: E402
+
+
+def mb_per_million(n_bytes: int, n_rows: int) -> float:
+    return n_bytes / 1e6 * 1_000_000 / n_rows
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    selected = make_selected(n_rows).assign(Name=[f'player_{i}' for i in range(n_rows)])
+
+    selected_bytes = selected.memory_usage(deep=True).sum()
+    start = perf_counter()
+    results = check_matches_on_selected(selected.copy(), WINNING, PRIZE_BREAKDOWN)
+    dataframe_seconds = perf_counter() - start
+    results_bytes = results[['Balls_Matched', 'Stars_Matched', 'Match_Type', 'Prize']].memory_usage(index=False).sum()
+
+    tickets = TicketTable.from_dataframe(selected)
+    start = perf_counter()
+    match_results = tickets.check_matches(WINNING, PRIZE_BREAKDOWN)
+    table_seconds = perf_counter() - start
+    numbers_bytes = tickets.numbers.nbytes
+
+    print(f'{n_rows:,} tickets, MB per million tickets:')
+    print(f'{"":<28}{"DataFrame":>12}{"TicketTable":>14}')
+    print(f'{"numbers":<28}{mb_per_million(selected[selected.columns[1:]].memory_usage().sum(), n_rows):>12.1f}'
+          f'{mb_per_million(numbers_bytes, n_rows):>14.1f}')
+    print(f'{"tickets (incl. names)":<28}{mb_per_million(selected_bytes, n_rows):>12.1f}'
+          f'{mb_per_million(tickets.nbytes, n_rows):>14.1f}')
+    print(f'{"results (added columns)":<28}{mb_per_million(results_bytes, n_rows):>12.1f}'
+          f'{mb_per_million(match_results.nbytes, n_rows):>14.1f}')
+    print(f'check matches: {dataframe_seconds:.3f}s DataFrame, {table_seconds:.3f}s TicketTable')
+    assert np.array_equal(match_results.balls_matched, results['Balls_Matched'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+""" Benchmarks validate_selected_numbers on a generated file of valid tickets, offline.
+
+    Usage (from repo root): python scripts/benchmark_validate_selected_numbers.py [n_rows] [chunksize]
+
+    n_rows defaults to 5M (a 50M row file is about 1.7 GB on disk). Each validation runs in its own process, reporting
+    time and peak resident memory, for the chunked validator and for reading the whole file as before.
+"""
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from manager.tools import NUMBER_COLS, STAR_COLS, VALIDATION_CHUNK_SIZE  # noqa: E402
+
+GENERATE_CHUNK_SIZE = 1_000_000
+
+VALIDATORS = {
+    'chunked (uint8 sort, name hashes)': 'from manager.tools import validate_selected_numbers; '
+                                         'validate_selected_numbers({path!r}, chunksize={chunksize})',
+    'whole file (default dtypes)': 'import pandas as pd; data = pd.read_csv({path!r}); '
+                                   'assert data["Name"].is_unique; '
+                                   f'assert data[{NUMBER_COLS!r}].isin(range(1, 51)).all(axis=1).all(); '
+                                   f'assert data[{STAR_COLS!r}].isin(range(1, 13)).all(axis=1).all()',
+}
+
+
+def random_picks(rng: np.random.Generator, n_rows: int, picks: int, end: int) -> np.ndarray:
+    """ picks distinct numbers in [1, end] per row. """
+    return np.argsort(rng.random((n_rows, end), dtype=np.float32), axis=1)[:, :picks].astype(np.uint8) + 1
+
+
+def generate_tickets(path: Path, n_rows: int, seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    for start in range(0, n_rows, GENERATE_CHUNK_SIZE):
+        size = min(GENERATE_CHUNK_SIZE, n_rows - start)
+        chunk = pd.DataFrame(np.hstack([random_picks(rng, size, 5, 50), random_picks(rng, size, 2, 12)]),
+                             columns=NUMBER_COLS + STAR_COLS)
+        chunk.insert(0, 'Name', [f'player_{i}' for i in range(start, start + size)])
+        chunk.to_csv(path, mode='a', header=start == 0, index=False)
+
+
+def run_validator(code: str) -> (float, float):
+    """ runs code in a new process. Returns (seconds, peak resident memory in MB). Linux only: the peak is the
+        process' own VmHWM, as ru_maxrss of a child also counts the parent's memory from before exec.
+    """
+    report_peak = "; print([line.split()[1] for line in open('/proc/self/status') if line.startswith('VmHWM')][0])"
+    start = perf_counter()
+    process = subprocess.run([sys.executable, '-c', code + report_peak], cwd=ROOT, check=True, capture_output=True,
+                             text=True)
+    seconds = perf_counter() - start
+    return seconds, int(process.stdout.split()[-1]) / 1024
+
+
+def main():
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    chunksize = int(sys.argv[2]) if len(sys.argv) > 2 else VALIDATION_CHUNK_SIZE
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / 'selected_numbers.csv'
+        start = perf_counter()
+        generate_tickets(path, n_rows)
+        print(f'Generated {n_rows:,} tickets ({path.stat().st_size / 1e6:,.0f} MB) in {perf_counter() - start:.1f}s')
+
+        for name, code in VALIDATORS.items():
+            seconds, peak_mb = run_validator(code.format(path=str(path), chunksize=chunksize))
+            print(f'{name:<36} {seconds:>8.2f}s  peak memory {peak_mb:>8,.0f} MB')
+
+
+if __name__ == '__main__':
+    main()
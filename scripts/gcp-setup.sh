@@ -127,7 +127,7 @@ echo
 echo "Permitting Cloud build roles needed to perform BigQuery Integration Tests"
 gcloud iam roles create BigQueryTester --project=${PROJECT_ID} \
   --title="BigQuery Tester" --description="Appropriate permissions to run integration tests with BigQuery." \
-  --permissions=bigquery.readsessions.getData,bigquery.readsessions.create,bigquery.jobs.create,bigquery.datasets.create,bigquery.datasets.delete,bigquery.tables.create,bigquery.tables.list,bigquery.tables.delete,bigquery.tables.getData
+  --permissions=bigquery.readsessions.getData,bigquery.readsessions.create,bigquery.jobs.create,bigquery.datasets.create,bigquery.datasets.delete,bigquery.tables.create,bigquery.tables.get,bigquery.tables.list,bigquery.tables.delete,bigquery.tables.getData,bigquery.tables.updateData
 
 gcloud projects add-iam-policy-binding $PROJECT_ID \
     --member=serviceAccount:$PROJECT_NUMBER@cloudbuild.gserviceaccount.com \
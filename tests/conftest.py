@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def winning_numbers():
+    """ winning numbers of draw 1381, as returned by `collect_winning_numbers`. """
+    return {'Balls': [9, 13, 21, 29, 35], 'Lucky Stars': [1, 2]}
+
+
+@pytest.fixture
+def random_tickets():
+    """ makes n_rows random tickets, with the columns of ./selected_numbers.csv and a unique Name each. """
+    def make(n_rows: int, seed: int = 0) -> pd.DataFrame:
+        rng = np.random.default_rng(seed)
+        tickets = pd.DataFrame({f'Number_{i}': rng.integers(1, 51, n_rows) for i in range(1, 6)})
+        for i in range(1, 3):
+            tickets[f'Lucky_Star_{i}'] = rng.integers(1, 13, n_rows)
+        tickets.insert(0, 'Name', [f'player_{i}' for i in range(n_rows)])
+        return tickets
+
+    return make
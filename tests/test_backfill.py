@@ -0,0 +1,150 @@
+import io
+import threading
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+from pytest import fixture, raises
+
+from manager.backfill import backfill, compute_weekly_results, draw_dates_between, summarise_results, LocalResultsWriter
+from manager.check_matches import check_matches_on_selected, collect_winning_numbers
+from manager.scrape_results import parse_prize_breakdown
+
+hist_results = pd.DataFrame({
+    'DrawDate': ['18-Dec-2020', '15-Dec-2020', '11-Dec-2020', '04-Dec-2020'],
+    'Ball 1': [1, 2, 9, 3], 'Ball 2': [7, 4, 10, 5], 'Ball 3': [9, 6, 20, 7], 'Ball 4': [20, 8, 30, 9],
+    'Ball 5': [30, 10, 40, 11], 'Lucky Star 1': [1, 2, 3, 4], 'Lucky Star 2': [3, 4, 5, 6],
+    'UK Millionaire Maker': ['alpha', 'beta', 'gamma', 'delta'],
+    'DrawNumber': [1384, 1383, 1382, 1381]
+})
+
+selected = pd.DataFrame({
+    'Name': ['Peter', 'Crouch', 'Special'],
+    'Number_1': [1, 9, 3], 'Number_2': [7, 10, 5], 'Number_3': [9, 20, 44], 'Number_4': [20, 30, 45],
+    'Number_5': [21, 31, 46], 'Lucky_Star_1': [1, 3, 4], 'Lucky_Star_2': [3, 5, 12]
+})
+
+
+def read_html(file_name):
+    with open(f'../tests/resource/{file_name}.html', 'rb') as html:
+        page = html.read()
+    return page
+
+
+@fixture
+def lottery_server():
+    """ local stand-in for the lottery website: draw history page, its csv and prize breakdown pages. """
+    pages = {
+        '/results/euromillions/draw-history': read_html('draw_history'),
+        '/results/euromillions/draw-history/csv': hist_results.to_csv(index=False).encode('utf-8'),
+    }
+    breakdown_page = read_html('prize_breakdown')
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            with server.lock:
+                server.requests.append(self.path)
+            if self.path.startswith('/results/euromillions/draw-history/prize-breakdown/'):
+                body = breakdown_page
+            else:
+                body = pages[self.path]
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_draw_dates_between():
+    assert draw_dates_between(date(2020, 12, 5), date(2020, 12, 19)) == {
+        '2020_12_04_Dec_Fri': date(2020, 12, 4),
+        '2020_12_11_Dec_Fri': date(2020, 12, 11),
+        '2020_12_18_Dec_Fri': date(2020, 12, 18),
+    }
+    with raises(ValueError, match='is NOT before End Date'):
+        draw_dates_between(date(2020, 12, 19), date(2020, 12, 5))
+    with raises(ValueError, match='is NOT before End Date'):
+        draw_dates_between(date(2020, 12, 5), date(2020, 12, 5))
+
+
+def test_compute_weekly_results_no_selected_numbers():
+    draw_results = {'2020_12_04_Dec_Fri': {'DrawNumber': 1381}, '2020_12_11_Dec_Fri': {'DrawNumber': 1382}}
+
+    weekly_results = compute_weekly_results(selected.iloc[:0], hist_results, draw_results, breakdowns={})
+
+    assert list(weekly_results) == list(draw_results)
+    for results, draw_result, prize_breakdown in weekly_results.values():
+        assert results.empty
+        assert 'DrawNumber' not in results.columns and 'Match_Type' in results.columns
+        assert prize_breakdown == {}
+
+
+def test_backfill_same_as_run_manager_week_by_week(lottery_server, tmp_path):
+    dataset_names = backfill(date(2020, 12, 5), date(2020, 12, 19), selected, LocalResultsWriter(tmp_path),
+                             base_url=lottery_server.base_url)
+
+    assert dataset_names == ['2020_12_04_Dec_Fri', '2020_12_11_Dec_Fri', '2020_12_18_Dec_Fri']
+    prize_breakdown = parse_prize_breakdown(read_html('prize_breakdown'))
+    for dataset_name, draw in zip(dataset_names, hist_results.iloc[[3, 2, 0]].to_dict('records')):
+        expected = check_matches_on_selected(selected.copy(), collect_winning_numbers(draw), prize_breakdown)
+        pd.testing.assert_frame_equal(pd.read_csv(tmp_path / dataset_name / 'results.csv'),
+                                      pd.read_csv(io.StringIO(expected.to_csv(index=False))))
+        assert (tmp_path / dataset_name / 'draw_outcome.csv').exists()
+        assert (tmp_path / dataset_name / 'prize_breakdown.csv').exists()
+
+    # history is downloaded once, every prize breakdown once.
+    assert sorted(lottery_server.requests) == [
+        '/results/euromillions/draw-history', '/results/euromillions/draw-history/csv',
+        '/results/euromillions/draw-history/prize-breakdown/1381',
+        '/results/euromillions/draw-history/prize-breakdown/1382',
+        '/results/euromillions/draw-history/prize-breakdown/1384',
+    ]
+    general_summary = pd.read_csv(tmp_path / 'manager' / 'general_summary.csv')
+    assert general_summary['Play_Date'].tolist() == dataset_names
+    assert general_summary['Num_of_Players'].tolist() == [3, 3, 3]
+    player_summary = pd.read_csv(tmp_path / 'manager' / 'player_summary.csv')
+    assert player_summary['Days_Played'].tolist() == [3, 3, 3]
+
+
+def test_summarise_results():
+    results_by_dataset = {
+        '1234_56_78_test_a': pd.DataFrame({
+            'Name': ['Michele', 'Vanessa', 'Kobe'], 'Match_Type': ['Match 2', 'Match 3', 'Match 4'],
+            'Prize': ['£2.50', '£5.90', '£25.50']
+        }),
+        '1234_56_78_test_b': pd.DataFrame({
+            'Name': ['Michele', 'Lebron', 'Kobe'], 'Match_Type': ['Match 1 + 2 Stars', 'Match 2', 'Match 0'],
+            'Prize': ['£4.90', '£2.50', '£0.00']
+        }),
+    }
+
+    general_summary, player_summary = summarise_results(results_by_dataset)
+
+    pd.testing.assert_frame_equal(general_summary, pd.DataFrame({
+        'Play_Date': ['1234_56_78_test_a', '1234_56_78_test_b'],
+        'Num_of_Players': [3, 3],
+        'Total_Winnings': [33.9, 7.4],
+        'Winnings_per_Player': [11.3, 7.4 / 3],
+        'Winning_Match_Type': ['Match 2; Match 3; Match 4', 'Match 1 + 2 Stars; Match 2']
+    }))
+    pd.testing.assert_frame_equal(player_summary, pd.DataFrame({
+        'Name': ['Michele', 'Vanessa', 'Kobe', 'Lebron'],
+        'Total_Cumulated_Winnings': [413 / 30, 11.3, 413 / 30, 7.4 / 3],
+        'Days_Played': [2, 1, 2, 1]
+    }))
@@ -120,3 +120,12 @@ def expected_general_summary_with_abc():
         'Winnings_per_Player': [11.3, 7.4 / 3, 25064878],
         'Winning_Match_Type': ['Match 2; Match 3; Match 4', 'Match 1 + 2 Stars; Match 2', 'Match 5 + 2 Stars']
     })
+
+
+@fixture(scope='session')
+def expected_player_summary_with_abc():
+    return pd.DataFrame({
+        'Name': ['Michele', 'Vanessa', 'Kobe', 'Lebron', 'Barak'],
+        'Total_Cumulated_Winnings': [413 / 30 + 25064878, 11.3, 413 / 30, 7.4 / 3, 25064878],
+        'Days_Played': [3, 1, 2, 1, 1]
+    })
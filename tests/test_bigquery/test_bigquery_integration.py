@@ -1,6 +1,11 @@
+import pandas as pd
+
 from manager.bigquery.write import create_bigquery_dataset, write_dataframe_to_bigquery
-from manager.bigquery.read import get_dataset_ids_with_results
-from manager.bigquery.queries import run_query, create_general_summary_query, create_player_summary_query
+from manager.bigquery.read import get_dataset_ids_with_results, get_summarised_dataset_ids
+from manager.bigquery.queries import (
+    run_query, run_script, create_general_summary_query, create_player_summary_query,
+    create_incremental_summary_script, WATERMARK_TABLE_NAME
+)
 
 
 class TestBigqueryWrite:
@@ -111,3 +116,32 @@ class TestBigqueryQueries:
             bigquery_client, dataset_name=self.manager_dataset_name, table_name=destination_table_name,
             expected=expected_general_summary_with_abc
         )
+
+
+class TestBigqueryIncrementalSummary:
+    manager_dataset_name = 'test_manager'
+
+    def test_incremental_summary_same_as_full_rebuild(
+            self, bigquery_client, helpers, expected_general_summary_with_abc, expected_player_summary_with_abc
+    ):
+        dataset_ids = get_dataset_ids_with_results(bigquery_client, pattern=r'\d{4}_\d{2}_\d{2}_test_\w')
+        summarised, new = dataset_ids[:2], dataset_ids[2:]
+        for create_query, table_name in [(create_general_summary_query, 'general_summary'),
+                                         (create_player_summary_query, 'player_summary')]:
+            run_query(bigquery_client, query=create_query(summarised), destination_table_name=table_name,
+                      destination_dataset_name=self.manager_dataset_name)
+        write_dataframe_to_bigquery(bigquery_client, data=pd.DataFrame({'Dataset_Id': summarised}),
+                                    table_name=WATERMARK_TABLE_NAME, dataset_name=self.manager_dataset_name)
+
+        run_script(bigquery_client, create_incremental_summary_script(new, self.manager_dataset_name), 'test')
+
+        helpers.assert_bigquery_table_equal_to_dataframe(
+            bigquery_client, dataset_name=self.manager_dataset_name, table_name='general_summary',
+            expected=expected_general_summary_with_abc, sort_by='Play_Date'
+        )
+        helpers.assert_bigquery_table_equal_to_dataframe(
+            bigquery_client, dataset_name=self.manager_dataset_name, table_name='player_summary',
+            expected=expected_player_summary_with_abc, sort_by='Name'
+        )
+        assert get_summarised_dataset_ids(
+            bigquery_client, WATERMARK_TABLE_NAME, self.manager_dataset_name) == set(dataset_ids)
@@ -0,0 +1,80 @@
+from unittest.mock import MagicMock, patch
+
+from pytest import fixture
+
+from manager.bigquery import cumulating_results
+
+all_dataset_ids = ['2020_01_03_Jan_Fri', '2020_01_10_Jan_Fri', '2020_01_17_Jan_Fri']
+
+
+@fixture
+def mocks():
+    with patch('manager.bigquery.get_client', MagicMock()), \
+            patch('manager.bigquery.get_dataset_ids_with_results', MagicMock(return_value=all_dataset_ids)), \
+            patch('manager.bigquery.get_summarised_dataset_ids', MagicMock()) as get_summarised_dataset_ids, \
+            patch('manager.bigquery.run_script', MagicMock()) as run_script, \
+            patch('manager.bigquery.run_query', MagicMock()) as run_query, \
+            patch('manager.bigquery.write_dataframe_to_bigquery', MagicMock()) as write_dataframe_to_bigquery:
+        yield {
+            'get_summarised_dataset_ids': get_summarised_dataset_ids,
+            'run_script': run_script,
+            'run_query': run_query,
+            'write_dataframe_to_bigquery': write_dataframe_to_bigquery,
+        }
+
+
+def test_cumulating_results_merges_only_new_datasets(mocks):
+    mocks['get_summarised_dataset_ids'].return_value = set(all_dataset_ids[:2])
+
+    cumulating_results()
+
+    script = mocks['run_script'].call_args.kwargs['script']
+    assert "INSERT INTO `manager.summary_watermark` (Dataset_Id) VALUES ('2020_01_17_Jan_Fri')" in script
+    assert '`2020_01_17_Jan_Fri.results`' in script
+    assert '`2020_01_10_Jan_Fri.results`' not in script
+    mocks['run_query'].assert_not_called()
+
+
+def test_cumulating_results_nothing_new(mocks):
+    mocks['get_summarised_dataset_ids'].return_value = set(all_dataset_ids)
+
+    cumulating_results()
+
+    mocks['run_script'].assert_not_called()
+    mocks['run_query'].assert_not_called()
+
+
+def test_cumulating_results_rebuilds_without_watermark(mocks):
+    mocks['get_summarised_dataset_ids'].return_value = None
+
+    cumulating_results()
+
+    mocks['run_script'].assert_not_called()
+    assert [call.kwargs['destination_table_name'] for call in mocks['run_query'].call_args_list] == [
+        'general_summary', 'player_summary'
+    ]
+    watermark = mocks['write_dataframe_to_bigquery'].call_args.kwargs['data']
+    assert watermark['Dataset_Id'].tolist() == all_dataset_ids
+
+
+def test_cumulating_results_full_rebuild(mocks):
+    mocks['get_summarised_dataset_ids'].return_value = set(all_dataset_ids[:2])
+
+    cumulating_results(full_rebuild=True)
+
+    mocks['get_summarised_dataset_ids'].assert_not_called()
+    mocks['run_script'].assert_not_called()
+    assert mocks['run_query'].call_count == 2
+
+
+def test_cumulating_results_merges_new_datasets_in_batches(mocks):
+    many_dataset_ids = [f'2020_01_03_Jan_Fri_{i}' for i in range(250)]
+    mocks['get_summarised_dataset_ids'].return_value = set()
+
+    with patch('manager.bigquery.get_dataset_ids_with_results', MagicMock(return_value=many_dataset_ids)):
+        cumulating_results()
+
+    scripts = [call.kwargs['script'] for call in mocks['run_script'].call_args_list]
+    assert len(scripts) == 3
+    assert all(script.startswith('BEGIN TRANSACTION;') for script in scripts)
+    assert "('2020_01_03_Jan_Fri_99')" in scripts[0] and "('2020_01_03_Jan_Fri_100')" in scripts[1]
@@ -0,0 +1,139 @@
+import re
+import sqlite3
+from datetime import date, timedelta
+
+import pandas as pd
+from pandas.testing import assert_frame_equal
+from pytest import mark, fixture
+
+from manager.bigquery.queries import (
+    create_batched_summary_queries, create_incremental_summary_script, batch_dataset_ids, SUMMARY_BATCH_SIZE,
+    PLAYER_SUMMARY_STAGING_TABLE_NAME, create_general_summary_query, create_player_summary_query
+)
+from tests.test_bigquery.conftest import dataset_names
+
+MAX_QUERY_LENGTH = 1024 * 1024  # BigQuery's limit on unresolved SQL
+MAX_TABLES_PER_QUERY = 1000
+
+
+def make_dataset_ids(n: int) -> [str]:
+    """ weekly dataset ids, all the same length: YYYY_MM_DD_Mon_Fri """
+    first = date(1900, 1, 5)
+    return [(first + timedelta(weeks=week)).strftime('%Y_%m_%d_%b_%a') for week in range(n)]
+
+
+def referenced_tables(query: str) -> set:
+    return set(re.findall(r'`([^`]+)`', query))
+
+
+def test_batch_dataset_ids():
+    assert batch_dataset_ids(['a', 'b', 'c', 'd', 'e'], batch_size=2) == [['a', 'b'], ['c', 'd'], ['e']]
+    assert batch_dataset_ids([], batch_size=2) == []
+
+
+@mark.parametrize('n_datasets', [10, 1_000, 10_000])
+def test_batched_summary_queries_size_is_bounded(n_datasets):
+    dataset_ids = make_dataset_ids(n_datasets)
+    one_batch_queries = create_batched_summary_queries(make_dataset_ids(SUMMARY_BATCH_SIZE))
+    one_batch_max_length = max(len(query) for query, _, _ in one_batch_queries)
+
+    queries = create_batched_summary_queries(dataset_ids)
+
+    assert max(len(query) for query, _, _ in queries) <= one_batch_max_length < MAX_QUERY_LENGTH
+    assert max(len(referenced_tables(query)) for query, _, _ in queries) <= SUMMARY_BATCH_SIZE < MAX_TABLES_PER_QUERY
+    assert set().union(*(referenced_tables(query) for query, _, _ in queries)) >= {
+        f'{dataset_id}.results' for dataset_id in dataset_ids
+    }
+    n_batches = -(-n_datasets // SUMMARY_BATCH_SIZE)
+    assert len(queries) == 2 * n_batches + (n_batches > 1)
+
+
+def test_batched_summary_queries_single_batch():
+    queries = create_batched_summary_queries(make_dataset_ids(10))
+
+    assert [(table, write_disposition) for _, table, write_disposition in queries] == [
+        ('general_summary', 'WRITE_TRUNCATE'), ('player_summary', 'WRITE_TRUNCATE')
+    ]
+
+
+def test_batched_summary_queries_roll_up_player_summary():
+    queries = create_batched_summary_queries(make_dataset_ids(5), batch_size=2)
+
+    assert [(table, write_disposition) for _, table, write_disposition in queries] == [
+        ('general_summary', 'WRITE_TRUNCATE'), (PLAYER_SUMMARY_STAGING_TABLE_NAME, 'WRITE_TRUNCATE'),
+        ('general_summary', 'WRITE_APPEND'), (PLAYER_SUMMARY_STAGING_TABLE_NAME, 'WRITE_APPEND'),
+        ('general_summary', 'WRITE_APPEND'), (PLAYER_SUMMARY_STAGING_TABLE_NAME, 'WRITE_APPEND'),
+        ('player_summary', 'WRITE_TRUNCATE'),
+    ]
+    assert referenced_tables(queries[-1][0]) == {f'manager.{PLAYER_SUMMARY_STAGING_TABLE_NAME}'}
+    assert 'GROUP BY Name' in queries[-1][0]
+
+
+@mark.parametrize('n_datasets', [10, 1_000, 10_000])
+def test_incremental_summary_scripts_size_is_bounded(n_datasets):
+    one_batch_length = len(create_incremental_summary_script(make_dataset_ids(SUMMARY_BATCH_SIZE)))
+
+    scripts = [create_incremental_summary_script(batch) for batch in batch_dataset_ids(make_dataset_ids(n_datasets))]
+
+    assert max(len(script) for script in scripts) <= one_batch_length < MAX_QUERY_LENGTH
+
+
+class SqliteStandIn:
+    """ runs the BigQuery summary queries on sqlite, to test them locally. Each per draw `results` table is a
+        sqlite table named "<dataset_id>.results", which is what the back-ticked BigQuery table id resolves to.
+        The SQL is translated where the dialects differ:
+            - r"..." / "..." string literals -> '...'
+            - CAST(... AS INT64) -> CAST(... AS REAL): BigQuery's / always returns a FLOAT64, sqlite's does not.
+            - IF -> IIF, STRING_AGG -> GROUP_CONCAT and REGEXP_REPLACE is registered as a python function.
+    """
+    def __init__(self, tables: {str: pd.DataFrame}):
+        self.connection = sqlite3.connect(':memory:')
+        self.connection.create_function('REGEXP_REPLACE', 3, lambda value, pattern, repl: re.sub(pattern, repl, value))
+        self.table_bytes = {}
+        for dataset_id, results in tables.items():
+            results.to_sql(f'{dataset_id}.results', self.connection, index=False)
+            self.table_bytes[f'{dataset_id}.results'] = int(results.astype(str).applymap(len).to_numpy().sum())
+
+    @staticmethod
+    def translate(query: str) -> str:
+        query = re.sub(r'r?"([^"]*)"', r"'\1'", query)
+        query = query.replace('AS INT64)', 'AS REAL)').replace('STRING_AGG(', 'GROUP_CONCAT(')
+        return re.sub(r'\bIF\(', 'IIF(', query)
+
+    def read(self, query: str) -> pd.DataFrame:
+        return pd.read_sql_query(self.translate(query), self.connection)
+
+    def table_scans(self, query: str) -> dict:
+        """ number of full scans of each results table in the query plan. """
+        plan = self.connection.execute('EXPLAIN QUERY PLAN ' + self.translate(query)).fetchall()
+        scans = [detail for *_, detail in plan if detail.startswith('SCAN')]
+        return {table: sum(detail.split()[1] == table for detail in scans) for table in self.table_bytes}
+
+    def scanned_bytes(self, query: str) -> int:
+        """ estimate: bytes of the (string formatted) results tables, once per scan. """
+        return sum(self.table_bytes[table] * scans for table, scans in self.table_scans(query).items())
+
+
+@fixture
+def sqlite_stand_in(results_a, results_b, results_c):
+    return SqliteStandIn({
+        dataset_names['a']: results_a, dataset_names['b']: results_b, dataset_names['c']: results_c,
+        '1234_56_78_test_empty': results_a.iloc[:0],
+    })
+
+
+def test_general_summary_query_on_sqlite(sqlite_stand_in, expected_general_summary_with_abc):
+    query = create_general_summary_query(list(dataset_names.values()) + ['1234_56_78_test_empty'])
+
+    assert_frame_equal(sqlite_stand_in.read(query), expected_general_summary_with_abc, check_dtype=False)
+    assert sqlite_stand_in.table_scans(query) == {table: 1 for table in sqlite_stand_in.table_bytes}
+    assert sqlite_stand_in.scanned_bytes(query) == sum(sqlite_stand_in.table_bytes.values())
+
+
+def test_player_summary_query_on_sqlite(sqlite_stand_in, expected_player_summary_with_abc):
+    query = create_player_summary_query(list(dataset_names.values()) + ['1234_56_78_test_empty'])
+
+    result = sqlite_stand_in.read(query).sort_values('Name').reset_index(drop=True)
+    expected = expected_player_summary_with_abc.sort_values('Name').reset_index(drop=True)
+    assert_frame_equal(result, expected, check_dtype=False)
+    assert sqlite_stand_in.table_scans(query) == {table: 1 for table in sqlite_stand_in.table_bytes}
@@ -1,6 +1,10 @@
 from unittest.mock import MagicMock, patch
 
-from manager.bigquery.read import get_dataset_ids_with_results
+from pytest import fixture, mark
+
+from manager.bigquery.read import get_dataset_ids_with_results, discover_dataset_ids_with_results
+from manager.bigquery.read import clear_dataset_ids_cache, read_selected_numbers
+from manager.bigquery import client as client_module
 
 
 def mock_list_datasets():
@@ -41,3 +45,82 @@ def test_get_dataset_ids_with_results():  # bigquery/read.py
     with patch('google.cloud.bigquery.Client', mock_client) as mock_client:
         results = get_dataset_ids_with_results(mock_client)
         assert results == expected_dataset_ids
+
+
+class FakeClient:
+    """ stands in for bq.Client, counting API calls. """
+    project = 'project'
+
+    def __init__(self):
+        self.api_calls = 0
+
+    def list_datasets(self):
+        self.api_calls += 1
+        return mock_list_datasets()
+
+    def list_tables(self, dataset):
+        self.api_calls += 1
+        return mock_list_tables(dataset)
+
+    def query(self, query):
+        self.api_calls += 1
+        assert '`project`.`region-europe-west2`.INFORMATION_SCHEMA.TABLES' in query
+        rows = [{'Dataset_Id': dataset_id} for dataset_id in ['2020_01_01_valid', '2020_02_02_valid', 'manager']]
+        return MagicMock(result=MagicMock(return_value=rows))
+
+
+@fixture(autouse=True)
+def empty_cache():
+    clear_dataset_ids_cache()
+    yield
+    clear_dataset_ids_cache()
+
+
+@mark.parametrize('region, method, api_calls', [(None, 'list_tables', 4), ('europe-west2', 'information_schema', 1)])
+def test_discover_dataset_ids_with_results(region, method, api_calls):
+    client = FakeClient()
+
+    dataset_ids, report = discover_dataset_ids_with_results(client, region=region)
+
+    assert dataset_ids == ['2020_01_01_valid', '2020_02_02_valid']
+    assert report['method'] == method
+    assert report['api_calls'] == client.api_calls == api_calls
+
+
+def test_get_dataset_ids_with_results_is_cached():
+    client = FakeClient()
+
+    assert get_dataset_ids_with_results(client) == ['2020_01_01_valid', '2020_02_02_valid']
+    assert get_dataset_ids_with_results(client) == ['2020_01_01_valid', '2020_02_02_valid']
+    assert client.api_calls == 4
+
+    clear_dataset_ids_cache()
+    get_dataset_ids_with_results(client)
+    assert client.api_calls == 8
+
+
+def test_get_dataset_ids_with_results_cache_expires():
+    client = FakeClient()
+
+    get_dataset_ids_with_results(client, cache_ttl=0)
+    get_dataset_ids_with_results(client, cache_ttl=0)
+
+    assert client.api_calls == 8
+
+
+def test_get_client_created_once():
+    with patch.object(client_module, '_client', None), \
+            patch('manager.bigquery.client.bq.Client', MagicMock(side_effect=lambda: MagicMock())) as Client:
+        assert client_module.get_client() is client_module.get_client()
+
+    Client.assert_called_once_with()
+
+
+def test_read_selected_numbers_uses_shared_client():
+    client = MagicMock(project='project')
+    client.query.return_value.to_dataframe.return_value = 'selected'
+
+    with patch('manager.bigquery.read.get_client', MagicMock(return_value=client)):
+        assert read_selected_numbers() == 'selected'
+
+    client.query.assert_called_once_with('\n    SELECT *\n    FROM `project.manager.selected_numbers`')
@@ -0,0 +1,181 @@
+import threading
+from datetime import date
+from time import perf_counter, sleep
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+import pytest
+from google.cloud import bigquery as bq
+
+from manager.bigquery import establish_results_in_bigquery, CONSOLIDATED_LAYOUT
+from manager.bigquery.write import write_dataframe_to_bigquery, write_dataframes_to_bigquery, dictionary_to_dataframe
+from manager.bigquery.write import write_dataframe_chunks_to_bigquery
+
+
+def test_dictionary_to_dataframe():
+    data = dictionary_to_dataframe({'DrawNumber': 1381, 'Ball 1': 9}, col_names=['Draw', 'Outcome'])
+
+    pd.testing.assert_frame_equal(data, pd.DataFrame({'Draw': ['DrawNumber', 'Ball 1'], 'Outcome': ['1381', '9']}))
+
+
+def test_write_dataframe_to_bigquery_to_partition():
+    client = MagicMock(project='project')
+    data = pd.DataFrame({'Draw_Date': [date(2020, 12, 11)], 'Name': ['Kobe'], 'Balls_Matched': [2]})
+
+    write_dataframe_to_bigquery(
+        client, data=data, table_name='all_results', dataset_name='manager',
+        schema=[bq.SchemaField('Draw_Date', 'DATE')], partition='20201211',
+        time_partitioning=bq.TimePartitioning(field='Draw_Date'), clustering_fields=['Name']
+    )
+
+    (_, destination), kwargs = client.load_table_from_dataframe.call_args
+    job_config = kwargs['job_config']
+    assert destination == 'project.manager.all_results$20201211'
+    assert {field.name: field.field_type for field in job_config.schema} == {'Name': 'STRING', 'Draw_Date': 'DATE'}
+    assert job_config.time_partitioning.field == 'Draw_Date'
+    assert job_config.clustering_fields == ['Name']
+    client.get_table.assert_called_once_with('project.manager.all_results')
+
+
+def test_write_dataframe_chunks_to_bigquery():
+    client = MagicMock(project='project')
+    client.load_table_from_dataframe.return_value.output_rows = 2
+    chunks = (pd.DataFrame({'Name': [f'{i}a', f'{i}b']}) for i in range(3))
+
+    assert write_dataframe_chunks_to_bigquery(client, chunks, 'results', 'dataset') == 6
+
+    calls = client.load_table_from_dataframe.call_args_list
+    assert [call.args[0]['Name'].tolist() for call in calls] == [['0a', '0b'], ['1a', '1b'], ['2a', '2b']]
+    assert {call.args[1] for call in calls} == {'project.dataset.results_staging'}
+    assert [call.kwargs['job_config'].write_disposition for call in calls] == [
+        'WRITE_TRUNCATE', 'WRITE_APPEND', 'WRITE_APPEND'
+    ]
+    (source, destination), kwargs = client.copy_table.call_args
+    assert (source, destination) == ('project.dataset.results_staging', 'project.dataset.results')
+    assert kwargs['job_config'].write_disposition == 'WRITE_TRUNCATE'
+    client.delete_table.assert_called_once_with('project.dataset.results_staging', not_found_ok=True)
+    client.get_table.assert_not_called()
+
+
+def test_write_dataframe_chunks_to_bigquery_no_chunks():
+    client = MagicMock(project='project')
+
+    with pytest.raises(ValueError, match='No chunks to write to project.dataset.results'):
+        write_dataframe_chunks_to_bigquery(client, iter([]), 'results', 'dataset')
+
+    client.copy_table.assert_not_called()
+
+
+def test_write_dataframe_chunks_to_bigquery_failure_leaves_table():
+    client = MagicMock(project='project')
+    client.load_table_from_dataframe.return_value.output_rows = 2
+
+    def chunks():
+        yield pd.DataFrame({'Name': ['a', 'b']})
+        raise RuntimeError('source failed')
+
+    with pytest.raises(RuntimeError, match='source failed'):
+        write_dataframe_chunks_to_bigquery(client, chunks(), 'results', 'dataset')
+
+    client.copy_table.assert_not_called()
+    client.delete_table.assert_called_once_with('project.dataset.results_staging', not_found_ok=True)
+
+
+def test_establish_results_in_bigquery_consolidated_layout():
+    client = MagicMock(project='project')
+    results = pd.DataFrame({'Name': ['Kobe'], 'Number_1': [1], 'Match_Type': ['Match 0'], 'Prize': ['£0.00']})
+
+    with patch('manager.bigquery.get_client', MagicMock(return_value=client)):
+        establish_results_in_bigquery('2020_12_11_Dec_Fri', results, draw_result={'DrawNumber': 1380},
+                                      prize_breakdown={'Match 2': '£2.50'}, layout=CONSOLIDATED_LAYOUT)
+
+    client.create_dataset.assert_not_called()
+    written = {call.args[1]: call.args[0] for call in client.load_table_from_dataframe.call_args_list}
+    assert list(written) == [
+        'project.manager.all_results$20201211',
+        'project.manager.all_draw_outcomes$20201211',
+        'project.manager.all_prize_breakdowns$20201211',
+    ]
+    pd.testing.assert_frame_equal(written['project.manager.all_results$20201211'], pd.DataFrame({
+        'Play_Date': ['2020_12_11_Dec_Fri'], 'Draw_Date': [date(2020, 12, 11)],
+        'Name': ['Kobe'], 'Number_1': [1], 'Match_Type': ['Match 0'], 'Prize_Pence': [0]
+    }))
+    pd.testing.assert_frame_equal(written['project.manager.all_prize_breakdowns$20201211'], pd.DataFrame({
+        'Play_Date': ['2020_12_11_Dec_Fri'], 'Draw_Date': [date(2020, 12, 11)],
+        'Match_Type': ['Match 2'], 'Prize_Per_UK_Winner_Pence': [250]
+    }))
+    job_configs = [call.kwargs['job_config'] for call in client.load_table_from_dataframe.call_args_list]
+    assert all(job_config.source_format == bq.SourceFormat.PARQUET for job_config in job_configs)
+    assert {field.name: field.field_type for field in job_configs[0].schema} == {
+        'Play_Date': 'STRING', 'Name': 'STRING', 'Match_Type': 'STRING',
+        'Draw_Date': 'DATE', 'Number_1': 'INTEGER', 'Prize_Pence': 'INTEGER'
+    }
+
+
+def test_establish_results_in_bigquery_consolidated_prizes_not_an_amount():
+    client = MagicMock(project='project')
+    results = pd.DataFrame({'Name': ['Kobe', 'Lebron'], 'Match_Type': ['Match 2', 'Match 0'], 'Prize': ['', '£0.00']})
+
+    with patch('manager.bigquery.get_client', MagicMock(return_value=client)):
+        establish_results_in_bigquery('2020_12_11_Dec_Fri', results, draw_result={'DrawNumber': 1380},
+                                      prize_breakdown={'Match 2': 'Rollover'}, layout=CONSOLIDATED_LAYOUT)
+
+    written = {call.args[1]: call.args[0] for call in client.load_table_from_dataframe.call_args_list}
+    assert written['project.manager.all_results$20201211']['Prize_Pence'].tolist() == [0, 0]
+    assert written['project.manager.all_prize_breakdowns$20201211']['Prize_Per_UK_Winner_Pence'].tolist() == [0]
+
+
+class SlowLoadClient:
+    """ stands in for bq.Client, every load job takes job_seconds to complete. """
+    project = 'project'
+
+    def __init__(self, job_seconds: float):
+        self.job_seconds = job_seconds
+        self.get_table = MagicMock(return_value=MagicMock(num_rows=3, schema=['a', 'b']))
+        self.running, self.max_running = 0, 0
+        self._lock = threading.Lock()
+
+    def load_table_from_dataframe(self, data, destination, job_config):
+        def result():
+            with self._lock:
+                self.running += 1
+                self.max_running = max(self.max_running, self.running)
+            sleep(self.job_seconds)
+            with self._lock:
+                self.running -= 1
+
+        return MagicMock(result=result, output_rows=len(data))
+
+
+tables = {
+    'results': pd.DataFrame({'Name': ['Kobe', 'Lebron']}),
+    'draw_outcome': pd.DataFrame({'Draw': ['DrawNumber'], 'Outcome': ['1380']}),
+    'prize_breakdown': pd.DataFrame({'Match_Type': ['Match 2'], 'Prize_Per_UK_Winner': ['£2.50']}),
+}
+
+
+def test_write_dataframes_to_bigquery_concurrently():
+    client = SlowLoadClient(job_seconds=0.2)
+
+    start = perf_counter()
+    report = write_dataframes_to_bigquery(client, tables, dataset_name='2020_12_11_Dec_Fri', confirm=False)
+
+    assert client.max_running == 3
+    assert perf_counter() - start < 0.5
+    client.get_table.assert_not_called()
+    assert list(report['jobs']) == list(tables)
+    assert report['jobs']['results'] == {
+        'table_id': 'project.2020_12_11_Dec_Fri.results', 'rows': 2, 'columns': None,
+        'seconds': report['jobs']['results']['seconds']
+    }
+    assert all(job['seconds'] >= 0.2 for job in report['jobs'].values())
+
+
+def test_write_dataframes_to_bigquery_one_after_another():
+    client = SlowLoadClient(job_seconds=0.01)
+
+    report = write_dataframes_to_bigquery(client, tables, dataset_name='2020_12_11_Dec_Fri', concurrent=False)
+
+    assert client.max_running == 1
+    assert client.get_table.call_count == 3
+    assert [job['columns'] for job in report['jobs'].values()] == [2, 2, 2]
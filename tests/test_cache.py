@@ -0,0 +1,125 @@
+import json
+from unittest.mock import patch
+
+import pandas as pd
+from pytest import fixture
+
+from manager.cache import fetch_csv_with_cache, PrizeBreakdownStore
+
+CSV_URL = 'https://example.com/draw-history/csv'
+MOVED_CSV_URL = 'https://example.com/draw-history/csv-v2'
+CSV_CONTENT = b'DrawDate,Ball 1,DrawNumber\n15-Dec-2020,1,1381\n11-Dec-2020,2,1380\n'
+
+
+class MockResponse:
+    def __init__(self, status_code, content=b'', headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f'{self.status_code} Error')
+
+
+class MockServer:
+    """ serves CSV_CONTENT on url, honouring If-None-Match and logging every request. """
+    def __init__(self, url=CSV_URL, etag='"v1"'):
+        self.url = url
+        self.etag = etag
+        self.requests = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.requests.append((url, headers or {}))
+        if url != self.url:
+            return MockResponse(404)
+        if (headers or {}).get('If-None-Match') == self.etag:
+            return MockResponse(304)
+        return MockResponse(200, CSV_CONTENT, {'ETag': self.etag, 'Last-Modified': 'Tue, 15 Dec 2020 21:00:00 GMT'})
+
+
+@fixture
+def server():
+    server = MockServer()
+    with patch('requests.get', server.get):
+        yield server
+
+
+def test_fetch_csv_with_cache_miss_then_hit(tmp_path, server):
+    first, first_report = fetch_csv_with_cache(lambda: CSV_URL, cache_dir=str(tmp_path), name='draw_history')
+    second, second_report = fetch_csv_with_cache(lambda: CSV_URL, cache_dir=str(tmp_path), name='draw_history')
+
+    assert (tmp_path / 'draw_history.parquet').exists()
+    assert first_report['cache'] == 'miss'
+    assert first_report['bytes_transferred'] == len(CSV_CONTENT)
+    assert second_report['cache'] == 'hit'
+    assert second_report['bytes_transferred'] == 0
+    assert server.requests[1][1] == {
+        'If-None-Match': '"v1"', 'If-Modified-Since': 'Tue, 15 Dec 2020 21:00:00 GMT'
+    }
+    pd.testing.assert_frame_equal(first, second)
+    pd.testing.assert_frame_equal(first, pd.DataFrame({
+        'DrawDate': ['15-Dec-2020', '11-Dec-2020'], 'Ball 1': [1, 2], 'DrawNumber': [1381, 1380]
+    }))
+
+
+def test_fetch_csv_with_cache_downloads_when_changed(tmp_path, server):
+    fetch_csv_with_cache(lambda: CSV_URL, cache_dir=str(tmp_path), name='draw_history')
+    server.etag = '"v2"'
+
+    _, report = fetch_csv_with_cache(lambda: CSV_URL, cache_dir=str(tmp_path), name='draw_history')
+
+    assert report['cache'] == 'miss'
+    assert json.loads((tmp_path / 'draw_history.json').read_text())['etag'] == '"v2"'
+
+
+def test_fetch_csv_with_cache_uses_cached_url(tmp_path, server):
+    fetch_csv_with_cache(lambda: CSV_URL, cache_dir=str(tmp_path), name='draw_history')
+
+    def find_url():
+        raise AssertionError('url should come from the cache')
+
+    _, report = fetch_csv_with_cache(find_url, cache_dir=str(tmp_path), name='draw_history')
+
+    assert report['cache'] == 'hit'
+
+
+def test_fetch_csv_with_cache_finds_url_again_when_moved(tmp_path, server):
+    fetch_csv_with_cache(lambda: CSV_URL, cache_dir=str(tmp_path), name='draw_history')
+    server.url = MOVED_CSV_URL
+
+    data, report = fetch_csv_with_cache(lambda: MOVED_CSV_URL, cache_dir=str(tmp_path), name='draw_history')
+
+    assert report == {**report, 'cache': 'miss', 'url': MOVED_CSV_URL}
+    assert [url for url, _ in server.requests] == [CSV_URL, CSV_URL, MOVED_CSV_URL]
+    assert len(data) == 2
+
+
+@fixture
+def prize_breakdown():
+    return {'Match 5 + 2 Stars': '£0.00', 'Match 5 + 1 Star': '£51,956.30', 'Match 5': '£7,727.40'}
+
+
+def test_prize_breakdown_store_unknown_draw(tmp_path):
+    store = PrizeBreakdownStore(str(tmp_path))
+
+    assert store.get(1381) is None
+
+
+def test_prize_breakdown_store_persists(tmp_path, prize_breakdown):
+    PrizeBreakdownStore(str(tmp_path)).put(1381, prize_breakdown)
+
+    assert PrizeBreakdownStore(str(tmp_path)).get(1381) == prize_breakdown
+    assert [path.name for path in tmp_path.iterdir()] == ['prize_breakdown_1381.json']
+
+
+def test_prize_breakdown_store_evicts_least_recently_used(tmp_path, prize_breakdown):
+    store = PrizeBreakdownStore(str(tmp_path), maxsize=2)
+    for draw_number in [1379, 1380, 1381]:
+        store.put(draw_number, {**prize_breakdown, 'DrawNumber': str(draw_number)})
+    store.get(1380)
+    store.put(1382, prize_breakdown)
+
+    assert list(store._memory) == [1380, 1382]
+    # evicted draws are still read from disk
+    assert store.get(1379)['DrawNumber'] == '1379'
@@ -1,7 +1,14 @@
+import io
+from itertools import count, islice
+
+import numpy as np
 import pytest
 import pandas as pd
 
-from manager.check_matches import collect_winning_numbers, match_type_label, check_matches_on_selected
+from manager.check_matches import (
+    collect_winning_numbers, match_type_label, match_type_lookup, check_matches_on_selected, check_matches_many_draws,
+    prize_pence_table, check_matches_in_chunks, rows_to_chunks
+)
 
 
 def test_collect_numbers():
@@ -55,3 +62,160 @@ def test_check_matches_on_selected():
         left=check_matches_on_selected(selected, winning, prize_breakdown),
         right=expected_result
     )
+
+
+def test_check_matches_on_selected_keeps_prize_strings():
+    selected = pd.DataFrame({
+        'Name': ['Peter', 'Crouch', 'Special', 'One'],
+        'Number_1': [1, 6, 7, 99], 'Number_2': [7, 5, 9, 1], 'Number_3': [9, 10, 1, 99],
+        'Lucky_Star_1': [1, 2, 99, 3], 'Lucky_Star_2': [3, 4, 99, 1]
+    })
+    winning = {'Balls': [1, 7, 9], 'Lucky Stars': [1, 3]}
+    prize_breakdown = {'Match 3 + 2 Stars': '£5', 'Match 0': '£-0.00', 'Match 3': ''}
+
+    results = check_matches_on_selected(selected, winning, prize_breakdown)
+
+    # as scraped, as the baseline's map: no round trip through pence
+    assert results['Prize'].tolist() == ['£5', '£-0.00', '', '£0.00']
+
+    lookup = match_type_lookup(max_balls=5, max_stars=2)
+
+    assert lookup.shape == (6, 3)
+    assert lookup[0, 0] == 'Match 0'
+    assert lookup[0, 2] == 'Match 0'
+    assert lookup[3, 0] == 'Match 3'
+    assert lookup[2, 1] == 'Match 2 + 1 Star'
+    assert lookup[5, 2] == 'Match 5 + 2 Stars'
+
+
+def test_prize_pence_table():
+    prize_breakdown = {'Match 5 + 2 Stars': '£50,129,756.00', 'Match 2 + 1 Star': '£4.10', 'Match 2': '£2.50'}
+
+    table = prize_pence_table(match_type_lookup(max_balls=5, max_stars=2), prize_breakdown)
+
+    assert table.dtype == np.int64 and table.shape == (6, 3)
+    assert table[5, 2] == 5_012_975_600
+    assert table[2].tolist() == [250, 410, 0]
+    assert table.sum() == 5_012_975_600 + 410 + 250
+
+
+def test_check_matches_on_selected_same_as_row_wise():
+    rng = np.random.default_rng(1381)
+    selected = pd.DataFrame(rng.integers(1, 13, size=(500, 7)), columns=[
+        'Number_1', 'Number_2', 'Number_3', 'Number_4', 'Number_5', 'Lucky_Star_1', 'Lucky_Star_2'
+    ])
+    selected.insert(0, 'Name', [f'Player {i}' for i in range(len(selected))])
+    winning = {'Balls': [1, 3, 5, 7, 11], 'Lucky Stars': [2, 12]}
+    prize_breakdown = {'Match 2': '£2.20', 'Match 3 + 1 Star': '£6.00', 'Match 1 + 2 Stars': '£4.90'}
+
+    expected = selected.copy()
+    number_cols = [col for col in expected.columns if col.startswith('Number')]
+    star_cols = [col for col in expected.columns if col.startswith('Lucky_Star')]
+    expected['Balls_Matched'] = expected.loc[:, number_cols].isin(winning['Balls']).sum(axis=1)
+    expected['Stars_Matched'] = expected.loc[:, star_cols].isin(winning['Lucky Stars']).sum(axis=1)
+    expected['Match_Type'] = expected[['Balls_Matched', 'Stars_Matched']].apply(match_type_label, axis=1)
+    expected['Prize'] = expected['Match_Type'].map(prize_breakdown).fillna('£0.00')
+
+    pd.testing.assert_frame_equal(check_matches_on_selected(selected, winning, prize_breakdown), expected)
+
+
+@pytest.fixture
+def hist_results():
+    return pd.DataFrame({
+        'DrawDate': ['15-Dec-2020', '11-Dec-2020', '08-Dec-2020'],
+        'Ball 1': [1, 2, 9], 'Ball 2': [7, 4, 10], 'Ball 3': [9, 6, 20], 'Ball 4': [20, 8, 30], 'Ball 5': [30, 10, 40],
+        'Lucky Star 1': [1, 2, 3], 'Lucky Star 2': [3, 4, 5],
+        'UK Millionaire Maker': ['alpha', 'beta', 'gamma'],
+        'DrawNumber': [1383, 1382, 1381]
+    })
+
+
+@pytest.mark.parametrize('max_cells', [1, 5, 10_000])
+def test_check_matches_many_draws_same_as_per_draw(hist_results, max_cells):
+    selected = pd.DataFrame({
+        'Name': ['Peter', 'Crouch', 'Special', 'One'],
+        'Number_1': [1, 6, 7, 99], 'Number_2': [7, 5, 9, 1], 'Number_3': [9, 10, 1, 99],
+        'Lucky_Star_1': [1, 2, 99, 3], 'Lucky_Star_2': [3, 4, 99, 1]
+    })
+    breakdowns = {
+        1383: {'Match 3 + 2 Stars': '£40.10', 'Match 1 + 2 Stars': '£4.90', 'Match 3': '£4.80'},
+        1382: {'Match 2 + 2 Stars': '£9.90', 'Match 2': '£2.20'},
+    }
+    original = selected.copy()
+
+    results = check_matches_many_draws(selected, hist_results, breakdowns, max_cells=max_cells)
+
+    pd.testing.assert_frame_equal(selected, original)
+    assert len(results) == len(selected) * len(hist_results)
+    for draw in hist_results.to_dict('records'):
+        draw_results = results[results['DrawNumber'] == draw['DrawNumber']]
+        expected = check_matches_on_selected(
+            selected.copy(), collect_winning_numbers(draw), breakdowns.get(draw['DrawNumber'], {})
+        )
+        expected.insert(0, 'DrawNumber', draw['DrawNumber'])
+        expected.insert(1, 'DrawDate', draw['DrawDate'])
+        pd.testing.assert_frame_equal(draw_results.reset_index(drop=True), expected)
+
+
+def test_check_matches_many_draws_no_draws(hist_results):
+    selected = pd.DataFrame({'Name': ['Peter'], 'Number_1': [1], 'Lucky_Star_1': [1]})
+
+    results = check_matches_many_draws(selected, hist_results.iloc[:0], breakdowns={})
+
+    assert results.empty
+    assert list(results.columns) == [
+        'DrawNumber', 'DrawDate', 'Name', 'Number_1', 'Lucky_Star_1',
+        'Balls_Matched', 'Stars_Matched', 'Match_Type', 'Prize'
+    ]
+
+
+@pytest.fixture
+def streaming_prize_breakdown():
+    return {'Match 2': '£2.50', 'Match 1 + 2 Stars': '£4.90', 'Match 3': '£5.90'}
+
+
+def test_check_matches_in_chunks_same_as_check_matches_on_selected(
+        random_tickets, winning_numbers, streaming_prize_breakdown):
+    tickets = random_tickets(1_000)
+    chunks = pd.read_csv(io.StringIO(tickets.to_csv(index=False)), chunksize=300)
+
+    results = list(check_matches_in_chunks(chunks, winning_numbers, streaming_prize_breakdown))
+
+    assert [len(result) for result in results] == [300, 300, 300, 100]
+    pd.testing.assert_frame_equal(
+        pd.concat(results),
+        check_matches_on_selected(tickets.copy(), winning_numbers, streaming_prize_breakdown)
+    )
+
+
+def test_check_matches_in_chunks_does_not_modify_chunks(random_tickets, winning_numbers, streaming_prize_breakdown):
+    chunks = [random_tickets(10, seed) for seed in range(2)]
+    originals = [chunk.copy() for chunk in chunks]
+
+    list(check_matches_in_chunks(chunks, winning_numbers, streaming_prize_breakdown))
+
+    for chunk, original in zip(chunks, originals):
+        pd.testing.assert_frame_equal(chunk, original)
+
+
+def test_check_matches_in_chunks_is_lazy(random_tickets, winning_numbers, streaming_prize_breakdown):
+    """ an endless stream of tickets: only the chunks asked for are read and checked. """
+    read = []
+
+    def endless_chunks():
+        for seed in count():
+            read.append(seed)
+            yield random_tickets(5, seed)
+
+    first_two = list(islice(check_matches_in_chunks(endless_chunks(), winning_numbers, streaming_prize_breakdown), 2))
+
+    assert len(first_two) == 2 and read == [0, 1]
+
+
+def test_rows_to_chunks(random_tickets):
+    rows = iter(random_tickets(25).to_dict('records'))
+
+    chunks = list(rows_to_chunks(rows, chunksize=10))
+
+    assert [len(chunk) for chunk in chunks] == [10, 10, 5]
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), random_tickets(25))
@@ -0,0 +1,57 @@
+from multiprocessing import shared_memory
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from manager.parallel import match_codes_parallel, check_matches_parallel
+from manager.ticket_table import TicketTable
+
+
+@pytest.fixture
+def prize_breakdown():
+    return {'Match 5 + 2 Stars': '£50,129,756.00', 'Match 2 + 1 Star': '£4.10', 'Match 2': '£2.50',
+            'Match 1 + 2 Stars': '£4.90'}
+
+
+@pytest.mark.parametrize('max_workers', [1, 2, 3])
+def test_check_matches_parallel_same_as_check_matches(max_workers, random_tickets, winning_numbers, prize_breakdown):
+    tickets = TicketTable.from_dataframe(random_tickets(1_001))
+
+    expected = tickets.check_matches(winning_numbers, prize_breakdown)
+    results = check_matches_parallel(tickets, winning_numbers, prize_breakdown, max_workers=max_workers)
+
+    assert results.match_codes.tolist() == expected.match_codes.tolist()
+    assert results.prizes_pence.tolist() == expected.prizes_pence.tolist()
+
+
+def test_match_codes_parallel_many_draws(random_tickets, prize_breakdown):
+    tickets = TicketTable.from_dataframe(random_tickets(500))
+    draws = TicketTable.from_dataframe(random_tickets(20, seed=1)).numbers
+
+    codes = match_codes_parallel(tickets.numbers, draws, max_workers=2, shard_size=37)
+
+    assert codes.shape == (20, 500)
+    for draw, draw_codes in zip(draws, codes):
+        winning = {'Balls': draw[:5].tolist(), 'Lucky Stars': draw[5:].tolist()}
+        assert draw_codes.tolist() == tickets.check_matches(winning, prize_breakdown).match_codes.tolist()
+
+
+def test_match_codes_parallel_releases_shared_memory():
+    numbers = np.array([[9, 13, 21, 29, 35, 1, 2], [2, 40, 24, 7, 50, 8, 1]], dtype=np.uint8)
+    created = []
+    original = shared_memory.SharedMemory
+
+    def record(*args, **kwargs):
+        memory = original(*args, **kwargs)
+        if kwargs.get('create'):
+            created.append(memory.name)
+        return memory
+
+    with patch('manager.parallel.shared_memory.SharedMemory', record):
+        match_codes_parallel(numbers, numbers[:1], max_workers=1)
+
+    assert len(created) == 2
+    for name in created:
+        with pytest.raises(FileNotFoundError):
+            original(name=name)
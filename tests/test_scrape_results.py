@@ -1,9 +1,17 @@
-from unittest.mock import patch
+import threading
 from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import perf_counter
+from unittest.mock import MagicMock, patch
 
+import pandas as pd
 from pytest import fixture, raises
 
-from manager.scrape_results import scrape_historical_results, extract_draw_result, scrape_prize_breakdown, BASE_URL
+from manager.cache import PrizeBreakdownStore
+from manager.scrape_results import (
+    scrape_historical_results, extract_draw_result, extract_draw_results, scrape_prize_breakdown,
+    scrape_prize_breakdowns, parse_prize_breakdown, DrawHistory, BASE_URL, STREAMING_PARSER
+)
 
 
 def read_html(file_name):
@@ -74,6 +82,118 @@ def test_scrape_prize_breakdown():
     assert breakdown == expected_breakdown
 
 
+@patch('requests.get', mock_request_get)
+def test_scrape_prize_breakdown_streaming_parser():
+    breakdown = scrape_prize_breakdown(draw_number=1381, parser=STREAMING_PARSER)
+
+    assert breakdown == scrape_prize_breakdown(draw_number=1381)
+
+
+def test_parse_prize_breakdown_streaming_parser_from_bytes():
+    page = read_html('prize_breakdown').encode('utf-8')
+
+    assert parse_prize_breakdown(page, parser=STREAMING_PARSER) == parse_prize_breakdown(page)
+
+
+def test_parse_prize_breakdown_streaming_parser_stops_after_table():
+    page = read_html('prize_breakdown')
+    table_end = page.index('</table>') + len('</table>')
+    second_table = '<table summary="Table displaying prize breakdown"><tr><td data-th="No. of matches">Match 9</td>' \
+                   '<td data-th="Prize per UK winner">£1</td></tr></table>'
+
+    breakdown = parse_prize_breakdown(page[:table_end] + second_table + page[table_end:], parser=STREAMING_PARSER)
+
+    assert breakdown == {'Match 5 + 2 Stars': "£0.00", 'Match 5 + 1 Star': "£51,956.30", 'Match 5': "£7,727.40"}
+
+
+def test_scrape_prize_breakdown_with_store(tmp_path):
+    store = PrizeBreakdownStore(str(tmp_path))
+    with patch('requests.get', MagicMock(side_effect=mock_request_get)) as mock_get:
+        breakdown = scrape_prize_breakdown(draw_number=1381, store=store)
+        breakdown_again = scrape_prize_breakdown(draw_number=1381, store=store)
+        breakdown_new_process = scrape_prize_breakdown(draw_number=1381, store=PrizeBreakdownStore(str(tmp_path)))
+
+    assert mock_get.call_count == 1
+    assert breakdown == breakdown_again == breakdown_new_process
+    assert breakdown['Match 5'] == "£7,727.40"
+
+
+@patch('requests.get', mock_request_get)
+def test_scrape_prize_breakdown_with_store_skips_empty_breakdown(tmp_path):
+    store = PrizeBreakdownStore(str(tmp_path))
+
+    assert scrape_prize_breakdown(draw_number=1999, store=store) == {}
+    assert store.get(1999) is None
+
+
+@fixture
+def breakdown_server():
+    """ local stand-in for the lottery website, serving the prize breakdown fixture for every draw.
+        Draw numbers in `server.fail_first` get a 503 on their first request.
+    """
+    page = read_html('prize_breakdown').encode('utf-8')
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            draw_number = int(self.path.rsplit('/', maxsplit=1)[-1])
+            with server.lock:
+                server.requests.append(draw_number)
+                fail = draw_number in server.fail_first and server.requests.count(draw_number) == 1
+            status, body = (503, b'busy') if fail else (200, page)
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.fail_first = set()
+    server.base_url = f'http://127.0.0.1:{server.server_address[1]}'
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+def test_scrape_prize_breakdowns(breakdown_server):
+    breakdown_server.fail_first = {1380}
+
+    breakdowns = scrape_prize_breakdowns(
+        [1379, 1380, 1381, 1380], base_url=breakdown_server.base_url, max_workers=3, backoff_factor=0.01
+    )
+
+    expected_breakdown = {'Match 5 + 2 Stars': "£0.00", 'Match 5 + 1 Star': "£51,956.30", 'Match 5': "£7,727.40"}
+    assert breakdowns == {1379: expected_breakdown, 1380: expected_breakdown, 1381: expected_breakdown}
+    assert sorted(breakdown_server.requests) == [1379, 1380, 1380, 1381]
+
+
+def test_scrape_prize_breakdowns_with_store(tmp_path, breakdown_server):
+    store = PrizeBreakdownStore(str(tmp_path))
+    scrape_prize_breakdowns([1380, 1381], store=store, base_url=breakdown_server.base_url)
+
+    breakdowns = scrape_prize_breakdowns([1379, 1380, 1381], store=store, base_url=breakdown_server.base_url)
+
+    assert list(breakdowns) == [1379, 1380, 1381]
+    assert sorted(breakdown_server.requests) == [1379, 1380, 1381]
+
+
+def test_scrape_prize_breakdowns_rate_limited(breakdown_server):
+    start = perf_counter()
+    scrape_prize_breakdowns(range(1376, 1382), base_url=breakdown_server.base_url, requests_per_second=50)
+
+    # 6 requests, at least 1/50s apart
+    assert perf_counter() - start >= 5 / 50
+
+
 @fixture
 def hist_data():
     import pandas as pd
@@ -111,3 +231,62 @@ def test_extract_draw_result_valid_date(hist_data):
     draw_result = extract_draw_result(draw_date, hist_data)
 
     assert draw_result == expected_result
+
+
+def mock_request_get_with_csv(url, headers=None, timeout=None):
+    class MockResponse:
+        status_code = 200
+        headers = {'ETag': '"v1"'}
+        content = b'DrawDate,Ball 1,DrawNumber\n15-Dec-2020,1,1381\n'
+
+        def raise_for_status(self):
+            pass
+
+    if url == BASE_URL + '/results/euromillions/draw-history/csv':
+        return MockResponse()
+    return mock_request_get(url)
+
+
+@patch('requests.get', mock_request_get_with_csv)
+def test_scrape_historical_results_with_cache(tmp_path):
+
+    historical_results = scrape_historical_results(cache_dir=str(tmp_path))
+
+    assert historical_results.to_dict('records') == [{'DrawDate': '15-Dec-2020', 'Ball 1': 1, 'DrawNumber': 1381}]
+    assert (tmp_path / 'draw_history.parquet').exists()
+
+
+def test_extract_draw_result_does_not_modify_hist_results(hist_data):
+    original = hist_data.copy()
+
+    extract_draw_result(date(2020, 12, 15), hist_data)
+
+    pd.testing.assert_frame_equal(hist_data, original)
+
+
+def test_extract_draw_results(hist_data):
+    hist_data = hist_data.drop(index=2)
+
+    draw_results = extract_draw_results([date(2020, 12, 11), date(2020, 12, 15)], hist_data)
+
+    assert [draw_result['DrawNumber'] for draw_result in draw_results] == [2012, 1966]
+    assert draw_results[0]['DrawDate'] == '2020-12-11-Fri'
+
+
+def test_draw_history_by_draw_number(hist_data):
+    draw_history = DrawHistory(hist_data)
+
+    assert len(draw_history) == 3
+    assert draw_history.by_draw_number(1966) == extract_draw_result(date(2020, 12, 15), draw_history)
+    with raises(Exception, match=r'Selected draw_number: "2012" maps to many .*'):
+        draw_history.by_draw_number(2012)
+    with raises(Exception, match=r'Selected draw_number: "1" not in .*'):
+        draw_history.by_draw_number(1)
+
+
+def test_draw_history_returns_copies(hist_data):
+    draw_history = DrawHistory(hist_data)
+
+    draw_history.by_draw_number(1966)['Ball 1'] = 99
+
+    assert draw_history.by_draw_number(1966)['Ball 1'] == 1
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from manager.ticket_masks import (
+    pack_numbers, popcount, tickets_to_masks, read_ticket_masks, draw_masks, count_matches
+)
+
+
+@pytest.fixture
+def selected():
+    return pd.DataFrame({
+        'Name': ['Bobby', 'Jose', 'Ole'],
+        'Number_1': [2, 28, 43], 'Number_2': [40, 31, 41], 'Number_3': [35, 24, 49],
+        'Number_4': [26, 19, 7], 'Number_5': [37, 8, 50],
+        'Lucky_Star_1': [11, 12, 4], 'Lucky_Star_2': [8, 10, 1]
+    })
+
+
+@pytest.fixture
+def winning():
+    return {'Balls': [2, 40, 24, 7, 50], 'Lucky Stars': [8, 1]}
+
+
+def test_pack_numbers():
+    masks = pack_numbers([[1, 3], [50, 1]], start=1, end=50)
+
+    assert masks.dtype == np.uint64
+    assert masks.tolist() == [0b1010, (1 << 50) | 0b10]
+
+
+def test_pack_numbers_raise_value_error():
+    with pytest.raises(ValueError, match=r'Numbers must be between \[1, 12] inclusive.*'):
+        pack_numbers([[1, 13]], start=1, end=12, dtype=np.uint16)
+
+
+def test_popcount():
+    masks = np.array([0, 1, 0b1011, 2 ** 64 - 1, (1 << 50) | (1 << 1)], dtype=np.uint64)
+
+    assert popcount(masks).tolist() == [0, 1, 3, 64, 2]
+
+
+def test_draw_masks(winning):
+    ball_mask, star_mask = draw_masks(winning)
+
+    assert ball_mask == sum(1 << n for n in winning['Balls'])
+    assert star_mask == (1 << 8) | (1 << 1)
+    assert star_mask.dtype == np.uint16
+
+
+def test_count_matches_same_as_isin(selected, winning):
+    balls_matched, stars_matched = count_matches(tickets_to_masks(selected), winning)
+
+    number_cols = [col for col in selected.columns if col.startswith('Number_')]
+    star_cols = [col for col in selected.columns if col.startswith('Lucky_Star_')]
+    assert balls_matched.tolist() == selected[number_cols].isin(winning['Balls']).sum(axis=1).tolist()
+    assert stars_matched.tolist() == selected[star_cols].isin(winning['Lucky Stars']).sum(axis=1).tolist()
+    assert balls_matched.tolist() == [2, 1, 2]
+
+
+def test_read_ticket_masks(tmp_path, selected):
+    path = tmp_path / 'selected_numbers.csv'
+    selected.to_csv(path, index=False)
+
+    tickets = read_ticket_masks(str(path), chunksize=2)
+    expected = tickets_to_masks(selected)
+
+    assert tickets.names.tolist() == ['Bobby', 'Jose', 'Ole']
+    np.testing.assert_array_equal(tickets.balls, expected.balls)
+    np.testing.assert_array_equal(tickets.stars, expected.stars)
+    assert tickets.stars.dtype == np.uint16
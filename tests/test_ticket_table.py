@@ -0,0 +1,81 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from manager.check_matches import check_matches_on_selected
+from manager.ticket_table import TicketTable, match_code
+
+
+@pytest.fixture
+def selected():
+    return pd.DataFrame({
+        'Name': ['Bobby', 'Jose', 'Ole', 'Pep'],
+        'Number_1': [2, 28, 43, 37], 'Number_2': [40, 31, 41, 47], 'Number_3': [35, 24, 49, 7],
+        'Number_4': [26, 19, 7, 17], 'Number_5': [37, 8, 50, 42],
+        'Lucky_Star_1': [11, 12, 4, 3], 'Lucky_Star_2': [8, 10, 1, 7]
+    })
+
+
+@pytest.fixture
+def winning():
+    return {'Balls': [2, 40, 24, 7, 50], 'Lucky Stars': [8, 1]}
+
+
+@pytest.fixture
+def prize_breakdown():
+    return {'Match 5 + 2 Stars': '£50,129,756.00', 'Match 5 + 1 Star': '£51,956.30', 'Match 2 + 1 Star': '£4.10',
+            'Match 2': '£2.50'}
+
+
+def test_ticket_table_from_dataframe(selected):
+    tickets = TicketTable.from_dataframe(selected)
+
+    assert len(tickets) == 4
+    assert tickets.numbers.dtype == np.uint8 and tickets.numbers.shape == (4, 7)
+    assert tickets.stars.tolist()[0] == [11, 8]
+    assert tickets.names[tickets.name_codes].tolist() == ['Bobby', 'Jose', 'Ole', 'Pep']
+    pd.testing.assert_frame_equal(tickets.to_dataframe(), selected)
+    with pytest.raises(AttributeError):
+        tickets.extra = 1  # __slots__
+
+
+def test_ticket_table_interns_names(selected):
+    tickets = TicketTable.from_dataframe(pd.concat([selected, selected], ignore_index=True))
+
+    assert tickets.names.tolist() == ['Bobby', 'Jose', 'Ole', 'Pep']
+    assert tickets.name_codes.tolist() == [0, 1, 2, 3, 0, 1, 2, 3]
+
+
+def test_ticket_table_out_of_range(selected):
+    selected.loc[1, 'Number_5'] = 300  # would wrap to 44 as a uint8
+
+    with pytest.raises(ValueError, match=r'Numbers must be between \[1, 50] inclusive. Found rows: \[1]'):
+        TicketTable.from_dataframe(selected)
+
+
+def test_check_matches_same_as_check_matches_on_selected(selected, winning, prize_breakdown):
+    results = TicketTable.from_dataframe(selected).check_matches(winning, prize_breakdown)
+
+    assert results.match_codes.dtype == np.uint8
+    assert results.match_codes.tolist() == match_code(np.array([2, 1, 2, 1]), np.array([1, 0, 1, 0])).tolist()
+    assert results.prizes_pence.tolist() == [410, 0, 410, 0]
+    pd.testing.assert_frame_equal(results.to_dataframe(),
+                                  check_matches_on_selected(selected.copy(), winning, prize_breakdown))
+
+
+def test_check_matches_jackpot(selected, prize_breakdown):
+    winning = {'Balls': [2, 40, 35, 26, 37], 'Lucky Stars': [11, 8]}
+
+    results = TicketTable.from_dataframe(selected).check_matches(winning, prize_breakdown)
+
+    assert results.prizes_pence[0] == 5_012_975_600  # does not fit in 32 bits
+    assert results.to_dataframe()['Prize'][0] == '£50,129,756.00'
+
+
+def test_check_matches_prizes_not_an_amount(selected, winning):
+    prize_breakdown = {'Match 2 + 1 Star': 'Rollover', 'Match 2': ''}
+
+    results = TicketTable.from_dataframe(selected).check_matches(winning, prize_breakdown)
+
+    assert results.prizes_pence.tolist() == [0, 0, 0, 0]
+    assert results.to_dataframe()['Prize'].tolist() == ['Rollover', '£0.00', 'Rollover', '£0.00']
@@ -1,10 +1,13 @@
 from datetime import date
 from unittest import mock
 
+import numpy as np
+import pandas as pd
 import pytest
 
 from manager.tools import (
-    get_last_friday_date, assert_values_in_range, validate_selected_numbers, has_needed_columns
+    get_last_friday_date, assert_values_in_range, validate_selected_numbers, has_needed_columns, prize_to_pence,
+    find_invalid_rows
 )
 
 
@@ -77,26 +80,90 @@ def selected_dataframe():
         'Name': ['Snickers', 'KitKat', 'Snickers'],
         'Number_1': [1, 2, 2],
         'Number_2': [3, 4, 4],
-        'Number_3': [3, 4, 4],
-        'Number_4': [3, 4, 4],
-        'Number_5': [3, 4, 4],
+        'Number_3': [5, 6, 6],
+        'Number_4': [7, 8, 8],
+        'Number_5': [9, 10, 10],
         'Lucky_Star_1': [5, 6, 6],
-        'Lucky_Star_2': [5, 6, 6]
+        'Lucky_Star_2': [7, 8, 8]
     })
 
 
+def read_csv_chunks(data):
+    """ stands in for pandas.read_csv with chunksize, which returns an iterator of chunks. """
+    return mock.MagicMock(side_effect=lambda *args, **kwargs: iter([data]))
+
+
 def test_get_selected_numbers_raise_value_error(selected_dataframe):
-    with mock.patch('pandas.read_csv', mock.MagicMock(return_value=selected_dataframe)):
+    with mock.patch('pandas.read_csv', read_csv_chunks(selected_dataframe)):
         with pytest.raises(ValueError, match=r'"Name" in Selected numbers needs to be unique\. .*'):
             validate_selected_numbers()
 
 
 def test_get_selected_numbers_valid_run(selected_dataframe):
     selected_dataframe.iloc[0, 0] = 'Bounty'
-    with mock.patch('pandas.read_csv', mock.MagicMock(return_value=selected_dataframe)):
+    with mock.patch('pandas.read_csv', read_csv_chunks(selected_dataframe)):
         assert validate_selected_numbers() is None
 
 
+def test_validate_selected_numbers_collects_errors_across_chunks(tmp_path):
+    path = tmp_path / 'selected_numbers.csv'
+    pd.DataFrame({
+        'Name': ['Pep', 'Jose', 'Pep', 'Ole', 'Frank', 'Jurgen'],
+        'Number_1': [37, 28, 1, 43, 0, 7], 'Number_2': [47, 31, 2, 41, 38, 25], 'Number_3': [7, 24, 3, 49, 9, 11],
+        'Number_4': [47, 19, 4, 7, 36, 42], 'Number_5': [42, 8, 5, 300, 26, 12],
+        'Lucky_Star_1': [3, 12, 1, 4, 9, 8], 'Lucky_Star_2': [7, 10, 2, 6, 12, 8],
+    }).to_csv(path, index=False)
+
+    with pytest.raises(ValueError) as error:
+        validate_selected_numbers(path, chunksize=2)
+
+    assert str(error.value).split('\n')[0] == '"Name" in Selected numbers needs to be unique. Correct:'
+    assert 'Pep    2' in str(error.value)
+    assert str(error.value).split('\n')[-3:] == [
+        '1 rows with Number_* repeated within a ticket, rows: [0]',
+        '2 rows with Number_* not between [1, 50] inclusive, rows: [3, 4]',
+        '1 rows with Lucky_Star_* repeated within a ticket, rows: [5]',
+    ]
+
+
+def test_validate_selected_numbers_not_numeric(tmp_path):
+    path = tmp_path / 'selected_numbers.csv'
+    path.write_text('Name,Number_1,Number_2,Number_3,Number_4,Number_5,Lucky_Star_1,Lucky_Star_2\n'
+                    'Pep,37,47,7,x,42,3,7\n')
+
+    with pytest.raises(TypeError, match=r'.* are not all whole numbers: .*'):
+        validate_selected_numbers(path)
+
+
+def test_validate_selected_numbers_blank_names_are_duplicates(tmp_path):
+    path = tmp_path / 'selected_numbers.csv'
+    path.write_text('Name,Number_1,Number_2,Number_3,Number_4,Number_5,Lucky_Star_1,Lucky_Star_2\n'
+                    ',37,47,7,19,42,3,7\n'
+                    ',28,31,24,19,8,12,10\n')
+
+    with pytest.raises(ValueError, match='"Name" in Selected numbers needs to be unique'):
+        validate_selected_numbers(path)
+
+
+def test_validate_selected_numbers_malformed_csv(tmp_path):
+    path = tmp_path / 'selected_numbers.csv'
+    path.write_text('Name,Number_1,Number_2,Number_3,Number_4,Number_5,Lucky_Star_1,Lucky_Star_2\n'
+                    'Pep,37,47,7,19,42,3,7\n'
+                    'Jose,28,31,24,19,8,12,10,5,6\n')
+
+    with pytest.raises(pd.errors.ParserError):
+        validate_selected_numbers(path)
+
+
+def test_find_invalid_rows():
+    numbers = np.array([[1, 2, 3], [3, 1, 3], [0, 2, 3], [51, 51, 1], [50, 49, 48]])
+
+    out_of_range, repeated = find_invalid_rows(numbers, start=1, end=50)
+
+    assert out_of_range.tolist() == [False, False, True, True, False]
+    assert repeated.tolist() == [False, True, False, False, False]
+
+
 def test_has_needed_columns_raises_value_error(selected_cols):
     with pytest.raises(ValueError, match=r'Key Columns: .* are missing from selected numbers.'):
         has_needed_columns(selected_cols)
@@ -104,3 +171,20 @@ def test_has_needed_columns_raises_value_error(selected_cols):
 
 def test_has_needed_columns(selected_dataframe):
     assert has_needed_columns(selected_dataframe.columns) is None
+
+
+def test_prize_to_pence():
+    prizes = pd.Series(['£0.00', '£2.50', '£1,283.60', '£50,129,756.00'])
+    assert prize_to_pence(prizes).tolist() == [0, 250, 128360, 5012975600]
+
+
+def test_prize_to_pence_whole_pounds_and_signs():
+    prizes = pd.Series(['£5', '£1,000', '£-0.00', '£4.9'])
+    assert prize_to_pence(prizes).tolist() == [500, 100000, 0, 490]
+
+
+def test_prize_to_pence_not_an_amount(caplog):
+    prizes = pd.Series(['£2.50', '', 'Rollover', None], dtype=object)
+
+    assert prize_to_pence(prizes).tolist() == [250, 0, 0, 0]
+    assert "worth £0.00: ['', 'None', 'Rollover']" in caplog.text